@@ -12,13 +12,18 @@ from pydantic import BaseModel
 from loguru import logger
 
 from config import settings
-from services.image_compare import ImageCompareEngine
+from services.image_compare import ImageCompareEngine, build_cascade
 
 router = APIRouter()
 
 # In-memory storage (replace with database in production)
 assets_db = {}
 
+def _feature_count(fingerprint_data: Optional[dict]) -> int:
+    """ORB keypoint count (0 when ORB is unavailable)"""
+    orb = fingerprint_data.get('orb') if fingerprint_data else None
+    return orb['feature_count'] if orb else 0
+
 
 class AssetMetadata(BaseModel):
     """資產元數據"""
@@ -90,7 +95,8 @@ async def upload_asset(
 
         # Compute fingerprint
         compare_engine = ImageCompareEngine()
-        fingerprint_data = await compare_engine.compute_fingerprint(contents)
+        # Assets are compared many times, so compute every cascade feature up front
+        fingerprint_data = await compare_engine.compute_fingerprint(contents, features=('color', 'orb'))
 
         # Get image dimensions
         from PIL import Image
@@ -110,9 +116,9 @@ async def upload_asset(
             "dimensions": dimensions,
             "fingerprint": {
                 "pHash": fingerprint_data['hashes'].get('phash', '') if fingerprint_data else '',
-                "orbDescriptors": str(fingerprint_data['orb']['feature_count']) if fingerprint_data else '0',
-                "colorHistogram": 'computed',
-                "featureCount": fingerprint_data['orb']['feature_count'] if fingerprint_data else 0
+                "orbDescriptors": str(_feature_count(fingerprint_data)),
+                "colorHistogram": 'computed' if fingerprint_data and fingerprint_data['color'] else '',
+                "featureCount": _feature_count(fingerprint_data)
             },
             "metadata": {
                 "uploadedBy": "admin",
@@ -257,14 +263,16 @@ async def recompute_fingerprint(asset_id: str):
 
         # Recompute
         compare_engine = ImageCompareEngine()
-        fingerprint_data = await compare_engine.compute_fingerprint(contents)
+        fingerprint_data = await compare_engine.compute_fingerprint(contents, features=('color', 'orb'))
+        if fingerprint_data is None:
+            raise ValueError("Failed to compute fingerprint")
 
         # Update asset
         asset["fingerprint"] = {
             "pHash": fingerprint_data['hashes'].get('phash', ''),
-            "orbDescriptors": str(fingerprint_data['orb']['feature_count']),
-            "colorHistogram": 'computed',
-            "featureCount": fingerprint_data['orb']['feature_count']
+            "orbDescriptors": str(_feature_count(fingerprint_data)),
+            "colorHistogram": 'computed' if fingerprint_data['color'] else '',
+            "featureCount": _feature_count(fingerprint_data)
         }
         asset["_fingerprint_raw"] = fingerprint_data
         asset["updated_at"] = datetime.now().isoformat()
@@ -272,8 +280,8 @@ async def recompute_fingerprint(asset_id: str):
         return FingerprintResponse(
             id=asset_id,
             hashes=fingerprint_data['hashes'],
-            orb_features=fingerprint_data['orb']['feature_count'],
-            dominant_colors=fingerprint_data['color']['dominant_colors'] or []
+            orb_features=_feature_count(fingerprint_data),
+            dominant_colors=(fingerprint_data['color'] or {}).get('dominant_colors') or []
         )
 
     except Exception as e:
@@ -300,7 +308,12 @@ async def compare_images(
         if not image1 or not image2:
             raise HTTPException(status_code=400, detail="需要提供兩張圖片")
 
-        compare_engine = ImageCompareEngine()
+        compare_engine = ImageCompareEngine(cascade=build_cascade(
+            settings.COMPARE_CASCADE,
+            phash_accept=settings.CASCADE_PHASH_ACCEPT,
+            phash_reject=settings.CASCADE_PHASH_REJECT,
+            color_reject=settings.CASCADE_COLOR_REJECT
+        ))
         result = await compare_engine.compare(image1, image2)
 
         return {
@@ -309,7 +322,9 @@ async def compare_images(
             "orb_score": result.orb_score,
             "color_score": result.color_score,
             "similarity_level": result.similarity_level,
-            "is_match": result.is_match
+            "is_match": result.is_match,
+            "exit_stage": result.details.get('exit_stage'),
+            "stages": result.details.get('stages', {})
         }
 
     except Exception as e:
@@ -1,23 +1,29 @@
 """
 Scans API Routes
 掃描任務 API
+
+掃描任務寫入持久化工作佇列（services.jobs），由工作行程（worker.py）執行；
+這裡只負責建立任務與讀取狀態 / 結果。佇列是同步的 SQLite，一律以
+asyncio.to_thread 呼叫，不阻塞事件迴圈。
 """
 import asyncio
+import os
 import uuid
-from datetime import datetime
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 from loguru import logger
 
+from config import settings
 from services.crawler import CrawlerManager
+from services.crawler.manager import crawler_manager
+from services.jobs import Job, get_job_queue
+from services.jobs.queue import FINISHED
 
 router = APIRouter()
 
-# In-memory storage
-scans_db = {}
-scan_progress = {}
-
+# Job kinds run by the scan workers
+SCAN_KINDS = ["scan", "seller_sweep"]
 
 class ScanConfig(BaseModel):
     """掃描設定"""
@@ -27,6 +33,23 @@ class ScanConfig(BaseModel):
     similarity_threshold: float = 70
     max_results: int = 100
     scan_depth: int = 5
+    incremental: bool = True  # only compare listings new or changed since the last scan
+
+
+class SellerTarget(BaseModel):
+    """掃描目標賣家"""
+    platform: str
+    seller_id: str
+
+
+class SellerSweepConfig(BaseModel):
+    """賣家全店掃描設定"""
+    asset_ids: List[str]
+    sellers: List[SellerTarget] = []
+    violation_ids: List[str] = []  # also sweep the sellers of these violations
+    max_products: int = 500        # per seller
+    similarity_threshold: float = 70
+    incremental: bool = True  # skip listings already compared (any keyword) and unchanged
 
 
 class ScanTaskResponse(BaseModel):
@@ -39,6 +62,10 @@ class ScanTaskResponse(BaseModel):
     progress: int
     total_scanned: int
     violations_found: int
+    unchanged_listings: int = 0
+    unique_listings: int = 0
+    attempts: int = 0
+    error: Optional[str] = None
     created_at: str
     started_at: Optional[str] = None
     completed_at: Optional[str] = None
@@ -53,77 +80,78 @@ class ScanProgressUpdate(BaseModel):
     violations: int
 
 
-# WebSocket connections for real-time progress
-active_connections: dict = {}
-
-
-async def send_progress_update(task_id: str, progress: int, message: str, scanned: int, violations: int):
-    """Send progress update to WebSocket clients"""
-    if task_id in active_connections:
-        try:
-            await active_connections[task_id].send_json({
-                "task_id": task_id,
-                "progress": progress,
-                "message": message,
-                "scanned": scanned,
-                "violations": violations
-            })
-        except Exception as e:
-            logger.debug(f"WebSocket send error: {e}")
-
-
-async def run_scan(task_id: str, config: ScanConfig, asset_images: List[str]):
-    """Background task to run scan"""
-    try:
-        # Update status to running
-        scans_db[task_id]["status"] = "running"
-        scans_db[task_id]["started_at"] = datetime.now().isoformat()
-
-        crawler_manager = CrawlerManager()
-
-        async def on_progress(progress: int, message: str):
-            scans_db[task_id]["progress"] = progress
-            scan_progress[task_id] = {
-                "progress": progress,
-                "message": message,
-                "scanned": scans_db[task_id]["total_scanned"],
-                "violations": scans_db[task_id]["violations_found"]
-            }
-            await send_progress_update(
-                task_id, progress, message,
-                scans_db[task_id]["total_scanned"],
-                scans_db[task_id]["violations_found"]
-            )
-
-        # Run scan
-        result = await crawler_manager.scan_with_comparison(
-            asset_images=asset_images,
-            keywords=config.keywords,
-            platforms=config.platforms,
-            similarity_threshold=config.similarity_threshold,
-            max_pages=config.scan_depth,
-            max_results_per_platform=config.max_results // len(config.platforms),
-            on_progress=on_progress
-        )
-
-        # Update scan record
-        scans_db[task_id]["status"] = "completed"
-        scans_db[task_id]["completed_at"] = datetime.now().isoformat()
-        scans_db[task_id]["total_scanned"] = result["total_scanned"]
-        scans_db[task_id]["violations_found"] = result["violations_found"]
-        scans_db[task_id]["progress"] = 100
-        scans_db[task_id]["results"] = result
-
-        logger.info(f"Scan {task_id} completed: {result['violations_found']} violations found")
+def _load_assets(asset_ids: List[str]) -> List[str]:
+    """
+    Stored asset files
 
-    except Exception as e:
-        logger.error(f"Scan {task_id} failed: {e}")
-        scans_db[task_id]["status"] = "failed"
-        scans_db[task_id]["error"] = str(e)
+    Workers fingerprint them again; the fingerprint cache (by content)
+    makes that a lookup for assets fingerprinted at upload.
+    """
+    from .assets import assets_db
+    asset_images = []
+    for asset_id in asset_ids:
+        asset = assets_db.get(asset_id)
+        if asset:
+            asset_images.append(os.path.abspath(
+                os.path.join(settings.UPLOAD_DIR, os.path.basename(asset["original_url"]))
+            ))
+    return asset_images
+
+
+def _enqueue(kind: str, task_type: str, config: dict, **payload) -> Job:
+    task_id = f"scan-{uuid.uuid4().hex[:8]}"
+    return get_job_queue().enqueue(
+        kind,
+        {"type": task_type, "user_id": "user-001", "config": config, **payload},
+        job_id=task_id
+    )
+
+
+def _violation_counts(jobs: List[Job]) -> Dict[str, int]:
+    """Violations found so far per job: from the result once finished, else one COUNT over the events"""
+    counts = get_job_queue().count_events([job.id for job in jobs if job.result is None], kind="violation")
+    return {
+        job.id: job.result["violations_found"] if job.result is not None else counts.get(job.id, 0)
+        for job in jobs
+    }
+
+
+def _task_records(jobs: List[Job]) -> List[dict]:
+    counts = _violation_counts(jobs)
+    return [_task_record(job, counts[job.id]) for job in jobs]
+
+
+def _task_record(job: Job, violations_found: int = 0) -> dict:
+    """Scan task record of a queued job"""
+    result = job.result or {}
+    return {
+        "id": job.id,
+        "user_id": job.payload["user_id"],
+        "type": job.payload["type"],
+        "status": job.status,
+        "config": job.payload["config"],
+        "progress": job.progress,
+        "total_scanned": result.get("total_scanned", 0),
+        "violations_found": violations_found,
+        "unchanged_listings": result.get("unchanged_listings", 0),
+        "unique_listings": result.get("unique_listings", 0),
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "completed_at": job.completed_at
+    }
+
+
+def _get_job(task_id: str) -> Job:
+    job = get_job_queue().get(task_id)
+    if job is None or job.kind not in SCAN_KINDS:
+        raise HTTPException(status_code=404, detail="掃描任務不存在")
+    return job
 
 
 @router.post("/create", response_model=ScanTaskResponse)
-async def create_scan(config: ScanConfig, background_tasks: BackgroundTasks):
+async def create_scan(config: ScanConfig):
     """
     Create a new scan task
     建立新的掃描任務
@@ -137,45 +165,21 @@ async def create_scan(config: ScanConfig, background_tasks: BackgroundTasks):
         if not config.keywords:
             raise HTTPException(status_code=400, detail="請輸入搜尋關鍵字")
 
-        # Create task
-        task_id = f"scan-{uuid.uuid4().hex[:8]}"
-        now = datetime.now().isoformat()
-
-        task = {
-            "id": task_id,
-            "user_id": "user-001",
-            "type": "hybrid",
-            "status": "queued",
-            "config": config.dict(),
-            "progress": 0,
-            "total_scanned": 0,
-            "violations_found": 0,
-            "created_at": now,
-            "started_at": None,
-            "completed_at": None
-        }
-
-        scans_db[task_id] = task
-
         # Get asset images (from assets_db)
-        from .assets import assets_db
-        asset_images = []
-        for asset_id in config.asset_ids:
-            asset = assets_db.get(asset_id)
-            if asset:
-                # Use the stored file
-                asset_images.append(asset["original_url"])
-
+        asset_images = _load_assets(config.asset_ids)
         if not asset_images:
             # For testing, allow without real assets
-            logger.warning(f"No asset images found for task {task_id}")
+            logger.warning(f"No asset images found for scan of {config.asset_ids}")
 
-        # Start background scan
-        background_tasks.add_task(run_scan, task_id, config, asset_images)
+        # Queue for the scan workers (they read the violation history when the job runs)
+        job = await asyncio.to_thread(
+            _enqueue, "scan", "hybrid", config.dict(),
+            asset_images=asset_images
+        )
 
-        logger.info(f"Scan task created: {task_id}")
+        logger.info(f"Scan task queued: {job.id}")
 
-        return ScanTaskResponse(**task)
+        return ScanTaskResponse(**_task_record(job))
 
     except HTTPException:
         raise
@@ -184,18 +188,72 @@ async def create_scan(config: ScanConfig, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/seller-sweep", response_model=ScanTaskResponse)
+async def create_seller_sweep(config: SellerSweepConfig):
+    """
+    Sweep the full catalogues of given sellers / sellers of known violations
+    賣家全店掃描：已侵權賣家的其他商品（只限支援賣家爬取的平台）
+    """
+    try:
+        if not config.asset_ids:
+            raise HTTPException(status_code=400, detail="請選擇至少一個資產")
+
+        supported = crawler_manager.seller_platforms()
+        unsupported = sorted({seller.platform for seller in config.sellers} - set(supported))
+        if unsupported:
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支援賣家全店掃描的平台: {', '.join(unsupported)}（支援: {', '.join(supported)}）"
+            )
+
+        sellers: List[Tuple[str, str]] = [(seller.platform, seller.seller_id) for seller in config.sellers]
+        from .violations import violations_db
+        for violation_id in config.violation_ids:
+            violation = violations_db.get(violation_id)
+            if violation is None:
+                raise HTTPException(status_code=404, detail=f"找不到侵權記錄 {violation_id}")
+            listing = violation.get("listing") or {}
+            seller_id = listing.get("seller_id")
+            platform = listing.get("platform") or violation["platform"]
+            if seller_id and platform in supported:
+                sellers.append((platform, str(seller_id)))
+            elif seller_id:
+                logger.info(f"Seller sweep: skipping {platform} seller of violation {violation_id} (no seller crawling)")
+        sellers = list(dict.fromkeys(sellers))
+        if not sellers:
+            raise HTTPException(status_code=400, detail="請指定至少一個賣家")
+
+        asset_images = _load_assets(config.asset_ids)
+        if not asset_images:
+            logger.warning(f"No asset images found for seller sweep of {config.asset_ids}")
+
+        job = await asyncio.to_thread(
+            _enqueue, "seller_sweep", "seller_sweep", config.dict(),
+            asset_images=asset_images,
+            sellers=sellers
+        )
+
+        logger.info(f"Seller sweep queued: {job.id} ({len(sellers)} sellers)")
+
+        return ScanTaskResponse(**_task_record(job))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Create seller sweep error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/", response_model=List[ScanTaskResponse])
 async def get_scans(status: Optional[str] = None):
     """
     Get all scan tasks
     取得所有掃描任務
     """
-    tasks = list(scans_db.values())
-
-    if status:
-        tasks = [t for t in tasks if t.get('status') == status]
-
-    return [ScanTaskResponse(**t) for t in tasks]
+    records = await asyncio.to_thread(
+        lambda: _task_records(get_job_queue().list(kinds=SCAN_KINDS, status=status))
+    )
+    return [ScanTaskResponse(**record) for record in records]
 
 
 @router.get("/{task_id}", response_model=ScanTaskResponse)
@@ -204,11 +262,36 @@ async def get_scan(task_id: str):
     Get scan task by ID
     根據 ID 取得掃描任務
     """
-    task = scans_db.get(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="掃描任務不存在")
+    records = await asyncio.to_thread(lambda: _task_records([_get_job(task_id)]))
+    return ScanTaskResponse(**records[0])
+
 
-    return ScanTaskResponse(**task)
+def _progress(job: Job, violations: int) -> dict:
+    result = job.result or {}
+    return {
+        "task_id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "message": job.message or ("等待中..." if job.status == "queued" else ""),
+        "scanned": result.get("total_scanned", 0),
+        "violations": violations
+    }
+
+
+def _poll_progress(task_id: str, after: Optional[int] = None) -> Tuple[Optional[Job], Optional[dict], list]:
+    """
+    One progress poll: (job, progress, violation events after seq `after`)
+
+    The job is None when it does not exist; events are only read when
+    after is given.
+    """
+    queue = get_job_queue()
+    job = queue.get(task_id)
+    if job is None:
+        return None, None, []
+    progress = _progress(job, _violation_counts([job])[job.id])
+    events = queue.events(task_id, kind="violation", after=after) if after is not None else []
+    return job, progress, events
 
 
 @router.get("/{task_id}/progress")
@@ -217,17 +300,9 @@ async def get_scan_progress(task_id: str):
     Get scan progress
     取得掃描進度
     """
-    task = scans_db.get(task_id)
-    if not task:
+    job, progress, _ = await asyncio.to_thread(_poll_progress, task_id)
+    if job is None or job.kind not in SCAN_KINDS:
         raise HTTPException(status_code=404, detail="掃描任務不存在")
-
-    progress = scan_progress.get(task_id, {
-        "progress": task["progress"],
-        "message": "等待中...",
-        "scanned": task["total_scanned"],
-        "violations": task["violations_found"]
-    })
-
     return progress
 
 
@@ -237,14 +312,12 @@ async def get_scan_results(task_id: str):
     Get scan results
     取得掃描結果
     """
-    task = scans_db.get(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="掃描任務不存在")
+    job = await asyncio.to_thread(_get_job, task_id)
 
-    if task["status"] != "completed":
+    if job.status != "completed":
         raise HTTPException(status_code=400, detail="掃描尚未完成")
 
-    return task.get("results", {})
+    return job.result or {}
 
 
 @router.delete("/{task_id}")
@@ -253,14 +326,13 @@ async def cancel_scan(task_id: str):
     Cancel a scan task
     取消掃描任務
     """
-    task = scans_db.get(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="掃描任務不存在")
+    job = await asyncio.to_thread(_get_job, task_id)
 
-    if task["status"] == "completed":
+    if job.status == "completed":
         raise HTTPException(status_code=400, detail="已完成的任務無法取消")
 
-    scans_db[task_id]["status"] = "cancelled"
+    # A running scan stops at its worker's next heartbeat
+    await asyncio.to_thread(get_job_queue().cancel, task_id)
 
     return {"message": "掃描任務已取消", "id": task_id}
 
@@ -272,8 +344,33 @@ async def websocket_progress(websocket: WebSocket, task_id: str):
     即時掃描進度 WebSocket
     """
     await websocket.accept()
-    active_connections[task_id] = websocket
 
+    async def push():
+        """Poll the job: send progress changes and each violation as it is found"""
+        # None until the first poll: violations found before connecting are only counted
+        last_seq, last_update = None, None
+        try:
+            while True:
+                if last_seq is None:
+                    job, update, _ = await asyncio.to_thread(_poll_progress, task_id)
+                    last_seq = await asyncio.to_thread(get_job_queue().last_event_seq, task_id, "violation")
+                else:
+                    job, update, events = await asyncio.to_thread(_poll_progress, task_id, last_seq)
+                    for event in events:
+                        await websocket.send_json({**update, "message": "發現可疑侵權商品", "violation": event.data})
+                        last_seq = event.seq
+                if job is None:
+                    return
+                if update != last_update:
+                    await websocket.send_json(update)
+                    last_update = update
+                if job.status in FINISHED:
+                    return
+                await asyncio.sleep(settings.JOB_POLL_SECONDS)
+        except Exception as e:
+            logger.debug(f"WebSocket send error: {e}")
+
+    pusher = asyncio.create_task(push())
     try:
         while True:
             # Keep connection alive and wait for disconnect
@@ -282,9 +379,9 @@ async def websocket_progress(websocket: WebSocket, task_id: str):
                 await websocket.send_text("pong")
 
     except WebSocketDisconnect:
-        if task_id in active_connections:
-            del active_connections[task_id]
         logger.debug(f"WebSocket disconnected for task {task_id}")
+    finally:
+        pusher.cancel()
 
 
 @router.post("/quick-search")
@@ -298,7 +395,10 @@ async def quick_search(
     快速搜尋（不進行比對）
     """
     try:
-        crawler_manager = CrawlerManager()
+        crawler_manager = CrawlerManager(
+            max_concurrency=settings.CRAWLER_MAX_CONCURRENCY,
+            platform_concurrency=settings.CRAWLER_PLATFORM_CONCURRENCY
+        )
         results = await crawler_manager.search_all_platforms(
             keyword=keyword,
             platforms=platforms,
@@ -310,7 +410,7 @@ async def quick_search(
         for platform, result in results.items():
             for listing in result.listings:
                 all_listings.append({
-                    **listing.__dict__,
+                    **listing.to_dict(),
                     "platform": platform
                 })
 
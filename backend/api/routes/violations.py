@@ -2,6 +2,7 @@
 Violations API Routes
 侵權記錄 API
 """
+import asyncio
 import uuid
 from datetime import datetime
 from typing import List, Optional
@@ -9,6 +10,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from loguru import logger
 
+from services.jobs import get_job_queue
+
 router = APIRouter()
 
 # In-memory storage
@@ -24,6 +27,22 @@ class ViolationCreate(BaseModel):
     similarity: dict
 
 
+def _record_history(records: List[dict]):
+    """
+    Also log violations as 'violation' queue events (keyed by violation id):
+    scan workers read their history from the queue for the crawl frontier
+    """
+    queue = get_job_queue()
+    if queue is None:
+        return
+    for record in records:
+        queue.add_event(record["id"], "violation", {
+            "listing": {**record["listing"], "platform": record["platform"]},
+            "similarity": record["similarity"],
+            "task_id": record["task_id"]
+        })
+
+
 class ViolationResponse(BaseModel):
     """侵權記錄回應"""
     id: str
@@ -62,6 +81,7 @@ async def create_violation(violation: ViolationCreate):
         }
 
         violations_db[violation_id] = record
+        await asyncio.to_thread(_record_history, [record])
 
         logger.info(f"Violation created: {violation_id}")
 
@@ -214,6 +234,7 @@ async def batch_create_violations(violations: List[ViolationCreate]):
 
         violations_db[violation_id] = record
         created.append(ViolationResponse(**record))
+    await asyncio.to_thread(_record_history, [violations_db[v.id] for v in created])
 
     logger.info(f"Batch created {len(created)} violations")
 
@@ -0,0 +1,179 @@
+"""
+Decode Benchmark
+縮小解碼效能測試 - 比較全尺寸解碼與 DCT 域縮小解碼的耗時與峰值記憶體
+
+Usage (from backend/):
+    python -m benchmarks.decode_benchmark                 # synthetic 12MP JPEGs
+    python -m benchmarks.decode_benchmark photo1.jpg ...  # your own product photos
+
+Each mode runs in a fresh subprocess so peak RSS is measured independently.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+MODES = ['full', 'reduced']
+
+
+def make_photo(width: int, height: int, seed: int) -> bytes:
+    """Product-photo-like JPEG: flat backdrop, solid shapes, sensor noise"""
+    rng = np.random.default_rng(seed)
+    image = Image.new('RGB', (width, height), tuple(int(v) for v in rng.integers(200, 256, 3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(30):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        w, h = rng.integers(width // 20, width // 4), rng.integers(height // 20, height // 4)
+        color = tuple(int(v) for v in rng.integers(0, 256, 3))
+        if rng.random() < 0.5:
+            draw.ellipse([x, y, x + w, y + h], fill=color)
+        else:
+            draw.rectangle([x, y, x + w, y + h], fill=color)
+
+    pixels = np.asarray(image, dtype=np.int16) + rng.integers(-6, 7, (height, width, 3), dtype=np.int16)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def generate_photos(directory: str, count: int, size: str):
+    width, height = (int(v) for v in size.split('x'))
+    for i in range(count):
+        with open(os.path.join(directory, f'photo_{i}.jpg'), 'wb') as f:
+            f.write(make_photo(width, height, seed=i))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+async def _fingerprint_all(paths: List[str], min_size: Optional[int]) -> List[str]:
+    from services.image_compare.loader import ImageSource, image_cache
+    from services.image_compare.phash import PHashCompare
+
+    phash = PHashCompare(hash_size=16)
+    hashes = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        image = await ImageSource.load(data, min_size=min_size)
+        hashes.append(await phash.compute_hash(image))
+        image_cache.clear()
+    return hashes
+
+
+def run_mode(paths: List[str], mode: str, repeat: int) -> dict:
+    """Decode + pHash every image in this process"""
+    from services.image_compare.executor import shutdown_executor
+    from services.image_compare.loader import ImageSource, image_cache
+    from services.image_compare.phash import PHashCompare
+
+    min_size = PHashCompare(hash_size=16).decode_size if mode == 'reduced' else None
+    rss_before = peak_rss_mb()
+
+    decode_times = []
+    for _ in range(repeat):
+        for path in paths:
+            with open(path, 'rb') as f:
+                data = f.read()
+            start = time.perf_counter()
+            ImageSource.from_bytes(data, min_size=min_size).gray
+            decode_times.append(time.perf_counter() - start)
+            image_cache.clear()
+
+    start = time.perf_counter()
+    hashes = asyncio.run(_fingerprint_all(paths, min_size))
+    fingerprint_time = time.perf_counter() - start
+    shutdown_executor()
+
+    return {
+        'mode': mode,
+        'images': len(paths),
+        'decode_ms_mean': round(1000 * float(np.mean(decode_times)), 2),
+        'decode_ms_p95': round(1000 * float(np.percentile(decode_times, 95)), 2),
+        'fingerprint_ms_per_image': round(1000 * fingerprint_time / len(paths), 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'baseline_rss_mb': round(rss_before, 1),
+        'hashes': hashes
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='*', help='JPEG files (default: synthetic photos)')
+    parser.add_argument('--count', type=int, default=8, help='synthetic images to generate')
+    parser.add_argument('--size', default='4000x3000', help='synthetic image size WxH')
+    parser.add_argument('--repeat', type=int, default=3)
+    # Child-process entry points
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--generate', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.images, args.mode, args.repeat)))
+        return
+
+    if args.generate:
+        generate_photos(args.generate, args.count, args.size)
+        return
+
+    paths = args.images
+    tmp_dir = None
+    if not paths:
+        # Generated in a child: Linux children inherit the parent's peak RSS
+        tmp_dir = tempfile.TemporaryDirectory()
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.decode_benchmark', '--generate', tmp_dir.name,
+             '--count', str(args.count), '--size', args.size],
+            cwd=BACKEND_DIR, check=True
+        )
+        paths = [os.path.join(tmp_dir.name, f'photo_{i}.jpg') for i in range(args.count)]
+        print(f"Generated {args.count} synthetic {args.size} JPEGs")
+
+    results = {}
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.decode_benchmark', '--mode', mode,
+             '--repeat', str(args.repeat), *paths],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'mode':<10}{'decode mean':>14}{'decode p95':>14}{'fp/image':>12}{'peak RSS':>12}")
+    for mode, r in results.items():
+        print(f"{mode:<10}{r['decode_ms_mean']:>11.1f} ms{r['decode_ms_p95']:>11.1f} ms"
+              f"{r['fingerprint_ms_per_image']:>9.1f} ms{r['peak_rss_mb']:>9.1f} MB")
+
+    # Reduced decoding must not change matching: report pHash drift in bits
+    drift = [
+        (int(a, 16) ^ int(b, 16)).bit_count()
+        for a, b in zip(results['full']['hashes'], results['reduced']['hashes'])
+        if a and b
+    ]
+    if drift:
+        print(f"pHash drift full vs reduced: max {max(drift)} / mean {np.mean(drift):.1f} bits (of 256)")
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -22,6 +22,84 @@ class Settings(BaseSettings):
     PHASH_THRESHOLD: int = 10
     OVERALL_SIMILARITY_THRESHOLD: float = 0.70
 
+    # Comparison cascade: pHash -> colour histogram -> ORB
+    # Scores >= accept / < reject end the comparison at that stage;
+    # only pairs in between pay for the next (more expensive) stage
+    COMPARE_CASCADE: str = "phash,color,orb"
+    CASCADE_PHASH_ACCEPT: float = 90.0
+    CASCADE_PHASH_REJECT: float = 55.0
+    CASCADE_COLOR_REJECT: float = 40.0
+
+    # Compute pools (hashing / feature extraction off the event loop)
+    COMPUTE_THREAD_WORKERS: int = 4   # OpenCV / PIL decode (releases the GIL)
+    COMPUTE_PROCESS_WORKERS: int = 2  # imagehash (holds the GIL); 0 = threads only
+
+    # Content-addressed fingerprint cache (pHash / ORB / histogram per image SHA-256)
+    FINGERPRINT_CACHE_DIR: str = "./data/fingerprint_cache"
+    FINGERPRINT_CACHE_MAX_MB: int = 512  # 0 = disabled
+
+    # Shared HTTP download pool (thumbnails, crawler pages)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_PER_HOST: int = 8
+    HTTP_MAX_DOWNLOAD_MB: int = 10
+    HTTP_TIMEOUT: float = 30.0
+    HTTP2_ENABLED: bool = True
+
+    # On-disk HTTP cache for search pages and thumbnails (ETag / Last-Modified revalidation)
+    HTTP_CACHE_DIR: str = "./data/http_cache"
+    HTTP_CACHE_MAX_MB: int = 1024          # 0 = disabled
+    HTTP_CACHE_SEARCH_TTL: float = 3600.0  # search results; -1 = honour Cache-Control
+
+    # Incremental scans: listings already compared per keyword (empty = disabled)
+    WATERMARK_DB_PATH: str = "./data/watermarks.db"
+
+    # Crawler fan-out (per scan): keyword x platform searches in flight
+    CRAWLER_MAX_CONCURRENCY: int = 6
+    CRAWLER_PLATFORM_CONCURRENCY: int = 2
+
+    # Streaming scan pipeline (search -> thumbnail download -> compare)
+    SCAN_QUEUE_SIZE: int = 64        # listings waiting for download; bounds scan memory
+    SCAN_DOWNLOAD_WORKERS: int = 8
+    SCAN_COMPARE_WORKERS: int = 4
+    SCAN_OUTCOME_CACHE_SIZE: int = 10000  # compare outcomes kept per thumbnail URL / image for reuse
+
+    # Download the smallest CDN rendition the cheap cascade stages need
+    # (e.g. Shopee _tn); full-size images only for pairs reaching ORB
+    IMAGE_CDN_VARIANTS: bool = True
+
+    # Durable scan job queue (SQLite, shared by the API and worker processes)
+    JOB_DB_PATH: str = "./data/jobs.db"
+    JOB_WORKER_PROCESSES: int = 2        # python worker.py
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_DELAY: float = 30.0        # seconds before the first retry, doubled per attempt
+    JOB_HEARTBEAT_SECONDS: float = 10.0
+    JOB_LEASE_SECONDS: float = 60.0      # no heartbeat for this long: job is requeued
+    JOB_POLL_SECONDS: float = 1.0
+
+    # Crawl frontier: spend each scan's listing budget on keywords / sellers
+    # with recent violations and on targets that keep turning up new listings
+    CRAWL_FRONTIER: bool = True
+    CRAWL_FRONTIER_HALF_LIFE_HOURS: float = 72.0  # weight of a violation halves
+    CRAWL_FRONTIER_MAX_SELLERS: int = 20           # violating sellers added per scan
+    CRAWL_FRONTIER_TARGET_CAP: float = 3.0         # max listings per target, x max_results
+
+    # Per-host adaptive rate limit (shared by all crawlers and scans; split
+    # evenly between the JOB_WORKER_PROCESSES scan workers, as is HTTP_MAX_PER_HOST)
+    # AIMD: halved on 429/403/503, +0.05 req/s per healthy response
+    CRAWLER_RATE_PER_HOST: float = 2.0
+    CRAWLER_RATE_BURST: int = 4
+    CRAWLER_RATE_MIN: float = 0.2
+    CRAWLER_RATE_MAX: float = 10.0
+
+    # Crawler retries (exponential backoff + jitter) and per-platform circuit breaker
+    # (each scan worker process keeps its own breakers and budgets)
+    CRAWLER_MAX_RETRIES: int = 3
+    CRAWLER_RETRY_BASE_DELAY: float = 0.5
+    CRAWLER_RETRY_MAX_DELAY: float = 8.0
+    CRAWLER_RETRY_BUDGET_RATIO: float = 0.2  # retries per request, per platform
+    CRAWLER_BREAKER_FAILURES: int = 5        # consecutive failures to open
+    CRAWLER_BREAKER_RESET_SECONDS: float = 30.0
+
     class Config:
         env_file = ".env"
         extra = "ignore"
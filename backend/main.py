@@ -6,6 +6,7 @@ Features:
 - 圖片指紋計算與比對
 - 電商平台爬蟲 (蝦皮、露天、Yahoo)
 - 即時掃描進度 WebSocket
+- 掃描任務排入持久化佇列，由工作行程（worker.py）執行
 - 侵權偵測與記錄
 """
 import asyncio
@@ -18,6 +19,9 @@ import os
 
 from config import settings
 from api.routes import assets, scans, violations
+from services.crawler.watermarks import get_watermark_store
+from services.jobs import get_job_queue
+from runtime import configure_services, process_metrics, shutdown_services
 
 
 @asynccontextmanager
@@ -30,10 +34,13 @@ async def lifespan(app: FastAPI):
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
     logger.info(f"Upload directory: {settings.UPLOAD_DIR}")
 
+    configure_services()
+
     yield
 
     # Shutdown
     logger.info("Shutting down...")
+    await shutdown_services()
 
 
 # Create FastAPI app
@@ -76,14 +83,25 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    """Detailed health check"""
+    """
+    Detailed health check
+
+    executor / downloads / image_downloads / fingerprint_cache are this API
+    process's (asset fingerprinting); scans run in the worker processes,
+    whose crawl rates, breakers and caches are listed under "workers".
+    """
+    jobs = get_job_queue()
     return {
         "status": "healthy",
         "services": {
             "api": True,
             "image_compare": True,
             "crawler": True
-        }
+        },
+        **process_metrics(),
+        "watermarks": await asyncio.to_thread(watermarks.stats) if (watermarks := get_watermark_store()) else None,
+        "jobs": await asyncio.to_thread(jobs.stats) if jobs else None,
+        "workers": await asyncio.to_thread(jobs.workers) if jobs else []
     }
 
 
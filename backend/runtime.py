@@ -0,0 +1,123 @@
+"""
+Service Runtime
+共用服務設定 - API 行程（main.py）與掃描工作行程（worker.py）啟動時呼叫
+
+限速器、熔斷器、連線池與快取都是行程內的狀態。N 個掃描工作行程同時爬取時，
+每個行程只分到 1/N 的每主機速率、burst 與連線數，同一主機的總速率維持在設定值；
+熔斷器與重試預算則由各行程各自計算。
+各工作行程定期把這些指標寫入工作佇列（JobQueue.publish_worker），/api/health 由此讀取。
+"""
+from typing import Dict
+
+from config import settings
+from services.image_compare import check_cascade
+from services.image_compare.executor import configure_executor, get_executor, shutdown_executor
+from services.image_compare.fingerprint_cache import configure_fingerprint_cache, get_fingerprint_cache
+from services.image_compare.loader import image_downloads
+from services.downloader import configure_download_service, get_download_service, shutdown_download_service
+from services.crawler.frontier import configure_crawl_frontier
+from services.crawler.http_cache import configure_http_cache, get_http_cache
+from services.crawler.image_variants import configure_image_variants
+from services.crawler.rate_limit import configure_rate_limiter, get_rate_limiter
+from services.crawler.resilience import configure_resilience, get_resilience
+from services.crawler.watermarks import configure_watermark_store, shutdown_watermark_store
+from services.jobs import configure_job_queue, shutdown_job_queue
+
+
+def configure_services(processes: int = 1):
+    """
+    Configure the shared services from settings
+
+    Args:
+        processes: Scan worker processes crawling side by side; each one
+            gets 1/processes of the per-host rate, burst and connections
+    """
+    processes = max(1, processes)
+    # CPU-bound image work runs in these pools, not on the event loop
+    configure_executor(
+        thread_workers=settings.COMPUTE_THREAD_WORKERS,
+        process_workers=settings.COMPUTE_PROCESS_WORKERS
+    )
+    # Color / ORB stages need OpenCV; say so up front instead of per scan
+    check_cascade(settings.COMPARE_CASCADE)
+
+    # Repeat images (re-listed products, re-uploaded assets) skip recomputation
+    if settings.FINGERPRINT_CACHE_MAX_MB > 0:
+        configure_fingerprint_cache(
+            settings.FINGERPRINT_CACHE_DIR,
+            settings.FINGERPRINT_CACHE_MAX_MB * 1024 * 1024
+        )
+
+    # One keep-alive / HTTP/2 connection pool for every image download
+    configure_download_service(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_per_host=max(1, settings.HTTP_MAX_PER_HOST // processes),
+        max_bytes=settings.HTTP_MAX_DOWNLOAD_MB * 1024 * 1024,
+        timeout=settings.HTTP_TIMEOUT,
+        http2=settings.HTTP2_ENABLED
+    )
+    # Repeat scans of the same keywords revalidate instead of re-downloading
+    if settings.HTTP_CACHE_MAX_MB > 0:
+        configure_http_cache(
+            settings.HTTP_CACHE_DIR,
+            settings.HTTP_CACHE_MAX_MB * 1024 * 1024,
+            search_ttl=settings.HTTP_CACHE_SEARCH_TTL if settings.HTTP_CACHE_SEARCH_TTL >= 0 else None
+        )
+    # Later scans of a keyword only compare new or changed listings
+    if settings.WATERMARK_DB_PATH:
+        configure_watermark_store(settings.WATERMARK_DB_PATH)
+    configure_image_variants(settings.IMAGE_CDN_VARIANTS)
+    configure_crawl_frontier(
+        settings.CRAWL_FRONTIER,
+        half_life_hours=settings.CRAWL_FRONTIER_HALF_LIFE_HOURS,
+        max_sellers=settings.CRAWL_FRONTIER_MAX_SELLERS,
+        target_cap=settings.CRAWL_FRONTIER_TARGET_CAP
+    )
+    # Per-host limits hold across all worker processes: each gets its share
+    configure_rate_limiter(
+        rate=settings.CRAWLER_RATE_PER_HOST / processes,
+        burst=max(1, settings.CRAWLER_RATE_BURST // processes),
+        min_rate=settings.CRAWLER_RATE_MIN / processes,
+        max_rate=settings.CRAWLER_RATE_MAX / processes
+    )
+    configure_resilience(
+        max_retries=settings.CRAWLER_MAX_RETRIES,
+        base_delay=settings.CRAWLER_RETRY_BASE_DELAY,
+        max_delay=settings.CRAWLER_RETRY_MAX_DELAY,
+        budget_ratio=settings.CRAWLER_RETRY_BUDGET_RATIO,
+        breaker_failures=settings.CRAWLER_BREAKER_FAILURES,
+        breaker_reset=settings.CRAWLER_BREAKER_RESET_SECONDS
+    )
+    # Scans are queued here and run by worker processes
+    configure_job_queue(
+        settings.JOB_DB_PATH,
+        lease_seconds=settings.JOB_LEASE_SECONDS,
+        retry_delay=settings.JOB_RETRY_DELAY,
+        max_attempts=settings.JOB_MAX_ATTEMPTS
+    )
+
+
+def process_metrics() -> Dict:
+    """This process's compute pools, download pool and fingerprint cache"""
+    return {
+        "executor": get_executor().metrics(),
+        "downloads": get_download_service().metrics(),
+        "image_downloads": image_downloads.stats(),
+        "fingerprint_cache": cache.stats() if (cache := get_fingerprint_cache()) else None
+    }
+
+
+def crawl_metrics() -> Dict:
+    """This process's crawl rates, breakers and HTTP cache (scan workers)"""
+    return {
+        "crawl_rates": get_rate_limiter().metrics(),
+        "crawl_breakers": get_resilience().metrics(),
+        "http_cache": http_cache.metrics() if (http_cache := get_http_cache()) else None
+    }
+
+
+async def shutdown_services():
+    await shutdown_download_service()
+    shutdown_job_queue()
+    shutdown_watermark_store()
+    shutdown_executor()
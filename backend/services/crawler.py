@@ -18,7 +18,7 @@ import json
 import asyncio
 import httpx
 from typing import List, Optional, Dict, Any
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from datetime import datetime
 from urllib.parse import urlparse, urlencode, quote
 import random
@@ -480,12 +480,13 @@ class PlatformCrawler:
             elif platform == "ruten":
                 tasks.append(("ruten", self.search_ruten(keyword, max_pages)))
 
-        for platform, task in tasks:
-            try:
-                results[platform] = await task
-            except Exception as e:
-                print(f"{platform} 搜尋失敗: {e}")
+        outcomes = await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+        for (platform, _), outcome in zip(tasks, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"{platform} 搜尋失敗: {outcome}")
                 results[platform] = []
+            else:
+                results[platform] = outcome
 
         return results
 
@@ -497,6 +498,7 @@ class SearchResult:
     listings: List[ProductListing]
     total_found: int
     search_time: float = 0
+    errors: List[str] = field(default_factory=list)
 
 
 class CrawlerManager:
@@ -504,8 +506,16 @@ class CrawlerManager:
     爬蟲管理器 - 整合搜尋與比對功能
     """
 
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 6, platform_concurrency: int = 2):
+        """
+        Args:
+            max_concurrency: 同時進行的平台搜尋數（所有平台合計）
+            platform_concurrency: 每個平台同時進行的搜尋數
+        """
         self.crawler = PlatformCrawler()
+        self._search_limit = asyncio.Semaphore(max_concurrency)
+        self._platform_concurrency = platform_concurrency
+        self._platform_limits: Dict[str, asyncio.Semaphore] = {}
 
     async def search_all_platforms(
         self,
@@ -515,23 +525,38 @@ class CrawlerManager:
         max_results_per_platform: int = 50
     ) -> Dict[str, SearchResult]:
         """
-        搜尋所有指定平台
+        同時搜尋所有指定平台
         """
-        results = {}
+        platforms = list(dict.fromkeys(platforms))
+        results = await asyncio.gather(*(
+            self._search_platform(platform, keyword, max_pages, max_results_per_platform)
+            for platform in platforms
+        ))
+        return dict(zip(platforms, results))
+
+    async def _search_platform(
+        self,
+        platform: str,
+        keyword: str,
+        max_pages: int,
+        max_results: int
+    ) -> SearchResult:
+        """在全域與單一平台並行上限內搜尋一個平台；失敗時回傳含錯誤的結果"""
+        limit = self._platform_limits.setdefault(platform, asyncio.Semaphore(self._platform_concurrency))
         start_time = datetime.now()
 
-        for platform in platforms:
+        async with self._search_limit, limit:
             try:
                 if platform == "shopee":
                     listings = await self.crawler.search_shopee(keyword, max_pages)
                 elif platform == "ruten":
                     listings = await self.crawler.search_ruten(keyword, max_pages)
                 else:
-                    listings = []
-
-                listings = listings[:max_results_per_platform]
+                    return SearchResult(platform=platform, listings=[], total_found=0,
+                                        errors=[f"不支援的平台: {platform}"])
 
-                results[platform] = SearchResult(
+                listings = listings[:max_results]
+                return SearchResult(
                     platform=platform,
                     listings=listings,
                     total_found=len(listings),
@@ -540,14 +565,14 @@ class CrawlerManager:
 
             except Exception as e:
                 print(f"搜尋 {platform} 失敗: {e}")
-                results[platform] = SearchResult(
+                return SearchResult(
                     platform=platform,
                     listings=[],
-                    total_found=0
+                    total_found=0,
+                    search_time=(datetime.now() - start_time).total_seconds(),
+                    errors=[str(e)]
                 )
 
-        return results
-
     async def scan_with_comparison(
         self,
         asset_images: List[str],
@@ -568,18 +593,26 @@ class CrawlerManager:
         if on_progress:
             await on_progress(10, "正在搜尋電商平台...")
 
-        # 搜尋所有關鍵字和平台
-        all_listings = []
-        for keyword in keywords:
-            results = await self.search_all_platforms(
+        # 同時搜尋所有關鍵字和平台（受並行上限控制）
+        keyword_results = await asyncio.gather(*(
+            self.search_all_platforms(
                 keyword=keyword,
                 platforms=platforms,
                 max_pages=max_pages,
                 max_results_per_platform=max_results_per_platform
             )
+            for keyword in keywords
+        ))
 
+        all_listings = []
+        search_errors = {}
+        for keyword, results in zip(keywords, keyword_results):
             for platform, result in results.items():
                 all_listings.extend(result.listings)
+                if result.errors:
+                    search_errors.setdefault(platform, []).extend(
+                        f"{keyword}: {error}" for error in result.errors
+                    )
 
         total_to_scan = len(all_listings)
 
@@ -613,7 +646,8 @@ class CrawlerManager:
         return {
             "total_scanned": total_scanned,
             "violations_found": violations_found,
-            "violations": violations
+            "violations": violations,
+            "search_errors": search_errors
         }
 
 
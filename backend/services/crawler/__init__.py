@@ -2,7 +2,7 @@
 E-commerce Platform Crawlers
 電商平台爬蟲服務
 """
-from .base import BaseCrawler, ProductListing, CrawlerResult
+from .base import BaseCrawler, ProductListing, ListingBatch, CrawlerResult
 from .shopee import ShopeeCrawler
 from .ruten import RutenCrawler
 from .yahoo import YahooCrawler
@@ -11,6 +11,7 @@ from .manager import CrawlerManager
 __all__ = [
     'BaseCrawler',
     'ProductListing',
+    'ListingBatch',
     'CrawlerResult',
     'ShopeeCrawler',
     'RutenCrawler',
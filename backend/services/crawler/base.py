@@ -3,16 +3,38 @@ Base Crawler Class
 爬蟲基礎類別 - 使用 httpx 進行簡單爬蟲
 """
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from array import array
+from dataclasses import dataclass, field, asdict
+from typing import (
+    List, Optional, Dict, Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Tuple, Union
+)
 from datetime import datetime
-import asyncio
-import random
 from loguru import logger
+import asyncio
+import json
+import math
+import time
 import httpx
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-@dataclass
+from ..downloader import get_download_service
+from .http_cache import get_http_cache
+from .rate_limit import get_rate_limiter
+from .resilience import get_resilience
+
+
+def json_loads(content: Union[bytes, str]) -> Any:
+    """Decode a JSON response body (orjson when installed, several times faster)"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+@dataclass(slots=True)
 class ProductListing:
     """商品列表資料結構"""
     id: str
@@ -32,6 +54,124 @@ class ProductListing:
     shipping_info: str = ''
     scraped_at: str = field(default_factory=lambda: datetime.now().isoformat())
     raw_data: Dict = field(default_factory=dict)
+    keywords: List[str] = field(default_factory=list)  # search keywords that found it (one scan)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class ListingBatch:
+    """
+    Columnar batch of listings from one platform
+    欄位式商品批次 - 大量商品不必各自建立 ProductListing
+
+    Strings are kept in one list per field and numbers in typed arrays;
+    platform, currency and scrape time are stored once per batch and
+    raw_data is not kept. ProductListing objects are built on access
+    (iteration, indexing), so a large crawl only materializes the
+    listings currently being processed. Slicing returns a batch.
+    """
+
+    STRING_FIELDS = (
+        'id', 'title', 'url', 'thumbnail_url', 'seller_id', 'seller_name',
+        'seller_url', 'location', 'shipping_info'
+    )
+
+    __slots__ = ('platform', 'currency', 'scraped_at', '_strings', '_prices', '_sales', '_ratings', '_reviews')
+
+    def __init__(self, platform: str, currency: str = 'TWD', scraped_at: Optional[str] = None):
+        self.platform = platform
+        self.currency = currency
+        self.scraped_at = scraped_at or datetime.now().isoformat()
+        self._strings: Tuple[List[str], ...] = tuple([] for _ in self.STRING_FIELDS)
+        self._prices = array('d')
+        self._sales = array('q')
+        self._ratings = array('d')  # NaN = no rating
+        self._reviews = array('q')
+
+    def append(
+        self,
+        id: str,
+        title: str,
+        url: str,
+        thumbnail_url: str,
+        price: float,
+        seller_id: str = '',
+        seller_name: str = '',
+        seller_url: str = '',
+        location: str = '',
+        shipping_info: str = '',
+        sales_count: int = 0,
+        rating: Optional[float] = None,
+        review_count: int = 0
+    ):
+        """Add one listing (string fields in STRING_FIELDS order)"""
+        for column, value in zip(
+            self._strings,
+            (id, title, url, thumbnail_url, seller_id, seller_name, seller_url, location, shipping_info)
+        ):
+            column.append(value)
+        self._prices.append(price)
+        self._sales.append(sales_count or 0)
+        self._ratings.append(math.nan if rating is None else rating)
+        self._reviews.append(review_count or 0)
+
+    def add(self, listing: ProductListing):
+        self.append(
+            *(getattr(listing, name) for name in self.STRING_FIELDS[:4]),
+            listing.price,
+            *(getattr(listing, name) for name in self.STRING_FIELDS[4:]),
+            listing.sales_count, listing.rating, listing.review_count
+        )
+
+    def extend(self, listings: Iterable[ProductListing]):
+        """Append listings; another batch is concatenated column by column"""
+        if isinstance(listings, ListingBatch):
+            for column, other in zip(self._strings, listings._strings):
+                column.extend(other)
+            self._prices.extend(listings._prices)
+            self._sales.extend(listings._sales)
+            self._ratings.extend(listings._ratings)
+            self._reviews.extend(listings._reviews)
+            return
+        for listing in listings:
+            self.add(listing)
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    def __iter__(self) -> Iterator[ProductListing]:
+        for index in range(len(self)):
+            yield self._listing(index)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[ProductListing, 'ListingBatch']:
+        if isinstance(index, slice):
+            batch = ListingBatch(self.platform, self.currency, self.scraped_at)
+            batch._strings = tuple(column[index] for column in self._strings)
+            batch._prices = self._prices[index]
+            batch._sales = self._sales[index]
+            batch._ratings = self._ratings[index]
+            batch._reviews = self._reviews[index]
+            return batch
+        return self._listing(range(len(self))[index])
+
+    def _listing(self, index: int) -> ProductListing:
+        strings = dict(zip(self.STRING_FIELDS, (column[index] for column in self._strings)))
+        rating = self._ratings[index]
+        return ProductListing(
+            platform=self.platform,
+            price=self._prices[index],
+            currency=self.currency,
+            sales_count=self._sales[index],
+            rating=None if math.isnan(rating) else rating,
+            review_count=self._reviews[index],
+            scraped_at=self.scraped_at,
+            **strings
+        )
+
+
+class PageFetchError(Exception):
+    """A result page could not be fetched (e.g. non-200 API response)"""
 
 
 @dataclass
@@ -40,7 +180,7 @@ class CrawlerResult:
     platform: str
     keyword: str
     total_found: int
-    listings: List[ProductListing]
+    listings: Union[List[ProductListing], ListingBatch]
     pages_scraped: int
     duration_ms: int
     errors: List[str] = field(default_factory=list)
@@ -53,19 +193,19 @@ class BaseCrawler(ABC):
     電商爬蟲基礎類別 - 使用 httpx
     """
 
+    # True when get_seller_products / seller_stream crawl a real seller catalogue;
+    # seller sweeps and frontier seller targets only use these platforms
+    supports_seller_crawl = False
+
     def __init__(
         self,
         platform_name: str,
         base_url: str,
-        delay_min: float = 1.0,
-        delay_max: float = 3.0,
         timeout: int = 30,
-        max_retries: int = 3
+        max_retries: Optional[int] = None
     ):
         self.platform_name = platform_name
         self.base_url = base_url
-        self.delay_min = delay_min
-        self.delay_max = delay_max
         self.timeout = timeout
         self.max_retries = max_retries
         self.headers = {
@@ -74,22 +214,110 @@ class BaseCrawler(ABC):
             'Accept-Language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
         }
 
-    async def random_delay(self):
-        """Add random delay between requests"""
-        delay = random.uniform(self.delay_min, self.delay_max)
-        await asyncio.sleep(delay)
+    async def request(
+        self,
+        url: str,
+        params: Optional[Dict] = None,
+        is_search: bool = False
+    ) -> httpx.Response:
+        """
+        GET through the shared pool, paced by the per-host rate limiter
+
+        The limiter is shared by every crawler and scan; throttling
+        responses (429/403/503) slow the host down, healthy ones speed it up.
+        Transient failures are retried with backoff within the platform's
+        retry budget; raises CircuitOpenError while the platform is down.
+
+        With the HTTP cache enabled, fresh responses are served from disk
+        and stale ones are revalidated with a conditional GET. is_search
+        applies the cache's search-result TTL instead of the headers'.
+        """
+        async def send(extra_headers: Dict[str, str]) -> httpx.Response:
+            headers = {**self.headers, **extra_headers}
+
+            async def attempt() -> httpx.Response:
+                limiter = get_rate_limiter()
+                await limiter.acquire(url)
+                response = await get_download_service().get(url, params=params, headers=headers)
+                limiter.record(url, response.status_code, response.headers.get('Retry-After'))
+                return response
+
+            return await get_resilience().call(self.platform_name, attempt, max_retries=self.max_retries)
+
+        cache = get_http_cache()
+        if cache is None:
+            return await send({})
+
+        full_url = str(httpx.URL(url, params=params)) if params else url
+        return await cache.fetch(full_url, send, cache.search_ttl if is_search else None)
 
     async def fetch(self, url: str) -> Optional[str]:
         """Fetch URL content"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout, headers=self.headers) as client:
-                response = await client.get(url)
-                response.raise_for_status()
-                return response.text
+            response = await self.request(url)
+            response.raise_for_status()
+            return response.text
         except Exception as e:
             logger.error(f"Failed to fetch {url}: {e}")
             return None
 
+    async def iter_pages(
+        self,
+        fetch_page: Callable[[int], Awaitable[List]],
+        max_pages: int,
+        page_size: int
+    ) -> AsyncIterator[Tuple[int, Optional[List], Optional[str]]]:
+        """
+        Fetch result pages concurrently when page offsets are known up front
+
+        All pages are requested at once (the host rate limiter paces them)
+        and yielded in page order as soon as they and the pages before them
+        are in; once a page comes back short or empty the later pages are
+        cancelled. Close the iterator (contextlib.aclosing) when stopping early.
+
+        Args:
+            fetch_page: Coroutine function page index (0-based) -> items
+            max_pages: Pages to request
+            page_size: Items on a full page
+
+        Yields:
+            (page index, items or None if the page failed, error message or None)
+        """
+        tasks = [asyncio.ensure_future(fetch_page(page)) for page in range(max_pages)]
+
+        def cut_after(page: int, task: asyncio.Future):
+            if not task.cancelled() and task.exception() is None and len(task.result()) < page_size:
+                for later in tasks[page + 1:]:
+                    later.cancel()
+
+        for page, task in enumerate(tasks):
+            task.add_done_callback(lambda task, page=page: cut_after(page, task))
+
+        try:
+            for page, task in enumerate(tasks):
+                await asyncio.wait([task])
+                if task.cancelled():
+                    break
+                if task.exception() is not None:
+                    e = task.exception()
+                    error = (
+                        f"Timeout on page {page + 1}" if isinstance(e, httpx.TimeoutException)
+                        else f"Error on page {page + 1}: {e}"
+                    )
+                    logger.warning(error)
+                    yield page, None, error
+                    continue
+
+                items = task.result()
+                yield page, items, None
+                if len(items) < page_size:
+                    break
+        finally:
+            for task in tasks:
+                if task.done() and not task.cancelled():
+                    task.exception()  # retrieved: no "never retrieved" warning
+                task.cancel()
+
     @abstractmethod
     async def search(
         self,
@@ -100,6 +328,26 @@ class BaseCrawler(ABC):
         """Search for products"""
         pass
 
+    async def search_stream(
+        self,
+        keyword: str,
+        on_listings: Callable[[Iterable[ProductListing]], Awaitable[None]],
+        max_pages: int = 5,
+        max_results: int = 100
+    ) -> CrawlerResult:
+        """
+        Search, handing listings to on_listings as result pages arrive
+
+        The returned CrawlerResult has no listings (total_found counts them);
+        awaiting on_listings is the caller's backpressure. The default runs
+        search() and hands over one batch; paged crawlers override this.
+        """
+        result = await self.search(keyword=keyword, max_pages=max_pages, max_results=max_results)
+        listings, result.listings = result.listings, []
+        if listings:
+            await on_listings(listings)
+        return result
+
     @abstractmethod
     async def get_product_details(self, product_url: str) -> Optional[ProductListing]:
         """Get detailed information for a single product"""
@@ -114,13 +362,57 @@ class BaseCrawler(ABC):
         """Get all products from a seller"""
         pass
 
+    async def seller_stream(
+        self,
+        seller_id: str,
+        on_listings: Callable[[Iterable[ProductListing]], Awaitable[None]],
+        max_products: int = 500
+    ) -> CrawlerResult:
+        """
+        A seller's catalogue, handed to on_listings as pages arrive
+
+        Like search_stream; the result's keyword is 'seller:<seller_id>'.
+        The default runs get_seller_products() and hands over one batch;
+        paged crawlers override this.
+        """
+        start_time = time.time()
+        errors = []
+        listings: List[ProductListing] = []
+        try:
+            listings = await self.get_seller_products(seller_id, max_products=max_products)
+        except Exception as e:
+            errors.append(f"Seller crawl failed: {e}")
+            logger.error(f"{self.platform_name} seller {seller_id}: {e}")
+
+        if listings:
+            await on_listings(listings)
+        return CrawlerResult(
+            platform=self.platform_name,
+            keyword=f"seller:{seller_id}",
+            total_found=len(listings),
+            listings=[],
+            pages_scraped=1 if listings else 0,
+            duration_ms=int((time.time() - start_time) * 1000),
+            errors=errors,
+            success=not errors
+        )
+
     async def download_image(self, image_url: str) -> Optional[bytes]:
-        """Download image from URL"""
+        """Download image from URL (shared connection pool, size-capped, HTTP cache)"""
+        async def send(extra_headers: Dict[str, str]) -> httpx.Response:
+            limiter = get_rate_limiter()
+            await limiter.acquire(image_url)
+            response = await get_download_service().fetch_response(
+                image_url, headers={**self.headers, **extra_headers}
+            )
+            limiter.record(image_url, response.status_code, response.headers.get('Retry-After'))
+            return response
+
         try:
-            async with httpx.AsyncClient(timeout=30, headers=self.headers) as client:
-                response = await client.get(image_url)
-                response.raise_for_status()
-                return response.content
+            cache = get_http_cache()
+            response = await (cache.fetch(image_url, send) if cache is not None else send({}))
+            response.raise_for_status()
+            return response.content
         except Exception as e:
             logger.error(f"Failed to download image {image_url}: {e}")
             return None
@@ -0,0 +1,56 @@
+"""
+Listing Deduplication
+商品去重 - 同一商品被多個關鍵字、或以不同網址形式搜到時只比對一次
+
+身分鍵：
+- 平台 + 商品 ID
+- 沒有商品 ID 時：標準化商品網址（去除追蹤參數；蝦皮 -i.<shop>.<item> 形式統一）
+
+同一張圖片（SHA-256 相同）的不同商品仍是不同商品：比對結果共用（只比對一次），
+但每一筆都會回報。
+"""
+import re
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from .base import ProductListing
+
+# Query parameters that never identify a product
+TRACKING_PARAMS = ('utm_', 'sp_atk', 'xptdk', 'spm', 'fbclid', 'gclid', 'ref')
+
+SHOPEE_ITEM = re.compile(r'(?:-i\.|/product/)(\d+)[./](\d+)')
+
+
+def canonical_url(url: str) -> Optional[str]:
+    """Comparable form of a product URL (None if empty)"""
+    if not url:
+        return None
+
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+
+    if 'shopee' in host:
+        match = SHOPEE_ITEM.search(parts.path)
+        if match:
+            return f"{host}/product/{match.group(1)}/{match.group(2)}"
+
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith(TRACKING_PARAMS)
+    )
+    return host + parts.path.rstrip('/') + (f"?{urlencode(query)}" if query else '')
+
+
+def listing_keys(listing: ProductListing) -> List[Tuple[str, ...]]:
+    """
+    Identity keys known before the thumbnail is downloaded
+
+    The URL is only used for listings without an id: a listing URL can be
+    a search or shop page that many products share.
+    """
+    if listing.id:
+        return [('id', listing.platform, str(listing.id))]
+    url = canonical_url(listing.url)
+    return [('url', url)] if url else []
@@ -0,0 +1,214 @@
+"""
+Crawl Frontier
+爬取優先順序 - 依侵權歷史決定先爬哪些目標、各爬多少
+
+目標：關鍵字 x 平台的搜尋，以及有侵權紀錄的賣家全店。分數來自
+- 近期命中：曾在該關鍵字 / 賣家找到侵權（依發現時間指數衰減）
+- 新鮮度：上次爬取時新出現或縮圖變更的商品比例（從未爬過 = 全新）
+
+每個平台的商品額度與原本相同（關鍵字數 x 每平台上限）：每個掃描關鍵字先保底
+min(min_share, 額度 / 關鍵字數)，其餘依分數比例分配（單一目標有上限，用不完的額度
+往下一個目標流）。只有賣家目標會因分到太少而略過，略過時逐一記錄。
+爬取依分數高低排入，管理器的並行名額先給高分目標。
+"""
+import math
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+# Label (watermark keyword) prefix of seller catalogue crawls
+SELLER_LABEL = 'seller:'
+
+
+@dataclass
+class CrawlTarget:
+    """One keyword search or seller catalogue crawl on one platform"""
+    kind: str  # 'keyword' or 'seller'
+    platform: str
+    value: str  # keyword or seller id
+    score: float = 1.0
+    limit: int = 0  # listings allotted
+    hits: float = 0.0  # decayed past violations
+    freshness: float = 1.0  # new / changed share of the last crawl
+
+    @property
+    def label(self) -> str:
+        """Keyword the pipeline records listings under"""
+        return self.value if self.kind == 'keyword' else f"{SELLER_LABEL}{self.value}"
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), 'label': self.label}
+
+
+class CrawlFrontier:
+    """
+    Scores and budgets crawl targets from violation history
+
+    Violation history is passed in per plan (violation records are the
+    source of truth); crawl freshness is observed here between scans.
+    """
+
+    def __init__(
+        self,
+        half_life_hours: float = 72.0,
+        max_sellers: int = 20,
+        target_cap: float = 3.0,
+        min_share: int = 10,
+        stale_floor: float = 0.25
+    ):
+        """
+        Args:
+            half_life_hours: Age at which a past violation counts half
+            max_sellers: Seller catalogues added to a keyword scan
+            target_cap: Max listings per target, in multiples of the
+                per-platform limit a scan asked for
+            min_share: Listings guaranteed to each scan keyword (at most an
+                even split of the budget); seller targets allotted fewer
+                are skipped
+            stale_floor: Score factor left for a target whose last crawl
+                found nothing new
+        """
+        self.half_life = half_life_hours * 3600
+        self.max_sellers = max_sellers
+        self.target_cap = target_cap
+        self.min_share = min_share
+        self.stale_floor = stale_floor
+        self._freshness: Dict[Tuple[str, str], float] = {}
+
+    def plan(
+        self,
+        keywords: List[str],
+        platforms: List[str],
+        max_results: int,
+        history: Iterable[Dict] = (),
+        now: Optional[float] = None,
+        seller_platforms: Optional[List[str]] = None
+    ) -> List[CrawlTarget]:
+        """
+        Targets to crawl, highest score first, with their listing limits
+
+        Args:
+            keywords: Scan keywords
+            platforms: Scan platforms
+            max_results: Listings per keyword search the scan asked for;
+                a platform's budget is len(keywords) x max_results
+            history: Past violations, dicts with 'listing' (platform,
+                keywords, seller_id) and 'detected_at' (ISO time)
+            now: Current time (epoch seconds)
+            seller_platforms: Platforms that can crawl seller catalogues
+                (None = all); other platforms get keyword targets only
+        """
+        now = time.time() if now is None else now
+        keyword_hits: Dict[Tuple[str, str], float] = {}
+        seller_hits: Dict[Tuple[str, str], float] = {}
+
+        for violation in history:
+            listing = violation.get('listing') or {}
+            platform = listing.get('platform') or violation.get('platform')
+            if platform not in platforms:
+                continue
+            weight = self._decay(violation.get('detected_at'), now)
+            for keyword in listing.get('keywords') or []:
+                if keyword in keywords:
+                    keyword_hits[(platform, keyword)] = keyword_hits.get((platform, keyword), 0.0) + weight
+            if listing.get('seller_id') and (seller_platforms is None or platform in seller_platforms):
+                key = (platform, str(listing['seller_id']))
+                seller_hits[key] = seller_hits.get(key, 0.0) + weight
+
+        targets = [
+            self._target('keyword', platform, keyword, keyword_hits.get((platform, keyword), 0.0))
+            for platform in platforms for keyword in keywords
+        ]
+        sellers = sorted(seller_hits.items(), key=lambda item: item[1], reverse=True)[:self.max_sellers]
+        targets += [self._target('seller', platform, seller_id, hits) for (platform, seller_id), hits in sellers]
+
+        planned = []
+        for platform in platforms:
+            planned += self._allot(
+                [target for target in targets if target.platform == platform],
+                budget=len(keywords) * max_results,
+                cap=max(self.min_share, int(max_results * self.target_cap))
+            )
+        planned.sort(key=lambda target: target.score, reverse=True)
+
+        skipped = len(targets) - len(planned)
+        logger.info(f"Crawl frontier: {len(planned)} targets planned, {skipped} skipped")
+        return planned
+
+    def record_crawl(self, platform: str, label: str, scanned: int, fresh: int):
+        """A target's crawl finished: share of its listings that were new or changed"""
+        if scanned:
+            self._freshness[(platform, label)] = fresh / scanned
+
+    def _target(self, kind: str, platform: str, value: str, hits: float) -> CrawlTarget:
+        target = CrawlTarget(kind, platform, value, hits=round(hits, 3))
+        target.freshness = self._freshness.get((platform, target.label), 1.0)
+        # Every scan keyword gets a base score; sellers only score by their violations
+        value = hits if kind == 'seller' else 1.0 + hits
+        target.score = round(value * (self.stale_floor + (1.0 - self.stale_floor) * target.freshness), 4)
+        return target
+
+    def _allot(self, targets: List[CrawlTarget], budget: int, cap: int) -> List[CrawlTarget]:
+        """
+        One platform's budget: every keyword gets its floor, the rest is
+        split in proportion to score, highest first; unused share flows down
+        """
+        targets = sorted(targets, key=lambda target: target.score, reverse=True)
+        keywords = [target for target in targets if target.kind == 'keyword']
+        floor = min(self.min_share, budget // len(keywords)) if keywords else 0
+        for target in keywords:
+            target.limit = floor
+        budget -= floor * len(keywords)
+
+        mass = sum(target.score for target in targets)
+        planned = []
+        for target in targets:
+            share = 0
+            if budget > 0 and mass > 0:
+                share = min(cap - target.limit, budget, int(round(budget * target.score / mass)))
+            mass -= target.score
+
+            if target.kind == 'keyword':
+                target.limit += share
+                budget -= share
+                if target.limit <= 0:
+                    logger.warning(f"Crawl frontier: keyword {target.platform}:{target.value} got no listings")
+                planned.append(target)
+            elif share < self.min_share:
+                logger.info(
+                    f"Crawl frontier: skipping seller {target.platform}:{target.value} "
+                    f"(share {share} < {self.min_share}, score {target.score})"
+                )
+            else:
+                target.limit = share
+                budget -= share
+                planned.append(target)
+        return planned
+
+    def _decay(self, detected_at: Optional[str], now: float) -> float:
+        if not detected_at:
+            return 1.0
+        try:
+            age = max(0.0, now - datetime.fromisoformat(detected_at).timestamp())
+        except (TypeError, ValueError):
+            return 1.0
+        return math.pow(0.5, age / self.half_life) if self.half_life > 0 else 1.0
+
+
+_frontier: Optional[CrawlFrontier] = None
+
+
+def configure_crawl_frontier(enabled: bool = True, **kwargs) -> Optional[CrawlFrontier]:
+    """Enable history-driven crawl planning; called from app lifespan"""
+    global _frontier
+    _frontier = CrawlFrontier(**kwargs) if enabled else None
+    logger.info(f"Crawl frontier: {'on' if enabled else 'off'}")
+    return _frontier
+
+
+def get_crawl_frontier() -> Optional[CrawlFrontier]:
+    """Shared frontier, or None to crawl every keyword x platform evenly"""
+    return _frontier
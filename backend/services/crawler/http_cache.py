@@ -0,0 +1,319 @@
+"""
+HTTP Cache
+爬蟲 HTTP 磁碟快取 - 週期性掃描同一批關鍵字時，搜尋結果與縮圖不必每次重新下載
+
+- 遵守 Cache-Control（no-store / no-cache / max-age）與 Expires
+- 儲存 ETag / Last-Modified，過期後以條件式 GET 重新驗證（304 時沿用快取內容）
+- 搜尋結果可設定 TTL 覆寫（平台 API 通常回傳 no-cache）
+- 超過容量上限時依 mtime 淘汰最久未使用的項目
+- 命中率同時記錄全域與每次掃描（scan_cache_stats()）
+"""
+import contextlib
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Iterator, Optional
+
+import httpx
+from loguru import logger
+
+# Response headers worth keeping with a cached body
+STORED_HEADERS = ('content-type', 'etag', 'last-modified', 'cache-control')
+
+
+@dataclass
+class CacheStats:
+    """Cache outcome counters"""
+    hits: int = 0          # served fresh from disk, no request
+    revalidated: int = 0   # conditional GET answered 304
+    misses: int = 0        # full download
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.revalidated + self.misses
+        return (self.hits + self.revalidated) / total if total else 0.0
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), 'hit_ratio': round(self.hit_ratio, 3)}
+
+
+@dataclass
+class CachedResponse:
+    """A cached 200 response"""
+    url: str
+    body: bytes
+    headers: Dict[str, str]
+    expires_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Validators for a conditional GET"""
+        headers = {}
+        if self.headers.get('etag'):
+            headers['If-None-Match'] = self.headers['etag']
+        if self.headers.get('last-modified'):
+            headers['If-Modified-Since'] = self.headers['last-modified']
+        return headers
+
+    def to_response(self) -> httpx.Response:
+        """Rebuild a 200 response from the cached body"""
+        return httpx.Response(
+            200, headers=self.headers, content=self.body, request=httpx.Request('GET', self.url)
+        )
+
+
+# Per-scan counters: CrawlerManager sets a fresh CacheStats for each scan;
+# tasks spawned by the scan inherit it through the context
+_scan_stats: contextvars.ContextVar[Optional[CacheStats]] = contextvars.ContextVar(
+    'http_cache_scan_stats', default=None
+)
+
+
+@contextlib.contextmanager
+def scan_cache_stats() -> Iterator[CacheStats]:
+    """Count cache outcomes of the requests made inside the block (one scan)"""
+    stats = CacheStats()
+    token = _scan_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _scan_stats.reset(token)
+
+
+def _freshness(headers: Dict[str, str], ttl_override: Optional[float]) -> Optional[float]:
+    """Seconds the response may be served without revalidation; None = don't store"""
+    directives = {}
+    for part in headers.get('cache-control', '').lower().split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name] = value.strip('"')
+
+    if 'no-store' in directives:
+        return None
+    if ttl_override is not None:
+        return ttl_override
+    if 'no-cache' in directives:
+        return 0.0
+    if directives.get('max-age', '').isdigit():
+        return float(directives['max-age'])
+    if headers.get('expires'):
+        try:
+            return max(0.0, parsedate_to_datetime(headers['expires']).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 0.0
+    return 0.0
+
+
+class HTTPCache:
+    """
+    On-disk cache of GET responses keyed by full URL
+
+    Each entry is <sha256(url)>.body plus a .json sidecar with the stored
+    headers and expiry. Entries that are stale but carry an ETag or
+    Last-Modified are kept for revalidation. fetch() does its disk reads
+    and writes in a worker thread, and eviction runs on a background
+    thread, so the event loop never waits on file I/O.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 1024 * 1024 * 1024,
+        search_ttl: Optional[float] = 3600.0
+    ):
+        """
+        Args:
+            directory: Cache directory
+            max_bytes: Size cap; least recently used entries are evicted
+            search_ttl: Freshness override for search result pages (None = honour headers)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.search_ttl = search_ttl
+        self.stats = CacheStats()
+
+        self._lock = threading.Lock()
+        self._written = 0
+        self._evicting = False
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return f"{base}.body", f"{base}.json"
+
+    def lookup(self, url: str) -> Optional[CachedResponse]:
+        """Cached response for url (fresh or revalidatable), or None"""
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+            os.utime(meta_path)  # LRU bookkeeping
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('url') != url:
+            return None
+        return CachedResponse(url, body, meta['headers'], meta['expires_at'])
+
+    def store(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        body: bytes,
+        ttl_override: Optional[float] = None
+    ) -> bool:
+        """Store a 200 response if its headers allow it"""
+        headers = {k.lower(): v for k, v in headers.items()}
+        freshness = _freshness(headers, ttl_override)
+        if freshness is None:
+            return False
+        if freshness <= 0 and not (headers.get('etag') or headers.get('last-modified')):
+            return False  # neither fresh nor revalidatable
+
+        kept = {name: headers[name] for name in STORED_HEADERS if name in headers}
+        meta = {'url': url, 'headers': kept, 'expires_at': time.time() + freshness}
+
+        body_path, meta_path = self._paths(url)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            with open(body_path + suffix, 'wb') as f:
+                f.write(body)
+            with open(meta_path + suffix, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(body_path + suffix, body_path)
+            os.replace(meta_path + suffix, meta_path)
+        except OSError as e:
+            logger.warning(f"HTTP cache write failed: {e}")
+            return False
+
+        with self._lock:
+            self._written += len(body)
+            check = self._written > self.max_bytes // 20 and not self._evicting
+            if check:
+                self._written = 0
+                self._evicting = True
+        if check:
+            threading.Thread(target=self._evict_in_background, name='http-cache-evict', daemon=True).start()
+        return True
+
+    def _evict_in_background(self):
+        try:
+            self.evict()
+        except Exception as e:
+            logger.warning(f"HTTP cache eviction failed: {e}")
+        finally:
+            with self._lock:
+                self._evicting = False
+
+    def refresh(self, entry: CachedResponse, headers: Dict[str, str], ttl_override: Optional[float] = None):
+        """A 304 revalidated entry: extend its freshness from the new headers"""
+        merged = {**entry.headers, **{k.lower(): v for k, v in headers.items()}}
+        self.store(entry.url, merged, entry.body, ttl_override)
+
+    async def fetch(
+        self,
+        url: str,
+        send: Callable[[Dict[str, str]], Awaitable[httpx.Response]],
+        ttl_override: Optional[float] = None
+    ) -> httpx.Response:
+        """
+        Serve url from the cache, revalidating or downloading as needed
+
+        Args:
+            url: Full request URL (query string included) - the cache key
+            send: Coroutine function extra headers -> response (body read)
+            ttl_override: Freshness to use instead of the response headers
+
+        Returns:
+            The cached response when fresh or revalidated (304), otherwise
+            the response from send() - stored when it is a cacheable 200
+        """
+        entry = await asyncio.to_thread(self.lookup, url)
+        if entry is not None and entry.fresh:
+            self.record('hits')
+            return entry.to_response()
+
+        response = await send(entry.conditional_headers() if entry is not None else {})
+        if response.status_code == 304 and entry is not None:
+            await asyncio.to_thread(self.refresh, entry, response.headers, ttl_override)
+            self.record('revalidated')
+            return entry.to_response()
+
+        self.record('misses')
+        if response.status_code == 200:
+            await asyncio.to_thread(self.store, url, response.headers, response.content, ttl_override)
+        return response
+
+    def record(self, outcome: str):
+        """Count 'hits' / 'revalidated' / 'misses' globally and for the current scan"""
+        for stats in (self.stats, _scan_stats.get()):
+            if stats is not None:
+                setattr(stats, outcome, getattr(stats, outcome) + 1)
+
+    def metrics(self) -> Dict:
+        return {**self.stats.to_dict(), 'max_bytes': self.max_bytes}
+
+    def evict(self):
+        """Remove least recently used entries until under 90% of max_bytes"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(root, name)
+                body_path = meta_path[:-len('.json')] + '.body'
+                try:
+                    size = os.path.getsize(body_path) + os.path.getsize(meta_path)
+                    mtime = os.path.getmtime(meta_path)
+                except OSError:
+                    continue
+                entries.append((mtime, size, meta_path, body_path))
+                total += size
+
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        entries.sort()
+        removed = 0
+        for _, size, meta_path, body_path in entries:
+            if total <= target:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        logger.info(f"HTTP cache evicted {removed} entries ({total / 1024 / 1024:.1f} MB left)")
+
+
+_cache: Optional[HTTPCache] = None
+
+
+def configure_http_cache(directory: str, max_bytes: int, search_ttl: Optional[float] = 3600.0) -> HTTPCache:
+    """Enable the shared HTTP cache; called from app lifespan"""
+    global _cache
+    _cache = HTTPCache(directory, max_bytes, search_ttl)
+    logger.info(f"HTTP cache: {directory} (max {max_bytes / 1024 / 1024:.0f} MB)")
+    return _cache
+
+
+def get_http_cache() -> Optional[HTTPCache]:
+    """Shared HTTP cache, or None when caching is disabled"""
+    return _cache
@@ -0,0 +1,97 @@
+"""
+Image Variants
+商品圖片尺寸版本 - 依比對需要的最小邊長，向平台 CDN 要最小的可用版本
+
+蝦皮 CDN 的 <hash>_tn 縮圖約 300px，位元組數只有原圖的一小部分；
+pHash / 顏色直方圖只需 128 / 256px，用縮圖即可。ORB 需要原圖細節：
+比對引擎在案例真的進入 ORB 階段時才下載原圖（fingerprint['orb_source']）。
+不認得的網址（沒有已知版本的平台）一律原樣使用。
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional, Pattern, Tuple
+
+from loguru import logger
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """A CDN rendition: the original image URL + suffix"""
+    suffix: str
+    min_side: int  # shortest side the CDN serves for this rendition
+
+
+@dataclass(frozen=True)
+class CDNRule:
+    """
+    Image URLs of one platform CDN
+
+    pattern's 'base' group is the original image URL, the optional
+    'variant' group the rendition suffix the URL currently carries.
+    """
+    platform: str
+    pattern: Pattern
+    renditions: Tuple[Rendition, ...]  # smallest first
+
+
+DEFAULT_RULES = (
+    CDNRule(
+        'shopee',
+        re.compile(
+            r'^(?P<base>https?://(?:cf\.shopee\.tw|down-[a-z]+\.img\.susercontent\.com)/file/[\w-]+?)'
+            r'(?P<variant>_tn)?$'
+        ),
+        (Rendition('_tn', 300),)
+    ),
+)
+
+
+class ImageVariantPolicy:
+    """Picks the CDN rendition to download for a listing image"""
+
+    def __init__(self, rules: Tuple[CDNRule, ...] = DEFAULT_RULES):
+        self.rules = rules
+
+    def _match(self, url: str) -> Optional[Tuple[CDNRule, str]]:
+        for rule in self.rules:
+            match = rule.pattern.match(url)
+            if match:
+                return rule, match.group('base')
+        return None
+
+    def select(self, url: str, min_side: int = 0) -> str:
+        """
+        Smallest rendition of url whose shorter side is >= min_side
+
+        Returns the original image URL when no rendition is big enough,
+        and url unchanged when its CDN has no known renditions.
+        """
+        matched = self._match(url) if url else None
+        if matched is None:
+            return url
+        rule, base = matched
+        for rendition in rule.renditions:
+            if rendition.min_side >= min_side:
+                return base + rendition.suffix
+        return base
+
+    def original(self, url: str) -> str:
+        """Full-size image behind a (possibly rendition) URL"""
+        matched = self._match(url) if url else None
+        return matched[1] if matched is not None else url
+
+
+_policy: Optional[ImageVariantPolicy] = None
+
+
+def configure_image_variants(enabled: bool = True) -> Optional[ImageVariantPolicy]:
+    """Enable CDN rendition selection; called from app lifespan"""
+    global _policy
+    _policy = ImageVariantPolicy() if enabled else None
+    logger.info(f"Image CDN variants: {'on' if enabled else 'off'}")
+    return _policy
+
+
+def get_image_variant_policy() -> Optional[ImageVariantPolicy]:
+    """Shared policy, or None to always download the listing's own image URL"""
+    return _policy
@@ -3,12 +3,18 @@ Crawler Manager
 爬蟲管理器 - 統一管理多平台爬蟲
 """
 import asyncio
-from typing import List, Dict, Optional
+import hashlib
+from typing import Awaitable, Callable, Iterable, List, Dict, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 from loguru import logger
 
 from .base import ProductListing, CrawlerResult
+from .frontier import get_crawl_frontier
+from .http_cache import scan_cache_stats
+from .pipeline import ScanPipeline, notify
+from .resilience import get_resilience
+from .watermarks import get_watermark_store
 from .shopee import ShopeeCrawler
 from .ruten import RutenCrawler
 from .yahoo import YahooCrawler
@@ -34,13 +40,39 @@ class CrawlerManager:
     統一管理蝦皮、露天、Yahoo 爬蟲
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        max_concurrency: int = 6,
+        platform_concurrency: int = 2,
+        queue_size: int = 64,
+        download_workers: int = 8,
+        compare_workers: int = 4,
+        outcome_cache_size: int = 10000
+    ):
+        """
+        Args:
+            max_concurrency: Platform searches running at once (all platforms)
+            platform_concurrency: Searches running at once per platform
+            queue_size: Scan pipeline listings waiting for a thumbnail download
+            download_workers: Scan pipeline concurrent thumbnail downloads
+            compare_workers: Scan pipeline concurrent fingerprint / compare jobs
+            outcome_cache_size: Scan pipeline compare outcomes kept for reuse
+        """
         self.crawlers = {
             'shopee': ShopeeCrawler(),
             'ruten': RutenCrawler(),
             'yahoo': YahooCrawler()
         }
         self._progress_callbacks: Dict[str, callable] = {}
+        self.queue_size = queue_size
+        self.download_workers = download_workers
+        self.compare_workers = compare_workers
+        self.outcome_cache_size = outcome_cache_size
+
+        self._search_limit = asyncio.Semaphore(max_concurrency)
+        self._platform_limits = {
+            platform: asyncio.Semaphore(platform_concurrency) for platform in self.crawlers
+        }
 
     def get_crawler(self, platform: str):
         """Get crawler for specific platform"""
@@ -55,14 +87,14 @@ class CrawlerManager:
         on_progress: callable = None
     ) -> Dict[str, CrawlerResult]:
         """
-        Search across multiple platforms
+        Search across multiple platforms concurrently
 
         Args:
             keyword: Search keyword
             platforms: List of platforms to search (default: all)
             max_pages: Max pages per platform
             max_results_per_platform: Max results per platform
-            on_progress: Progress callback function
+            on_progress: Progress callback function (may be async)
 
         Returns:
             Dict of platform -> CrawlerResult
@@ -70,40 +102,103 @@ class CrawlerManager:
         if platforms is None:
             platforms = list(self.crawlers.keys())
 
+        await notify(
+            on_progress, 0, "正在搜尋 " + "、".join(self._get_platform_name(p) for p in platforms) + "..."
+        )
+
+        tasks = [
+            self._search_platform(platform, keyword, max_pages, max_results_per_platform)
+            for platform in dict.fromkeys(platforms)
+        ]
         results = {}
-        total_platforms = len(platforms)
-
-        for i, platform in enumerate(platforms):
-            if on_progress:
-                progress = int((i / total_platforms) * 100)
-                on_progress(progress, f"正在搜尋 {self._get_platform_name(platform)}...")
-
-            crawler = self.crawlers.get(platform)
-            if crawler:
-                try:
-                    result = await crawler.search(
-                        keyword=keyword,
-                        max_pages=max_pages,
-                        max_results=max_results_per_platform
-                    )
-                    results[platform] = result
-                except Exception as e:
-                    logger.error(f"Error searching {platform}: {e}")
-                    results[platform] = CrawlerResult(
-                        platform=platform,
-                        keyword=keyword,
-                        total_found=0,
-                        listings=[],
-                        pages_scraped=0,
-                        duration_ms=0,
-                        errors=[str(e)],
-                        success=False
-                    )
+        for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+            result = await task
+            results[result.platform] = result
+            await notify(
+                on_progress,
+                int(done / len(tasks) * 100),
+                f"{self._get_platform_name(result.platform)} 搜尋完成"
+            )
+
+        # Keep the caller's platform order
+        return {platform: results[platform] for platform in platforms}
 
-        if on_progress:
-            on_progress(100, "搜尋完成")
+    async def _search_platform(
+        self,
+        platform: str,
+        keyword: str,
+        max_pages: int,
+        max_results: int,
+        on_listings: Optional[Callable[[Iterable[ProductListing]], Awaitable[None]]] = None
+    ) -> CrawlerResult:
+        """
+        One platform search under the global and per-platform limits
+
+        Never raises: failures become a CrawlerResult with success=False,
+        so one platform's error doesn't lose the others' listings.
+        With on_listings, listings are streamed to it as pages arrive
+        (crawler.search_stream) instead of collected in the result.
+        """
+        crawler = self.crawlers.get(platform)
+        if crawler is None:
+            return self._failed_result(platform, keyword, f"Unknown platform: {platform}")
+        if get_resilience().breaker(platform).is_open():
+            # Platform is down or blocking us: don't spend the scan on timeouts
+            return self._failed_result(platform, keyword, f"{platform} circuit open, skipped")
+
+        async with self._search_limit, self._platform_limits[platform]:
+            try:
+                if on_listings is not None:
+                    return await crawler.search_stream(
+                        keyword, on_listings, max_pages=max_pages, max_results=max_results
+                    )
+                return await crawler.search(
+                    keyword=keyword,
+                    max_pages=max_pages,
+                    max_results=max_results
+                )
+            except Exception as e:
+                logger.error(f"Error searching {platform}: {e}")
+                return self._failed_result(platform, keyword, str(e))
+
+    async def _crawl_seller(
+        self,
+        platform: str,
+        seller_id: str,
+        max_products: int,
+        on_listings: Callable[[Iterable[ProductListing]], Awaitable[None]]
+    ) -> CrawlerResult:
+        """
+        One seller catalogue crawl under the global and per-platform limits
 
-        return results
+        Never raises, like _search_platform; listings are streamed to
+        on_listings (crawler.seller_stream).
+        """
+        label = f"seller:{seller_id}"
+        crawler = self.crawlers.get(platform)
+        if crawler is None:
+            return self._failed_result(platform, label, f"Unknown platform: {platform}")
+        if get_resilience().breaker(platform).is_open():
+            return self._failed_result(platform, label, f"{platform} circuit open, skipped")
+
+        async with self._search_limit, self._platform_limits[platform]:
+            try:
+                return await crawler.seller_stream(seller_id, on_listings, max_products=max_products)
+            except Exception as e:
+                logger.error(f"Error crawling {platform} seller {seller_id}: {e}")
+                return self._failed_result(platform, label, str(e))
+
+    def _failed_result(self, platform: str, keyword: str, error: str) -> CrawlerResult:
+        return CrawlerResult(
+            platform=platform,
+            keyword=keyword,
+            total_found=0,
+            listings=[],
+            pages_scraped=0,
+            duration_ms=0,
+            errors=[error],
+            success=False
+        )
 
     async def scan_with_comparison(
         self,
@@ -113,11 +208,34 @@ class CrawlerManager:
         similarity_threshold: float = 70.0,
         max_pages: int = 5,
         max_results_per_platform: int = 50,
-        on_progress: callable = None
+        on_progress: callable = None,
+        asset_fingerprints: Optional[List[Optional[Dict]]] = None,
+        cascade: Optional[List] = None,
+        incremental: bool = True,
+        on_violation: callable = None,
+        history: Optional[Iterable[Dict]] = None,
+        defer_watermarks: callable = None
     ) -> Dict:
         """
         Scan platforms and compare images
 
+        Runs as a streaming pipeline (see pipeline.ScanPipeline): listings
+        are compared while other result pages are still being crawled,
+        with bounded queues between searches, thumbnail downloads and
+        fingerprint / compare workers. Each asset and each thumbnail URL
+        is fingerprinted exactly once; asset x listing pairs are prefiltered
+        by pHash distance and only the survivors go through the cascade.
+
+        With the watermark store enabled and incremental=True, listings
+        already compared for the same keyword and assets (same id, same
+        thumbnail URL) are not compared again; they are counted under
+        'unchanged_listings' in the result.
+
+        With the crawl frontier enabled, keyword x platform searches and
+        the catalogues of sellers in the violation history are crawled
+        highest score first, sharing the same listing budget per platform
+        (len(keywords) x max_results_per_platform) in proportion to score.
+
         Args:
             asset_images: Original images to protect
             keywords: Search keywords
@@ -125,95 +243,174 @@ class CrawlerManager:
             similarity_threshold: Minimum similarity to flag
             max_pages: Max pages per platform
             max_results_per_platform: Max results per platform
-            on_progress: Progress callback
+            on_progress: Progress callback (progress, message); may be async
+            asset_fingerprints: Precomputed fingerprints aligned with
+                asset_images (None entries are computed here)
+            cascade: Comparison cascade stages (default: engine default)
+            incremental: Skip listings unchanged since the last scan
+            on_violation: Callback (violation) as soon as one is found; may be async
+            history: Past violations for the crawl frontier (dicts with
+                'listing' and 'detected_at')
+            defer_watermarks: Takes the scan's watermark write to run once
+                the job is recorded completed (None = write when the scan ends)
 
         Returns:
             Dict with scan results and violations
         """
-        from ..image_compare import ImageCompareEngine
+        pipeline = await self._prepare_pipeline(
+            asset_images, asset_fingerprints, similarity_threshold, cascade,
+            incremental, on_progress, on_violation, defer_watermarks
+        )
+
+        frontier = get_crawl_frontier()
+        with scan_cache_stats() as cache_stats:
+            if frontier is not None:
+                targets = frontier.plan(
+                    keywords, platforms, max_results_per_platform, history or (),
+                    seller_platforms=self.seller_platforms()
+                )
+                result = await pipeline.run_targets(targets, max_pages)
+                result['frontier'] = [target.to_dict() for target in targets]
+            else:
+                result = await pipeline.run(keywords, platforms, max_pages, max_results_per_platform)
+        self._record_crawls(result)
+
+        await notify(on_progress, 100, f"掃描完成！發現 {result['violations_found']} 個可疑侵權")
+
+        return {**result, 'http_cache': cache_stats.to_dict()}
+
+    def seller_platforms(self) -> List[str]:
+        """Platforms whose crawler lists a seller's whole catalogue"""
+        return [platform for platform, crawler in self.crawlers.items() if crawler.supports_seller_crawl]
+
+    async def sweep_sellers(
+        self,
+        asset_images: List[str],
+        sellers: List[Tuple[str, str]],
+        similarity_threshold: float = 70.0,
+        max_products: int = 500,
+        on_progress: callable = None,
+        asset_fingerprints: Optional[List[Optional[Dict]]] = None,
+        cascade: Optional[List] = None,
+        incremental: bool = True,
+        on_violation: callable = None,
+        defer_watermarks: callable = None
+    ) -> Dict:
+        """
+        Crawl whole seller catalogues and compare every listing
 
-        compare_engine = ImageCompareEngine(similarity_threshold=similarity_threshold)
-
-        all_violations = []
-        all_listings = []
-        total_steps = len(keywords) * len(platforms) + len(asset_images)
-        current_step = 0
-
-        # Step 1: Search for products
-        for keyword in keywords:
-            search_results = await self.search_all_platforms(
-                keyword=keyword,
-                platforms=platforms,
-                max_pages=max_pages,
-                max_results_per_platform=max_results_per_platform,
-                on_progress=None  # We'll handle progress ourselves
-            )
+        Sellers already caught infringing tend to list more copies than a
+        keyword search surfaces. Same pipeline as scan_with_comparison;
+        with incremental=True, listings compared under any keyword for the
+        same assets and unchanged since are skipped.
+
+        Args:
+            asset_images: Original images to protect
+            sellers: (platform, seller_id) pairs; sellers on platforms
+                without seller crawling (see seller_platforms) are skipped
+            similarity_threshold: Minimum similarity to flag
+            max_products: Max listings per seller
+            on_progress: Progress callback (progress, message); may be async
+            asset_fingerprints: Precomputed fingerprints aligned with asset_images
+            cascade: Comparison cascade stages (default: engine default)
+            incremental: Skip listings unchanged since they were last compared
+            on_violation: Callback (violation) as soon as one is found; may be async
+            defer_watermarks: Takes the sweep's watermark write to run once
+                the job is recorded completed (None = write when the sweep ends)
 
-            for platform, result in search_results.items():
-                all_listings.extend(result.listings)
-                current_step += 1
+        Returns:
+            Dict with sweep results and violations
+        """
+        supported = self.seller_platforms()
+        for platform, seller_id in sellers:
+            if platform not in supported:
+                logger.warning(f"Skipping seller {platform}:{seller_id}: no seller crawling on {platform}")
+        sellers = [(platform, seller_id) for platform, seller_id in sellers if platform in supported]
 
-                if on_progress:
-                    progress = int((current_step / total_steps) * 60)  # 0-60% for search
-                    on_progress(progress, f"已搜尋 {len(all_listings)} 個商品...")
+        pipeline = await self._prepare_pipeline(
+            asset_images, asset_fingerprints, similarity_threshold, cascade,
+            incremental, on_progress, on_violation, defer_watermarks
+        )
 
-        # Step 2: Compare images
-        if on_progress:
-            on_progress(60, "開始 AI 圖片比對...")
+        with scan_cache_stats() as cache_stats:
+            result = await pipeline.run_sellers(sellers, max_products)
+        self._record_crawls(result)
 
-        for i, asset_image in enumerate(asset_images):
-            current_step += 1
+        await notify(on_progress, 100, f"賣家掃描完成！發現 {result['violations_found']} 個可疑侵權")
 
-            if on_progress:
-                progress = 60 + int((i / len(asset_images)) * 35)  # 60-95% for comparison
-                on_progress(progress, f"正在比對資產 {i + 1}/{len(asset_images)}...")
+        return {**result, 'http_cache': cache_stats.to_dict()}
 
-            # Compare against all listings
-            for listing in all_listings:
-                if not listing.thumbnail_url:
-                    continue
+    async def _prepare_pipeline(
+        self,
+        asset_images: List[str],
+        asset_fingerprints: Optional[List[Optional[Dict]]],
+        similarity_threshold: float,
+        cascade: Optional[List],
+        incremental: bool,
+        on_progress: callable,
+        on_violation: callable,
+        defer_watermarks: callable = None
+    ) -> ScanPipeline:
+        """Fingerprint the assets and set up a scan pipeline comparing against them"""
+        from ..image_compare import ImageCompareEngine
 
-                try:
-                    result = await compare_engine.compare(
-                        asset_image,
-                        listing.thumbnail_url,
-                        fast_mode=True  # Use fast mode for initial scan
-                    )
+        compare_engine = ImageCompareEngine(
+            similarity_threshold=similarity_threshold,
+            cascade=cascade
+        )
+
+        await notify(on_progress, 0, "正在準備原創圖片指紋...")
+
+        # Fingerprint each asset once
+        if asset_fingerprints is None:
+            asset_fingerprints = [None] * len(asset_images)
+
+        assets = []
+        for asset_image, fingerprint in zip(asset_images, asset_fingerprints):
+            if fingerprint is None:
+                fingerprint = await compare_engine.compute_fingerprint(asset_image)
+            if fingerprint is None:
+                logger.warning("Skipping asset without fingerprint")
+                continue
+            assets.append((asset_image, fingerprint))
+
+        # ORB stage: one index query per listing shortlists the assets worth pairwise matching
+        if any(stage.name == 'orb' for stage in compare_engine.cascade):
+            await compare_engine.build_orb_index(
+                {str(asset_idx): asset_fp for asset_idx, (_, asset_fp) in enumerate(assets)}
+            )
 
-                    if result.is_match:
-                        # Do full comparison for potential matches
-                        full_result = await compare_engine.compare(
-                            asset_image,
-                            listing.thumbnail_url,
-                            fast_mode=False
-                        )
-
-                        if full_result.is_match:
-                            all_violations.append({
-                                'listing': listing.__dict__,
-                                'similarity': {
-                                    'overall': full_result.overall_similarity,
-                                    'phash_score': full_result.phash_score,
-                                    'orb_score': full_result.orb_score,
-                                    'color_score': full_result.color_score,
-                                    'level': full_result.similarity_level
-                                },
-                                'asset_image': asset_image if not asset_image.startswith('data:') else '[base64]'
-                            })
-
-                except Exception as e:
-                    logger.debug(f"Error comparing with {listing.url}: {e}")
-
-        if on_progress:
-            on_progress(100, f"掃描完成！發現 {len(all_violations)} 個可疑侵權")
-
-        return {
-            'total_scanned': len(all_listings),
-            'violations_found': len(all_violations),
-            'violations': all_violations,
-            'platforms_searched': platforms,
-            'keywords_used': keywords
-        }
+        watermarks = get_watermark_store() if incremental else None
+        return ScanPipeline(
+            self,
+            compare_engine,
+            assets,
+            watermarks=watermarks,
+            scope=self._watermark_scope(assets, compare_engine) if watermarks else '',
+            queue_size=self.queue_size,
+            download_workers=self.download_workers,
+            compare_workers=self.compare_workers,
+            outcome_cache_size=self.outcome_cache_size,
+            on_progress=on_progress,
+            on_violation=on_violation,
+            defer_watermarks=defer_watermarks
+        )
+
+    @staticmethod
+    def _record_crawls(result: Dict):
+        """Feed how fresh each crawl's listings were back to the crawl frontier"""
+        frontier = get_crawl_frontier()
+        if frontier is None:
+            return
+        for crawl in result.get('crawls', []):
+            frontier.record_crawl(crawl['platform'], crawl['label'], crawl['scanned'], crawl['fresh'])
+
+    @staticmethod
+    def _watermark_scope(assets: List[tuple], compare_engine) -> str:
+        """Watermarks only apply to scans with the same assets and match criteria"""
+        asset_keys = sorted(fp.get('digest') or fp['hashes']['phash'] for _, fp in assets)
+        criteria = f"{compare_engine.threshold}|{compare_engine.cascade!r}|{','.join(asset_keys)}"
+        return hashlib.sha256(criteria.encode()).hexdigest()[:32]
 
     def _get_platform_name(self, platform: str) -> str:
         """Get Chinese name for platform"""
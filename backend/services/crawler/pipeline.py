@@ -0,0 +1,519 @@
+"""
+Scan Pipeline
+串流掃描管線 - 爬取、下載與比對同時進行
+
+    searches ──listings──▶ [listing queue] ──▶ thumbnail downloaders
+             ──bytes──▶ [image queue] ──▶ fingerprint / compare workers ──▶ violations
+
+- 搜尋結果每頁一到就送進佇列，不必等所有關鍵字、平台搜尋完畢
+- 佇列有上限：下游忙碌時上游自然等待，記憶體用量取決於佇列大小而非商品總數；
+  比對完成的商品只保留去重用的身分鍵，縮圖 / 圖片比對結果以 LRU 保留最近的 outcome_cache_size 筆
+- 同一縮圖網址每次掃描只下載一次，同時的請求合併（image_downloads）
+- 內容相同的圖片（以 SHA-256 判斷）只計算指紋、比對一次，結果分送給所有共用的商品
+- 重複商品（商品 ID，沒有 ID 時為標準化網址）合併為一筆，關鍵字併入 listing.keywords；
+  同賣家以同一張圖片上架的不同商品共用比對結果，但各自回報
+- 發現侵權立即回呼 on_violation（寫入掃描紀錄、推送 WebSocket）
+- 增量掃描水位在掃描結束後才寫入（佇列中的任務在任務記錄為完成後才寫入）：
+  失敗或交還佇列的嘗試不留水位，重試時重新比對、回報所有商品
+- 賣家全店掃描（run_sellers）走同一條管線，任何關鍵字下比對過且未變更的商品不再比對
+- 依爬取優先順序（frontier.CrawlFrontier）的目標與額度爬取：run_targets
+"""
+import asyncio
+import inspect
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from .base import ProductListing
+from .dedupe import listing_keys
+from .frontier import SELLER_LABEL, CrawlTarget
+from .image_variants import get_image_variant_policy
+from .watermarks import WatermarkStore
+
+Outcome = Optional[Tuple[Optional[str], List]]  # (image digest, matches), None if it failed to load
+
+
+@dataclass
+class _Entry:
+    """A unique listing waiting on its thumbnail, and the duplicates merged into it"""
+    listing: ProductListing
+    members: List[Tuple[str, ProductListing]]  # (keyword, listing), the first one included
+    keys: List[tuple]
+
+
+class _LRU(OrderedDict):
+    """Dict keeping the most recently used maxsize items"""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+async def notify(callback: Optional[Callable], *args):
+    """Call a progress / violation callback, awaiting it if it is async"""
+    if callback is None:
+        return
+    result = callback(*args)
+    if inspect.isawaitable(result):
+        await result
+
+
+class ScanPipeline:
+    """
+    One scan as a bounded producer / consumer pipeline
+
+    Created per scan by CrawlerManager.scan_with_comparison with the
+    scan's assets already fingerprinted.
+    """
+
+    def __init__(
+        self,
+        manager,
+        compare_engine,
+        assets: List[Tuple[str, Dict]],
+        watermarks: Optional[WatermarkStore] = None,
+        scope: str = '',
+        queue_size: int = 64,
+        download_workers: int = 8,
+        compare_workers: int = 4,
+        outcome_cache_size: int = 10000,
+        on_progress: Optional[Callable] = None,
+        on_violation: Optional[Callable] = None,
+        defer_watermarks: Optional[Callable[[Callable[[], None]], None]] = None
+    ):
+        """
+        Args:
+            manager: CrawlerManager running the searches
+            compare_engine: ImageCompareEngine with the scan's cascade
+            assets: (asset image, fingerprint) pairs
+            watermarks: Store for incremental scans (None = compare everything)
+            scope: Watermark scope of this scan's assets and criteria
+            queue_size: Listings waiting for a thumbnail download
+            download_workers: Concurrent thumbnail downloads
+            compare_workers: Concurrent fingerprint / compare jobs
+            outcome_cache_size: Thumbnail URLs / image digests whose compare
+                outcome is kept for reuse; older ones are compared again
+            on_progress: Callback (progress 0-100, message)
+            on_violation: Callback (violation dict), called as soon as found
+            defer_watermarks: Takes the scan's watermark write (a sync
+                callable) to run once the job is recorded completed
+                (None = write as soon as the scan finishes)
+        """
+        from ..image_compare import HashIndex
+
+        self.manager = manager
+        self.engine = compare_engine
+        self.assets = assets
+        self.watermarks = watermarks
+        self.scope = scope
+        self.queue_size = queue_size
+        self.download_workers = download_workers
+        self.compare_workers = compare_workers
+        self.on_progress = on_progress
+        self.on_violation = on_violation
+        self.defer_watermarks = defer_watermarks
+
+        self.asset_index = HashIndex()
+        for asset_idx, (_, asset_fp) in enumerate(assets):
+            self.asset_index.add(str(asset_idx), asset_fp['hashes']['phash'])
+        # Pairs below the cascade's pHash reject bound can never match
+        min_phash = compare_engine.phash_prefilter()
+        self.max_distance = int((self.asset_index.bits or 0) * (1 - min_phash / 100) + 1e-9)
+        # Thumbnails are fetched as the smallest CDN rendition the cheap stages can use
+        self.variants = get_image_variant_policy()
+        self.fetch_side = compare_engine.required_side()
+
+        self.scanned = 0
+        self.unique = 0
+        self.compared = 0
+        self.processed = 0
+        self.thumbnail_bytes = 0
+        self.searches = 0
+        self.searches_done = 0
+        self.unchanged = 0
+        self.thumbnail_urls = 0
+        self.unique_images = 0
+        self.violations: List[Dict] = []
+        self.exit_stages: Dict[str, int] = {}
+        self.search_errors: Dict[str, List[str]] = {}
+
+        # Recent compare outcomes per thumbnail URL and per image SHA-256
+        self._outcomes: Dict[str, Outcome] = _LRU(outcome_cache_size)
+        self._image_outcomes: Dict[str, Outcome] = _LRU(outcome_cache_size)
+        # Listings waiting on a thumbnail URL already queued for download
+        self._waiting: Dict[str, List[_Entry]] = {}
+        # Identity key (id / canonical URL) -> listing still waiting on its thumbnail
+        self._entries: Dict[tuple, _Entry] = {}
+        # Identity key (id / canonical URL) of a settled listing -> its image digest
+        self._settled: Dict[tuple, Optional[str]] = {}
+        # URLs waiting on an image being compared
+        self._image_waiting: Dict[str, List[str]] = {}
+        # Watermarks per (keyword, platform), and seller listings' latest per (platform, id)
+        self._seen: Dict[Tuple[str, str], Dict] = {}
+        self._latest: Dict[Tuple[str, str], Tuple[str, Optional[str]]] = {}
+        # Per crawl (label, platform): [listings, new or changed listings]
+        self._crawl_stats: Dict[Tuple[str, str], List[int]] = {}
+        # Watermarks of this scan, written only once it finishes: a failed or
+        # handed-back attempt leaves none, so its retry compares every listing again
+        self._watermark_rows: List[tuple] = []
+        self._touched_rows: List[tuple] = []
+
+    async def run(self, keywords: List[str], platforms: List[str], max_pages: int, max_results: int) -> Dict:
+        """Search every keyword x platform and compare listings as they arrive"""
+        crawls = [
+            (keyword, platform, partial(self.manager._search_platform, platform, keyword, max_pages, max_results))
+            for keyword in keywords for platform in platforms
+        ]
+        result = await self._run(crawls)
+        return {**result, 'platforms_searched': platforms, 'keywords_used': keywords}
+
+    async def run_sellers(self, sellers: List[Tuple[str, str]], max_products: int) -> Dict:
+        """
+        Crawl whole seller catalogues and compare listings as they arrive
+
+        Listings already compared under any keyword (same thumbnail) are
+        skipped as unchanged; watermarks are recorded under 'seller:<id>'.
+        """
+        sellers = list(dict.fromkeys(sellers))
+        crawls = [
+            (f"seller:{seller_id}", platform,
+             partial(self.manager._crawl_seller, platform, seller_id, max_products))
+            for platform, seller_id in sellers
+        ]
+        result = await self._run(crawls)
+        return {
+            **result,
+            'platforms_searched': list(dict.fromkeys(platform for platform, _ in sellers)),
+            'keywords_used': [],
+            'sellers': [{'platform': platform, 'seller_id': seller_id} for platform, seller_id in sellers]
+        }
+
+    async def run_targets(self, targets: List[CrawlTarget], max_pages: int) -> Dict:
+        """Crawl frontier targets (highest score first) with their listing limits"""
+        crawls = []
+        for target in targets:
+            if target.kind == 'seller':
+                crawl = partial(self.manager._crawl_seller, target.platform, target.value, target.limit)
+            else:
+                crawl = partial(self.manager._search_platform, target.platform, target.value, max_pages, target.limit)
+            crawls.append((target.label, target.platform, crawl))
+        result = await self._run(crawls)
+        return {
+            **result,
+            'platforms_searched': list(dict.fromkeys(target.platform for target in targets)),
+            'keywords_used': list(dict.fromkeys(target.value for target in targets if target.kind == 'keyword'))
+        }
+
+    async def _run(self, crawls: List[Tuple[str, str, Callable[..., Awaitable]]]) -> Dict:
+        """
+        Run crawls (label, platform, crawl(on_listings=...) -> CrawlerResult)
+        through the download / compare workers
+        """
+        listing_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        image_queue: asyncio.Queue = asyncio.Queue(max(1, self.compare_workers * 2))
+        self.searches = len(crawls)
+
+        async def produce(keyword: str, platform: str, crawl: Callable[..., Awaitable]):
+            async def on_listings(batch: Iterable[ProductListing]):
+                batch = list(batch)
+                if self.watermarks:
+                    await self._load_previous(keyword, batch)
+                for listing in batch:
+                    await self._accept(keyword, listing, listing_queue)
+
+            result = await crawl(on_listings=on_listings)
+            if result.errors:
+                self.search_errors.setdefault(platform, []).extend(
+                    f"{keyword}: {error}" for error in result.errors
+                )
+            self.searches_done += 1
+            await self._report(f"{keyword} @ {self.manager._get_platform_name(platform)} 搜尋完成")
+
+        workers = [
+            asyncio.create_task(self._download_worker(listing_queue, image_queue))
+            for _ in range(self.download_workers)
+        ] + [
+            asyncio.create_task(self._compare_worker(image_queue))
+            for _ in range(self.compare_workers)
+        ]
+        try:
+            await asyncio.gather(*(produce(*crawl) for crawl in crawls))
+            await listing_queue.join()
+            await image_queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        await self._commit_watermarks()
+
+        return {
+            'total_scanned': self.scanned,
+            'raw_listings': self.scanned,
+            'unique_listings': self.unique,
+            'compared': self.compared,
+            'thumbnail_urls': self.thumbnail_urls,
+            'unique_images': self.unique_images,
+            'thumbnail_bytes': self.thumbnail_bytes,
+            'unchanged_listings': self.unchanged,
+            'violations_found': len(self.violations),
+            'violations': self.violations,
+            'cascade_exit_stages': self.exit_stages,
+            'search_errors': self.search_errors,
+            'crawls': [
+                {'label': label, 'platform': platform, 'scanned': scanned, 'fresh': fresh}
+                for (label, platform), (scanned, fresh) in self._crawl_stats.items()
+            ]
+        }
+
+    async def _accept(self, keyword: str, listing: ProductListing, listing_queue: asyncio.Queue):
+        """A listing from a search: merge duplicates, skip it if unchanged, else queue its thumbnail"""
+        self.scanned += 1
+        stats = self._crawl_stats.setdefault((keyword, listing.platform), [0, 0])
+        stats[0] += 1
+
+        keys = listing_keys(listing)
+        settled = next((key for key in keys if key in self._settled), None)
+        if settled is not None:
+            # Duplicate of a listing already settled: only its identity keys are left
+            digest = self._settled[settled]
+            for key in keys:
+                self._settled.setdefault(key, digest)
+            if digest is not None:
+                self._remember(keyword, listing, digest)
+            return
+        entry = next((self._entries[key] for key in keys if key in self._entries), None)
+        if entry is not None:
+            self._merge(entry, keyword, listing, keys)
+            return
+
+        self.unique += 1
+        listing.keywords = [keyword]
+        entry = _Entry(listing, [(keyword, listing)], keys)
+
+        if self.watermarks and listing.id:
+            previous = self._previous(keyword, listing)
+            if previous and previous[0] == listing.thumbnail_url:
+                self.unchanged += 1
+                self._settle(entry, previous[1])
+                self._touched_rows.append((keyword, listing.platform, listing.id))
+                return
+
+        stats[1] += 1
+        url = listing.thumbnail_url
+        if not url or not self.asset_index.bits:
+            self._settle(entry, None)
+            return
+        if self.variants is not None:
+            url = self.variants.select(url, self.fetch_side)
+
+        for key in keys:
+            self._entries[key] = entry
+        self.compared += 1
+        if url in self._outcomes:
+            await self._finish(entry, self._outcomes.get(url))
+        elif url in self._waiting:
+            self._waiting[url].append(entry)
+        else:
+            self._waiting[url] = [entry]
+            await listing_queue.put(url)  # blocks while downloaders are behind
+
+    async def _load_previous(self, keyword: str, batch: List[ProductListing]):
+        """Fetch the watermarks a batch of listings is checked against, off the event loop"""
+        if keyword.startswith(SELLER_LABEL):
+            # Seller crawls look each listing up under any keyword: one query per batch
+            ids: Dict[str, List[str]] = {}
+            for listing in batch:
+                if listing.id:
+                    ids.setdefault(listing.platform, []).append(listing.id)
+            for platform, listing_ids in ids.items():
+                latest = await asyncio.to_thread(self.watermarks.latest_many, self.scope, platform, listing_ids)
+                self._latest.update(((platform, listing_id), row) for listing_id, row in latest.items())
+            return
+        for platform in {listing.platform for listing in batch}:
+            key = (keyword, platform)
+            if key not in self._seen:
+                self._seen[key] = await asyncio.to_thread(self.watermarks.seen, self.scope, keyword, platform)
+
+    def _previous(self, keyword: str, listing: ProductListing) -> Optional[Tuple[str, Optional[str]]]:
+        """(thumbnail_url, image_hash) the listing was last compared with, if any (see _load_previous)"""
+        if keyword.startswith(SELLER_LABEL):
+            return self._latest.pop((listing.platform, listing.id), None)
+        return self._seen.get((keyword, listing.platform), {}).get(listing.id)
+
+    def _merge(self, entry: _Entry, keyword: str, listing: ProductListing, keys: List[tuple]):
+        """Fold a duplicate listing (and its keyword) into a unique one still waiting on its thumbnail"""
+        for key in keys:
+            if key not in self._entries:
+                self._entries[key] = entry
+                entry.keys.append(key)
+
+        entry.members.append((keyword, listing))
+        if keyword not in entry.listing.keywords:
+            entry.listing.keywords.append(keyword)
+
+    def _settle(self, entry: _Entry, digest: Optional[str]):
+        """Release a finished entry, keeping only its identity keys for later duplicates"""
+        for key in entry.keys:
+            self._entries.pop(key, None)
+            self._settled[key] = digest
+
+    async def _download_worker(self, listing_queue: asyncio.Queue, image_queue: asyncio.Queue):
+        from ..image_compare.loader import image_downloads
+
+        while True:
+            url = await listing_queue.get()
+            try:
+                # URL known to hold an image already compared in this scan: no download
+                known = image_downloads.digest(url)
+                if known is not None and known in self._image_outcomes:
+                    await self._resolve(url, self._image_outcomes.get(known))
+                    continue
+
+                try:
+                    digest, data = await image_downloads.fetch(url)
+                except Exception as e:
+                    logger.debug(f"Thumbnail download failed {url}: {e}")
+                    await self._resolve(url, None)
+                    continue
+
+                # Byte-identical images behind different URLs are compared once
+                if digest in self._image_outcomes:
+                    await self._resolve(url, self._image_outcomes.get(digest))
+                elif digest in self._image_waiting:
+                    self._image_waiting[digest].append(url)
+                else:
+                    self._image_waiting[digest] = [url]
+                    self.thumbnail_bytes += len(data)
+                    await image_queue.put((digest, data, url))
+            except Exception as e:
+                logger.error(f"Download worker error: {e}")
+            finally:
+                listing_queue.task_done()
+
+    async def _compare_worker(self, image_queue: asyncio.Queue):
+        while True:
+            digest, data, url = await image_queue.get()
+            try:
+                try:
+                    outcome = await self._compare(data, url)
+                except Exception as e:
+                    logger.error(f"Compare failed for image {digest[:12]}: {e}")
+                    outcome = None
+                del data
+
+                self.unique_images += 1
+                self._image_outcomes[digest] = outcome
+                for url in self._image_waiting.pop(digest, []):
+                    await self._resolve(url, outcome)
+            except Exception as e:
+                logger.error(f"Compare worker error: {e}")
+            finally:
+                image_queue.task_done()
+
+    async def _compare(self, data: bytes, url: str) -> Outcome:
+        """Fingerprint one thumbnail and run it against the matching assets"""
+        listing_fp = await self.engine.compute_fingerprint(data)
+        if not listing_fp:
+            return None
+        if self.variants is not None and self.variants.original(url) != url:
+            listing_fp['orb_source'] = self.variants.original(url)  # fetched only if ORB runs
+
+        matches = []
+        listing_hash = listing_fp['hashes']['phash']
+        if len(listing_hash) * 4 != self.asset_index.bits:
+            return listing_fp.get('digest'), matches
+
+        for asset_key, distance in self.asset_index.radius_query(listing_hash, self.max_distance):
+            asset_image, asset_fp = self.assets[int(asset_key)]
+
+            # Only ambiguous pairs reach the colour / ORB stages
+            result = await self.engine.cascade_compare(asset_fp, listing_fp, index_key=asset_key)
+            exit_stage = result.details.get('exit_stage')
+            self.exit_stages[exit_stage] = self.exit_stages.get(exit_stage, 0) + 1
+            if not result.is_match:
+                continue
+
+            matches.append((asset_image, {
+                'overall': result.overall_similarity,
+                'phash_score': result.phash_score,
+                'orb_score': result.orb_score,
+                'color_score': result.color_score,
+                'level': result.similarity_level,
+                'exit_stage': exit_stage
+            }))
+        return listing_fp.get('digest'), matches
+
+    async def _resolve(self, url: str, outcome: Outcome):
+        """A thumbnail is done: settle every listing that was waiting on it"""
+        self.thumbnail_urls += 1
+        self._outcomes[url] = outcome
+        for entry in self._waiting.pop(url, []):
+            await self._finish(entry, outcome)
+
+    async def _finish(self, entry: _Entry, outcome: Outcome):
+        self.processed += 1
+        if self.processed % 10 == 0:
+            await self._report(f"正在比對商品 {self.processed}/{self.compared}...")
+
+        # Thumbnails that failed to load are not recorded, so the next scan retries them
+        if outcome is None:
+            self._settle(entry, None)
+            return
+
+        digest, matches = outcome
+        self._settle(entry, digest)
+        for keyword, member in entry.members:
+            self._remember(keyword, member, digest)
+
+        for asset_image, similarity in matches:
+            violation = {
+                'listing': entry.listing.to_dict(),
+                'similarity': similarity,
+                'asset_image': asset_image if not asset_image.startswith('data:') else '[base64]'
+            }
+            self.violations.append(violation)
+            await notify(self.on_violation, violation)
+
+    def _remember(self, keyword: str, listing: ProductListing, digest: Optional[str]):
+        """Queue a watermark row for a compared listing"""
+        if not self.watermarks or not listing.id:
+            return
+        self._watermark_rows.append((keyword, listing.platform, listing.id, listing.thumbnail_url, digest))
+
+    async def _commit_watermarks(self):
+        """The scan finished: write its watermarks, or hand the write to the job (defer_watermarks)"""
+        if not self.watermarks or not (self._watermark_rows or self._touched_rows):
+            return
+        write = partial(self._write_watermarks, self._watermark_rows, self._touched_rows)
+        self._watermark_rows, self._touched_rows = [], []
+        if self.defer_watermarks is not None:
+            self.defer_watermarks(write)
+        else:
+            await asyncio.to_thread(write)
+
+    def _write_watermarks(self, rows: List[tuple], touched: List[tuple]):
+        if rows:
+            self.watermarks.record(self.scope, rows)
+        if touched:
+            self.watermarks.touch(self.scope, touched)
+
+    async def _report(self, message: str):
+        """Progress: half for searches done, half for listings compared so far"""
+        searched = self.searches_done / self.searches if self.searches else 1.0
+        compared = self.processed / self.compared if self.compared else 1.0
+        await notify(self.on_progress, min(99, int(50 * searched + 50 * searched * compared)), message)
@@ -0,0 +1,142 @@
+"""
+Host Rate Limiter
+每個主機一個 token bucket 的自適應限速器 - 取代固定的隨機延遲
+
+同一行程內所有爬蟲實例與同時進行的掃描共用同一個限速器（get_rate_limiter()），
+同一主機的請求總速率不會因為並行而倍增。多個掃描工作行程時，每個行程以 1/N 的
+速率設定（runtime.configure_services），總速率同樣維持在設定值。
+速率以 AIMD 調整：收到 429 / 403 / 503 時乘法降速（並清空累積的 burst），
+正常回應時線性加速，直到 max_rate。
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+THROTTLE_STATUS = {403, 429, 503}
+
+
+@dataclass
+class _Bucket:
+    rate: float                 # tokens (requests) per second
+    tokens: float               # may go negative: reserved future slots
+    updated: float = field(default_factory=time.monotonic)
+    last_decrease: float = 0.0
+    requests: int = 0
+    throttled: int = 0
+
+
+class HostRateLimiter:
+    """
+    Per-host token bucket with additive-increase / multiplicative-decrease
+
+    acquire() reserves a token and sleeps until it is available, so
+    concurrent callers are spaced out instead of all waking at once.
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: int = 4,
+        min_rate: float = 0.2,
+        max_rate: float = 10.0,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+        host_rates: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            rate: Initial requests/second per host
+            burst: Bucket size (requests allowed back-to-back)
+            min_rate / max_rate: Bounds for the adaptive rate
+            increase: Rate added per healthy response
+            decrease: Rate multiplier on a throttling response
+            host_rates: Initial rate overrides by host
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.host_rates = host_rates or {}
+        self._buckets: Dict[str, _Bucket] = {}
+
+    def _bucket(self, url: str) -> _Bucket:
+        host = urlsplit(url).netloc or url
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = _Bucket(
+                rate=self.host_rates.get(host, self.rate),
+                tokens=float(self.burst)
+            )
+        return bucket
+
+    def _refill(self, bucket: _Bucket, now: float):
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+        bucket.updated = now
+
+    async def acquire(self, url: str):
+        """Wait for the host's next request slot"""
+        bucket = self._bucket(url)
+        self._refill(bucket, time.monotonic())
+        bucket.tokens -= 1
+        bucket.requests += 1
+        if bucket.tokens < 0:
+            await asyncio.sleep(-bucket.tokens / bucket.rate)
+
+    def record(self, url: str, status_code: int, retry_after: Optional[str] = None):
+        """Adapt the host's rate to a response status"""
+        bucket = self._bucket(url)
+        now = time.monotonic()
+
+        if status_code in THROTTLE_STATUS:
+            bucket.throttled += 1
+            # One decrease per refill interval: a burst of concurrent 429s is one signal
+            if now - bucket.last_decrease >= 1 / bucket.rate:
+                self._refill(bucket, now)
+                bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+                bucket.tokens = min(bucket.tokens, 0.0)
+                bucket.last_decrease = now
+                logger.warning(
+                    f"{urlsplit(url).netloc} throttled ({status_code}), "
+                    f"rate -> {bucket.rate:.2f}/s"
+                )
+            if retry_after and retry_after.isdigit():
+                # Pause the host: push the next free slot past Retry-After
+                bucket.tokens = min(bucket.tokens, -int(retry_after) * bucket.rate)
+
+        elif status_code < 400:
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+    def metrics(self) -> Dict[str, Dict]:
+        """Current rate and counters per host"""
+        return {
+            host: {
+                'rate': round(bucket.rate, 3),
+                'requests': bucket.requests,
+                'throttled': bucket.throttled
+            }
+            for host, bucket in self._buckets.items()
+        }
+
+
+_limiter: Optional[HostRateLimiter] = None
+
+
+def configure_rate_limiter(**kwargs) -> HostRateLimiter:
+    """Create the shared limiter; called from app lifespan"""
+    global _limiter
+    _limiter = HostRateLimiter(**kwargs)
+    return _limiter
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """Shared limiter (defaults if not configured)"""
+    global _limiter
+    if _limiter is None:
+        _limiter = HostRateLimiter()
+    return _limiter
@@ -0,0 +1,238 @@
+"""
+Crawler Resilience
+重試、退避與熔斷 - 暫時性錯誤自動重試，平台封鎖時快速失敗
+
+- 指數退避 + full jitter，遵守 Retry-After
+- 每個平台一個重試預算（重試次數不超過請求數的固定比例），
+  平台大規模故障時不會因重試而放大流量
+- 每個平台一個熔斷器：連續失敗達門檻後開啟，冷卻期間直接拋出
+  CircuitOpenError，冷卻結束後放行一個探測請求（half-open）
+- 熔斷器與預算是行程內的狀態：每個掃描工作行程各自計算
+"""
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+from loguru import logger
+
+# Worth retrying: throttling and transient server errors
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Count against the circuit breaker (403: the platform is blocking us)
+FAILURE_STATUS = RETRY_STATUS | {403}
+
+
+class CircuitOpenError(Exception):
+    """The platform's circuit breaker is open; the request was not sent"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    closed -> open after failure_threshold consecutive failures;
+    open -> half_open after reset_timeout (one probe request allowed);
+    half_open -> closed on success, back to open on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+
+    def is_open(self) -> bool:
+        """Open and still cooling down (requests would fail fast)"""
+        return self.state == 'open' and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def check(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        if self.state == 'closed':
+            return
+        if self.state == 'open':
+            if self.is_open():
+                raise CircuitOpenError(f"{self.name} circuit open")
+            self.state = 'half_open'
+            self._probing = False
+        if self._probing:
+            raise CircuitOpenError(f"{self.name} circuit half-open, probe in flight")
+        self._probing = True
+
+    def record_success(self):
+        if self.state != 'closed':
+            logger.info(f"{self.name} circuit closed")
+        self.state = 'closed'
+        self.failures = 0
+        self._probing = False
+
+    def release(self):
+        """The request ended without a verdict (e.g. cancelled); free the probe slot"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                self.times_opened += 1
+                logger.warning(
+                    f"{self.name} circuit open for {self.reset_timeout:.0f}s "
+                    f"after {self.failures} failures"
+                )
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+    def metrics(self) -> Dict:
+        return {'state': self.state, 'failures': self.failures, 'times_opened': self.times_opened}
+
+
+class RetryBudget:
+    """
+    Retries allowed as a fraction of requests
+
+    Every request deposits `ratio` tokens and every retry spends one, up to
+    `max_tokens` saved - a short burst of retries is fine, but sustained
+    retries stay under `ratio` of traffic during an outage.
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.retries = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            self.exhausted += 1
+            return False
+        self.tokens -= 1
+        self.retries += 1
+        return True
+
+    def metrics(self) -> Dict:
+        return {'tokens': round(self.tokens, 2), 'retries': self.retries, 'exhausted': self.exhausted}
+
+
+class CrawlerResilience:
+    """Retry policy plus per-platform breakers and budgets (shared by all crawlers)"""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        budget_ratio: float = 0.2,
+        breaker_failures: int = 5,
+        breaker_reset: float = 30.0
+    ):
+        """
+        Args:
+            max_retries: Retries per request (on top of the first attempt)
+            base_delay / max_delay: Exponential backoff bounds in seconds
+            budget_ratio: Retries allowed per request, per platform
+            breaker_failures: Consecutive failures that open a breaker
+            breaker_reset: Seconds a breaker stays open before a probe
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._budgets: Dict[str, RetryBudget] = {}
+
+    def breaker(self, platform: str) -> CircuitBreaker:
+        if platform not in self._breakers:
+            self._breakers[platform] = CircuitBreaker(platform, self.breaker_failures, self.breaker_reset)
+        return self._breakers[platform]
+
+    def budget(self, platform: str) -> RetryBudget:
+        if platform not in self._budgets:
+            self._budgets[platform] = RetryBudget(self.budget_ratio)
+        return self._budgets[platform]
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff; Retry-After (seconds) wins if longer"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.max_delay * 4))
+        return delay
+
+    async def call(
+        self,
+        platform: str,
+        send: Callable[[], Awaitable[httpx.Response]],
+        max_retries: Optional[int] = None
+    ) -> httpx.Response:
+        """
+        Send a request with retries, the platform's budget and breaker
+
+        Returns the last response (possibly non-2xx once retries run out);
+        raises CircuitOpenError or the last transport error.
+        """
+        retries = self.max_retries if max_retries is None else max_retries
+        breaker = self.breaker(platform)
+        budget = self.budget(platform)
+        budget.deposit()
+
+        attempt = 0
+        while True:
+            breaker.check()
+            retry_after = None
+            try:
+                response = await send()
+            except httpx.TransportError:
+                breaker.record_failure()
+                if attempt >= retries or not budget.withdraw():
+                    raise
+            except BaseException:
+                breaker.release()
+                raise
+            else:
+                if response.status_code in FAILURE_STATUS:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if (response.status_code not in RETRY_STATUS
+                        or attempt >= retries or not budget.withdraw()):
+                    return response
+                retry_after = response.headers.get('Retry-After')
+
+            attempt += 1
+            await asyncio.sleep(self.backoff(attempt, retry_after))
+
+    def metrics(self) -> Dict[str, Dict]:
+        return {
+            platform: {**self.breaker(platform).metrics(), 'retry_budget': self.budget(platform).metrics()}
+            for platform in sorted(set(self._breakers) | set(self._budgets))
+        }
+
+
+_resilience: Optional[CrawlerResilience] = None
+
+
+def configure_resilience(**kwargs) -> CrawlerResilience:
+    """Create the shared retry / breaker state; called from app lifespan"""
+    global _resilience
+    _resilience = CrawlerResilience(**kwargs)
+    return _resilience
+
+
+def get_resilience() -> CrawlerResilience:
+    """Shared retry / breaker state (defaults if not configured)"""
+    global _resilience
+    if _resilience is None:
+        _resilience = CrawlerResilience()
+    return _resilience
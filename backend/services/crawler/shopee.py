@@ -2,18 +2,20 @@
 Shopee Crawler - 蝦皮購物爬蟲 (真實API版本)
 使用 Shopee API 進行真實搜尋
 """
+import contextlib
 import time
-import httpx
 import urllib.parse
-from typing import List, Optional
+from typing import Awaitable, Callable, Iterable, List, Optional
 from loguru import logger
 
-from .base import BaseCrawler, ProductListing, CrawlerResult
+from .base import BaseCrawler, ProductListing, ListingBatch, CrawlerResult, PageFetchError, json_loads
 
 
 class ShopeeCrawler(BaseCrawler):
     """蝦皮購物爬蟲 - 使用真實 API"""
 
+    supports_seller_crawl = True
+
     def __init__(self, **kwargs):
         super().__init__(
             platform_name="shopee",
@@ -21,6 +23,7 @@ class ShopeeCrawler(BaseCrawler):
             **kwargs
         )
         self.api_base = "https://shopee.tw/api/v4/search/search_items"
+        self.shop_api = "https://shopee.tw/api/v4/shop/search_items"
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Accept": "application/json",
@@ -37,114 +40,72 @@ class ShopeeCrawler(BaseCrawler):
         max_results: int = 100
     ) -> CrawlerResult:
         """搜尋蝦皮商品 - 真實API"""
+        listings = ListingBatch("shopee")
+
+        async def collect(batch: ListingBatch):
+            listings.extend(batch)
+
+        result = await self.search_stream(keyword, collect, max_pages=max_pages, max_results=max_results)
+        result.listings = listings
+        return result
+
+    async def search_stream(
+        self,
+        keyword: str,
+        on_listings: Callable[[Iterable[ProductListing]], Awaitable[None]],
+        max_pages: int = 5,
+        max_results: int = 100
+    ) -> CrawlerResult:
+        """
+        搜尋蝦皮商品，每頁結果一到就交給 on_listings
+
+        Page offsets are known up front, so pages are requested concurrently
+        (paced by the host rate limiter) and handed over in page order,
+        one ListingBatch per page.
+        """
         start_time = time.time()
-        listings = []
+        found = 0
         errors = []
         pages_scraped = 0
 
         logger.info(f"Shopee real search for: {keyword}")
 
-        try:
-            items_per_page = 60
-
-            for page in range(max_pages):
-                if len(listings) >= max_results:
-                    break
-
-                offset = page * items_per_page
-
-                params = {
-                    "by": "relevancy",
-                    "keyword": keyword,
-                    "limit": items_per_page,
-                    "newest": offset,
-                    "order": "desc",
-                    "page_type": "search",
-                    "scenario": "PAGE_GLOBAL_SEARCH",
-                    "version": 2
-                }
-
-                try:
-                    async with httpx.AsyncClient(timeout=30, headers=self.headers) as client:
-                        response = await client.get(self.api_base, params=params)
-
-                        if response.status_code == 200:
-                            data = response.json()
-                            items = data.get("items", [])
-
-                            if not items:
-                                logger.info(f"No more items at page {page + 1}")
-                                break
-
-                            for item in items:
-                                if len(listings) >= max_results:
-                                    break
-
-                                item_info = item.get("item_basic", {})
-
-                                item_id = item_info.get("itemid", "")
-                                shop_id = item_info.get("shopid", "")
-                                name = item_info.get("name", "Unknown Product")
-
-                                clean_name = name[:50].replace(" ", "-").replace("/", "-")
-                                product_url = f"https://shopee.tw/{urllib.parse.quote(clean_name)}-i.{shop_id}.{item_id}"
-
-                                image = item_info.get("image", "")
-                                if image:
-                                    thumbnail_url = f"https://cf.shopee.tw/file/{image}"
-                                else:
-                                    images = item_info.get("images", [])
-                                    if images:
-                                        thumbnail_url = f"https://cf.shopee.tw/file/{images[0]}"
-                                    else:
-                                        thumbnail_url = "https://cf.shopee.tw/file/placeholder"
-
-                                price = item_info.get("price", 0) / 100000 if item_info.get("price") else 0
-                                price_min = item_info.get("price_min", 0) / 100000 if item_info.get("price_min") else price
-                                seller_name = item_info.get("shop_name", "") or f"Shop_{shop_id}"
-                                sold = item_info.get("sold", 0) or item_info.get("historical_sold", 0)
-                                location = item_info.get("shop_location", "") or "台灣"
-                                rating = item_info.get("item_rating", {}).get("rating_star", None)
-
-                                listings.append(ProductListing(
-                                    id=f"shopee_{shop_id}_{item_id}",
-                                    platform="shopee",
-                                    title=name,
-                                    url=product_url,
-                                    thumbnail_url=thumbnail_url,
-                                    price=price_min if price_min > 0 else price,
-                                    seller_id=str(shop_id),
-                                    seller_name=seller_name,
-                                    seller_url=f"https://shopee.tw/shop/{shop_id}",
-                                    sales_count=sold,
-                                    rating=rating,
-                                    location=location,
-                                    raw_data={
-                                        "itemid": item_id,
-                                        "shopid": shop_id,
-                                        "liked_count": item_info.get("liked_count", 0),
-                                        "stock": item_info.get("stock", 0)
-                                    }
-                                ))
-
-                            pages_scraped += 1
-                            logger.info(f"Page {page + 1}: Found {len(items)} items, total: {len(listings)}")
-
-                            await self.random_delay()
-                        else:
-                            error_msg = f"API returned status {response.status_code}"
-                            errors.append(error_msg)
-                            logger.warning(error_msg)
-                            break
+        items_per_page = 60
+
+        async def fetch_page(page: int) -> List[dict]:
+            params = {
+                "by": "relevancy",
+                "keyword": keyword,
+                "limit": items_per_page,
+                "newest": page * items_per_page,
+                "order": "desc",
+                "page_type": "search",
+                "scenario": "PAGE_GLOBAL_SEARCH",
+                "version": 2
+            }
+            response = await self.request(self.api_base, params=params, is_search=True)
+            if response.status_code != 200:
+                raise PageFetchError(f"API returned status {response.status_code}")
+            return json_loads(response.content).get("items") or []
 
-                except httpx.TimeoutException:
-                    error_msg = f"Timeout on page {page + 1}"
-                    errors.append(error_msg)
-                    logger.warning(error_msg)
-                except Exception as e:
-                    error_msg = f"Error on page {page + 1}: {str(e)}"
-                    errors.append(error_msg)
-                    logger.error(error_msg)
+        try:
+            n_pages = min(max_pages, -(-max_results // items_per_page))
+            pages = self.iter_pages(fetch_page, n_pages, items_per_page)
+            async with contextlib.aclosing(pages):
+                async for page, items, error in pages:
+                    if error:
+                        errors.append(error)
+                        continue
+                    pages_scraped += 1
+                    batch = ListingBatch("shopee")
+                    for item in items[:max_results - found]:
+                        self._append_item(batch, item.get("item_basic") or {})
+                    found += len(batch)
+                    logger.info(f"Page {page + 1}: Found {len(items)} items, total: {found}")
+                    if batch:
+                        await on_listings(batch)
+                    if found >= max_results:
+                        break
 
         except Exception as e:
             error_msg = f"Search failed: {str(e)}"
@@ -152,22 +113,139 @@ class ShopeeCrawler(BaseCrawler):
             logger.error(error_msg)
 
         duration_ms = int((time.time() - start_time) * 1000)
-        logger.info(f"Shopee search completed: {len(listings)} products in {duration_ms}ms")
+        logger.info(f"Shopee search completed: {found} products in {duration_ms}ms")
 
         return CrawlerResult(
             platform="shopee",
             keyword=keyword,
-            total_found=len(listings),
-            listings=listings,
+            total_found=found,
+            listings=[],
             pages_scraped=pages_scraped,
             duration_ms=duration_ms,
             errors=errors,
-            success=len(listings) > 0 or len(errors) == 0
+            success=found > 0 or len(errors) == 0
+        )
+
+    def _append_item(self, batch: ListingBatch, item_info: dict):
+        """Search API item_basic -> one batch row (reads only the fields we keep)"""
+        get = item_info.get
+        item_id = get("itemid", "")
+        shop_id = get("shopid", "")
+        name = get("name", "Unknown Product")
+
+        clean_name = name[:50].replace(" ", "-").replace("/", "-")
+        product_url = f"https://shopee.tw/{urllib.parse.quote(clean_name)}-i.{shop_id}.{item_id}"
+
+        image = get("image") or next(iter(get("images") or ()), "placeholder")
+        price = get("price") or 0
+        price_min = get("price_min") or price
+
+        batch.append(
+            f"shopee_{shop_id}_{item_id}",
+            name,
+            product_url,
+            f"https://cf.shopee.tw/file/{image}",
+            (price_min if price_min > 0 else price) / 100000,
+            seller_id=str(shop_id),
+            seller_name=get("shop_name") or f"Shop_{shop_id}",
+            seller_url=f"https://shopee.tw/shop/{shop_id}",
+            location=get("shop_location") or "台灣",
+            sales_count=get("sold") or get("historical_sold") or 0,
+            rating=(get("item_rating") or {}).get("rating_star")
         )
 
     async def get_product_details(self, product_url: str) -> Optional[ProductListing]:
         return None
 
-    async def get_seller_products(self, seller_id: str, max_products: int = 50) -> List[ProductListing]:
-        return []
+    async def get_seller_products(self, seller_id: str, max_products: int = 50) -> ListingBatch:
+        """蝦皮商店全部商品"""
+        listings = ListingBatch("shopee")
+
+        async def collect(batch: ListingBatch):
+            listings.extend(batch)
+
+        await self.seller_stream(seller_id, collect, max_products=max_products)
+        return listings
+
+    async def seller_stream(
+        self,
+        seller_id: str,
+        on_listings: Callable[[Iterable[ProductListing]], Awaitable[None]],
+        max_products: int = 500
+    ) -> CrawlerResult:
+        """
+        蝦皮商店全部商品，每頁結果一到就交給 on_listings
+
+        The first page carries the shop's item count; all remaining pages
+        are then requested at once (paced by the host rate limiter) and
+        handed over in page order.
+        """
+        start_time = time.time()
+        found = 0
+        errors = []
+        pages_scraped = 0
+        page_size = 30
+
+        logger.info(f"Shopee seller sweep: {seller_id}")
+
+        async def fetch_page(page: int) -> dict:
+            params = {
+                "limit": page_size,
+                "offset": page * page_size,
+                "order": "pop",
+                "shopid": seller_id
+            }
+            response = await self.request(self.shop_api, params=params)
+            if response.status_code != 200:
+                raise PageFetchError(f"API returned status {response.status_code}")
+            return json_loads(response.content)
+
+        async def fetch_items(page: int) -> List[dict]:
+            return (await fetch_page(page)).get("items") or []
+
+        async def hand_over(items: List[dict]) -> bool:
+            """Pass one page on; False once max_products is reached"""
+            nonlocal found, pages_scraped
+            pages_scraped += 1
+            batch = ListingBatch("shopee")
+            for item in items[:max_products - found]:
+                # Shop listings may or may not wrap the fields in item_basic
+                self._append_item(batch, item.get("item_basic") or item)
+            found += len(batch)
+            if batch:
+                await on_listings(batch)
+            return found < max_products
+
+        try:
+            first = await fetch_page(0)
+            items = first.get("items") or []
+            total = min(first.get("total_count") or max_products, max_products)
+
+            if await hand_over(items) and len(items) >= page_size:
+                pages = self.iter_pages(lambda page: fetch_items(page + 1), -(-total // page_size) - 1, page_size)
+                async with contextlib.aclosing(pages):
+                    async for _, items, error in pages:
+                        if error:
+                            errors.append(error)
+                        elif not await hand_over(items):
+                            break
+
+        except Exception as e:
+            error_msg = f"Seller crawl failed: {str(e)}"
+            errors.append(error_msg)
+            logger.error(error_msg)
+
+        duration_ms = int((time.time() - start_time) * 1000)
+        logger.info(f"Shopee seller {seller_id}: {found} products in {duration_ms}ms")
+
+        return CrawlerResult(
+            platform="shopee",
+            keyword=f"seller:{seller_id}",
+            total_found=found,
+            listings=[],
+            pages_scraped=pages_scraped,
+            duration_ms=duration_ms,
+            errors=errors,
+            success=found > 0 or len(errors) == 0
+        )
 
@@ -0,0 +1,163 @@
+"""
+Listing Watermarks
+增量掃描水位 - 記錄每個關鍵字已比對過的商品，下次掃描只比對新商品或縮圖已變更的商品
+（賣家全店掃描不分關鍵字，以 latest() 查任何關鍵字下的最近記錄）
+
+每筆記錄：(scope, keyword, platform, listing_id) -> (thumbnail_url, image_hash)
+scope 是本次比對條件（資產指紋 + 門檻 + cascade）的雜湊，
+換了資產或門檻時舊記錄自然不適用，商品會重新比對。
+SQLite（WAL 模式）存放，多個工作行程可共用同一個資料庫檔。
+所有方法都是同步的 SQLite 呼叫：在事件迴圈中請以 asyncio.to_thread 呼叫。
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from loguru import logger
+
+# Listing ids per IN (...) lookup
+LOOKUP_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listing_watermarks (
+    scope         TEXT NOT NULL,
+    keyword       TEXT NOT NULL,
+    platform      TEXT NOT NULL,
+    listing_id    TEXT NOT NULL,
+    thumbnail_url TEXT NOT NULL,
+    image_hash    TEXT,
+    first_seen    TEXT NOT NULL,
+    last_seen     TEXT NOT NULL,
+    PRIMARY KEY (scope, keyword, platform, listing_id)
+);
+CREATE INDEX IF NOT EXISTS listing_watermarks_listing
+    ON listing_watermarks (scope, platform, listing_id, last_seen);
+"""
+
+
+class WatermarkStore:
+    """
+    Per-keyword record of listings already compared
+
+    A listing is unchanged when its id was seen for the same scope and
+    keyword with the same thumbnail URL; anything else is compared again.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def seen(self, scope: str, keyword: str, platform: str) -> Dict[str, Tuple[str, Optional[str]]]:
+        """listing_id -> (thumbnail_url, image_hash) recorded for a keyword on a platform"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT listing_id, thumbnail_url, image_hash FROM listing_watermarks "
+                "WHERE scope = ? AND keyword = ? AND platform = ?",
+                (scope, keyword, platform)
+            ).fetchall()
+        return {listing_id: (thumbnail_url, image_hash) for listing_id, thumbnail_url, image_hash in rows}
+
+    def latest(self, scope: str, platform: str, listing_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """(thumbnail_url, image_hash) a listing was last compared with under any keyword"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT thumbnail_url, image_hash FROM listing_watermarks "
+                "WHERE scope = ? AND platform = ? AND listing_id = ? "
+                "ORDER BY last_seen DESC LIMIT 1",
+                (scope, platform, listing_id)
+            ).fetchone()
+
+    def latest_many(
+        self, scope: str, platform: str, listing_ids: Iterable[str]
+    ) -> Dict[str, Tuple[str, Optional[str]]]:
+        """latest() for a batch of listings: listing_id -> (thumbnail_url, image_hash)"""
+        listing_ids = list(dict.fromkeys(listing_ids))
+        latest: Dict[str, Tuple[str, Optional[str]]] = {}
+        with self._lock:
+            for start in range(0, len(listing_ids), LOOKUP_BATCH):
+                chunk = listing_ids[start:start + LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    "SELECT listing_id, thumbnail_url, image_hash FROM listing_watermarks "
+                    f"WHERE scope = ? AND platform = ? AND listing_id IN ({', '.join('?' * len(chunk))}) "
+                    "ORDER BY last_seen DESC",
+                    (scope, platform, *chunk)
+                ).fetchall()
+                for listing_id, thumbnail_url, image_hash in rows:
+                    latest.setdefault(listing_id, (thumbnail_url, image_hash))
+        return latest
+
+    def record(self, scope: str, rows: Iterable[Tuple[str, str, str, str, Optional[str]]]):
+        """
+        Upsert compared listings
+
+        Args:
+            scope: Comparison scope
+            rows: (keyword, platform, listing_id, thumbnail_url, image_hash)
+        """
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO listing_watermarks "
+                "(scope, keyword, platform, listing_id, thumbnail_url, image_hash, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (scope, keyword, platform, listing_id) DO UPDATE SET "
+                "thumbnail_url = excluded.thumbnail_url, image_hash = excluded.image_hash, "
+                "last_seen = excluded.last_seen",
+                [(scope, *row, now, now) for row in rows]
+            )
+
+    def touch(self, scope: str, rows: Iterable[Tuple[str, str, str]]):
+        """Mark unchanged listings (keyword, platform, listing_id) as seen now"""
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE listing_watermarks SET last_seen = ? "
+                "WHERE scope = ? AND keyword = ? AND platform = ? AND listing_id = ?",
+                [(now, scope, *row) for row in rows]
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM listing_watermarks").fetchone()
+        return {'path': self.path, 'listings': count}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[WatermarkStore] = None
+
+
+def configure_watermark_store(path: str) -> WatermarkStore:
+    """Enable incremental scans; called from app lifespan"""
+    global _store
+    _store = WatermarkStore(path)
+    logger.info(f"Listing watermarks: {path}")
+    return _store
+
+
+def get_watermark_store() -> Optional[WatermarkStore]:
+    """Shared watermark store, or None when incremental scans are disabled"""
+    return _store
+
+
+def shutdown_watermark_store():
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
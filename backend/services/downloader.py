@@ -0,0 +1,229 @@
+"""
+Download Service
+共用 HTTP 下載服務 - 整個應用共用一個連線池（keep-alive、HTTP/2），
+同一 CDN 的縮圖不再每張都重新做 TCP + TLS 握手
+
+- 每個主機的並行連線數上限（避免單一 CDN 佔滿連線池）
+- 串流讀取並限制回應大小，超過上限立即中止
+"""
+import asyncio
+import importlib.util
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from loguru import logger
+
+DEFAULT_USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+)
+
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
+class DownloadTooLarge(ValueError):
+    """Response body exceeds the configured byte cap"""
+
+
+class DownloadService:
+    """
+    Application-scoped pooled HTTP client
+
+    One httpx.AsyncClient (connection pool) for every image download and
+    page fetch; per-host semaphores bound concurrency to each host.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_per_host: int = 8,
+        max_bytes: int = 10 * 1024 * 1024,
+        timeout: float = 30.0,
+        http2: bool = True
+    ):
+        """
+        Args:
+            max_connections: Total pooled connections
+            max_per_host: Concurrent requests per host
+            max_bytes: Default response size cap for downloads
+            timeout: Request timeout in seconds
+            http2: Negotiate HTTP/2 when the h2 package is installed
+        """
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("h2 not installed (pip install 'httpx[http2]'), using HTTP/1.1")
+            http2 = False
+
+        self.http2 = http2
+        self.max_per_host = max_per_host
+        self.max_bytes = max_bytes
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            timeout=timeout,
+            follow_redirects=True,
+            headers={'User-Agent': DEFAULT_USER_AGENT},
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=30.0
+            )
+        )
+
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._stats = {'requests': 0, 'bytes': 0, 'failed': 0, 'too_large': 0}
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            semaphore = self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        return semaphore
+
+    async def fetch_bytes(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        max_bytes: Optional[int] = None
+    ) -> bytes:
+        """
+        Download a response body with a size cap (streamed)
+
+        Raises:
+            httpx.HTTPError on network / status errors, DownloadTooLarge
+        """
+        data, _ = await self._download(url, headers, max_bytes)
+        return data
+
+    async def fetch_text(self, url: str, headers: Optional[Dict[str, str]] = None) -> str:
+        """Download a page / API response as text (same pool and limits)"""
+        data, encoding = await self._download(url, headers, None)
+        return data.decode(encoding, errors='replace')
+
+    async def get(
+        self,
+        url: str,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> httpx.Response:
+        """Plain GET for small API responses; the caller handles the status code"""
+        self._stats['requests'] += 1
+        try:
+            async with self._host_limit(url):
+                response = await self.client.get(url, params=params, headers=headers)
+        except Exception:
+            self._stats['failed'] += 1
+            raise
+
+        self._stats['bytes'] += len(response.content)
+        return response
+
+    async def fetch_response(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        max_bytes: Optional[int] = None
+    ) -> httpx.Response:
+        """
+        Size-capped GET returning the response whatever its status
+
+        Used for conditional requests, where 304 is an expected answer.
+        The body is already read (decoded) into the returned response.
+        """
+        response, data = await self._stream(url, headers, max_bytes, raise_status=False)
+        return httpx.Response(
+            response.status_code,
+            headers=[
+                (name, value) for name, value in response.headers.multi_items()
+                if name.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')
+            ],
+            content=data,
+            request=response.request
+        )
+
+    async def _download(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]],
+        max_bytes: Optional[int]
+    ) -> Tuple[bytes, str]:
+        response, data = await self._stream(url, headers, max_bytes, raise_status=True)
+        return data, response.charset_encoding or 'utf-8'
+
+    async def _stream(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]],
+        max_bytes: Optional[int],
+        raise_status: bool
+    ) -> Tuple[httpx.Response, bytes]:
+        limit = max_bytes if max_bytes is not None else self.max_bytes
+        self._stats['requests'] += 1
+        try:
+            async with self._host_limit(url):
+                async with self.client.stream('GET', url, headers=headers) as response:
+                    if raise_status:
+                        response.raise_for_status()
+
+                    declared = response.headers.get('Content-Length')
+                    if declared and declared.isdigit() and int(declared) > limit:
+                        raise DownloadTooLarge(f"{url}: {declared} bytes > {limit}")
+
+                    chunks = []
+                    size = 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > limit:
+                            raise DownloadTooLarge(f"{url}: more than {limit} bytes")
+                        chunks.append(chunk)
+        except DownloadTooLarge:
+            self._stats['too_large'] += 1
+            raise
+        except Exception:
+            self._stats['failed'] += 1
+            raise
+
+        self._stats['bytes'] += size
+        return response, b''.join(chunks)
+
+    def metrics(self) -> Dict:
+        """Request counters and per-host in-flight requests"""
+        return {
+            **self._stats,
+            'in_flight': {
+                host: self.max_per_host - semaphore._value
+                for host, semaphore in self._host_limits.items()
+                if semaphore._value < self.max_per_host
+            }
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_service: Optional[DownloadService] = None
+
+
+def configure_download_service(**kwargs) -> DownloadService:
+    """Create the shared download service; called from app lifespan"""
+    global _service
+    _service = DownloadService(**kwargs)
+    logger.info(
+        f"Download service: {kwargs.get('max_connections', 100)} connections, "
+        f"{_service.max_per_host} per host, http2={_service.http2}"
+    )
+    return _service
+
+
+def get_download_service() -> DownloadService:
+    """Shared download service (defaults if not configured)"""
+    global _service
+    if _service is None:
+        _service = DownloadService()
+    return _service
+
+
+async def shutdown_download_service():
+    global _service
+    if _service is not None:
+        await _service.aclose()
+        _service = None
@@ -1,8 +1,14 @@
 """
 Image Comparison Services
-使用 pHash 進行圖片相似度偵測
+分層圖片相似度偵測 (pHash → 顏色直方圖 → ORB)
 """
+from .loader import ImageSource
 from .phash import PHashCompare
-from .engine import ImageCompareEngine
+from .engine import ImageCompareEngine, CascadeStage, DEFAULT_CASCADE, build_cascade, check_cascade
+from .index import HashIndex
+from .fingerprint_cache import FingerprintCache
 
-__all__ = ['PHashCompare', 'ImageCompareEngine']
+__all__ = [
+    'ImageSource', 'PHashCompare', 'ImageCompareEngine', 'HashIndex', 'FingerprintCache',
+    'CascadeStage', 'DEFAULT_CASCADE', 'build_cascade', 'check_cascade'
+]
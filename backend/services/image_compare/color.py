@@ -5,11 +5,12 @@ Color Histogram Comparison
 import cv2
 import numpy as np
 from PIL import Image
-from io import BytesIO
-import httpx
 from typing import Optional, Tuple, Dict
 from loguru import logger
 
+from .loader import ImageSource
+from .executor import get_executor
+
 
 class ColorHistogramCompare:
     """
@@ -20,7 +21,8 @@ class ColorHistogramCompare:
     def __init__(
         self,
         bins: Tuple[int, int, int] = (8, 8, 8),
-        color_space: str = 'HSV'
+        color_space: str = 'HSV',
+        decode_size: int = 256
     ):
         """
         Initialize color histogram comparator
@@ -28,13 +30,16 @@ class ColorHistogramCompare:
         Args:
             bins: Number of bins for each channel (H, S, V or B, G, R)
             color_space: 'HSV' or 'RGB'
+            decode_size: Minimum side for reduced-resolution decoding
+                         (normalized histograms barely change when downscaled)
         """
         self.bins = bins
         self.color_space = color_space
+        self.decode_size = decode_size
 
     async def compute_histogram(
         self,
-        image_source: str | bytes | Image.Image
+        image_source: str | bytes | Image.Image | ImageSource
     ) -> Optional[np.ndarray]:
         """
         Compute color histogram for an image
@@ -43,72 +48,38 @@ class ColorHistogramCompare:
             Normalized histogram array
         """
         try:
-            image = await self._load_image(image_source)
-            if image is None:
+            source = await ImageSource.load(image_source, min_size=self.decode_size)
+            if source is None:
                 return None
 
-            # Convert color space if needed
-            if self.color_space == 'HSV':
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-            elif self.color_space == 'LAB':
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2LAB)
-
-            # Compute histogram
-            hist = cv2.calcHist(
-                [image],
-                [0, 1, 2],  # All channels
-                None,
-                list(self.bins),
-                [0, 256, 0, 256, 0, 256] if self.color_space != 'HSV'
-                else [0, 180, 0, 256, 0, 256]  # HSV has different ranges
-            )
-
-            # Normalize
-            hist = cv2.normalize(hist, hist).flatten()
-
-            return hist
+            # calcHist / cvtColor release the GIL, so run them on the thread pool
+            return await get_executor().run_thread(self._histogram, source.rgb)
 
         except Exception as e:
             logger.error(f"Error computing histogram: {e}")
             return None
 
-    async def _load_image(self, source: str | bytes | Image.Image) -> Optional[np.ndarray]:
-        """Load image and convert to numpy array"""
-        try:
-            if isinstance(source, np.ndarray):
-                if len(source.shape) == 2:
-                    source = cv2.cvtColor(source, cv2.COLOR_GRAY2RGB)
-                return source
-
-            if isinstance(source, Image.Image):
-                return np.array(source.convert('RGB'))
-
-            if isinstance(source, bytes):
-                pil_image = Image.open(BytesIO(source)).convert('RGB')
-                return np.array(pil_image)
-
-            if isinstance(source, str):
-                if source.startswith(('http://', 'https://')):
-                    async with httpx.AsyncClient(timeout=30) as client:
-                        response = await client.get(source)
-                        response.raise_for_status()
-                        pil_image = Image.open(BytesIO(response.content)).convert('RGB')
-                        return np.array(pil_image)
-                elif source.startswith('data:image'):
-                    import base64
-                    header, data = source.split(',', 1)
-                    image_data = base64.b64decode(data)
-                    pil_image = Image.open(BytesIO(image_data)).convert('RGB')
-                    return np.array(pil_image)
-                else:
-                    pil_image = Image.open(source).convert('RGB')
-                    return np.array(pil_image)
+    def _histogram(self, image: np.ndarray) -> np.ndarray:
+        # Convert color space if needed
+        if self.color_space == 'HSV':
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
+        elif self.color_space == 'LAB':
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2LAB)
 
-            return None
+        # Compute histogram
+        hist = cv2.calcHist(
+            [image],
+            [0, 1, 2],  # All channels
+            None,
+            list(self.bins),
+            [0, 256, 0, 256, 0, 256] if self.color_space != 'HSV'
+            else [0, 180, 0, 256, 0, 256]  # HSV has different ranges
+        )
 
-        except Exception as e:
-            logger.error(f"Error loading image for histogram: {e}")
-            return None
+        # Normalize
+        hist = cv2.normalize(hist, hist).flatten()
+
+        return hist
 
     def compute_similarity(
         self,
@@ -164,8 +135,8 @@ class ColorHistogramCompare:
 
     async def compare_images(
         self,
-        image1: str | bytes | Image.Image,
-        image2: str | bytes | Image.Image,
+        image1: str | bytes | Image.Image | ImageSource,
+        image2: str | bytes | Image.Image | ImageSource,
         methods: list = None
     ) -> Dict[str, float]:
         """
@@ -201,10 +172,11 @@ class DominantColorCompare:
 
     def __init__(self, n_colors: int = 5):
         self.n_colors = n_colors
+        self.decode_size = 128  # clustered on a 100x100 thumbnail
 
     async def extract_dominant_colors(
         self,
-        image_source: str | bytes | Image.Image
+        image_source: str | bytes | Image.Image | ImageSource
     ) -> Optional[np.ndarray]:
         """
         Extract dominant colors using K-means clustering
@@ -213,45 +185,35 @@ class DominantColorCompare:
             Array of dominant colors (RGB)
         """
         try:
-            # Load image
-            if isinstance(image_source, str):
-                if image_source.startswith(('http://', 'https://')):
-                    async with httpx.AsyncClient(timeout=30) as client:
-                        response = await client.get(image_source)
-                        image = Image.open(BytesIO(response.content)).convert('RGB')
-                elif image_source.startswith('data:image'):
-                    import base64
-                    header, data = image_source.split(',', 1)
-                    image_data = base64.b64decode(data)
-                    image = Image.open(BytesIO(image_data)).convert('RGB')
-                else:
-                    image = Image.open(image_source).convert('RGB')
-            elif isinstance(image_source, bytes):
-                image = Image.open(BytesIO(image_source)).convert('RGB')
-            else:
-                image = image_source.convert('RGB')
-
-            # Resize for faster processing
-            image = image.resize((100, 100))
-            pixels = np.array(image).reshape(-1, 3).astype(np.float32)
-
-            # K-means clustering
-            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)
-            _, labels, centers = cv2.kmeans(
-                pixels, self.n_colors, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS
-            )
-
-            # Sort by frequency
-            unique, counts = np.unique(labels, return_counts=True)
-            sorted_indices = np.argsort(-counts)
-            sorted_centers = centers[sorted_indices]
+            source = await ImageSource.load(image_source, min_size=self.decode_size)
+            if source is None:
+                return None
 
-            return sorted_centers.astype(np.uint8)
+            # K-means runs in the thread pool (OpenCV releases the GIL)
+            return await get_executor().run_thread(self._kmeans_colors, source.pil)
 
         except Exception as e:
             logger.error(f"Error extracting dominant colors: {e}")
             return None
 
+    def _kmeans_colors(self, image: Image.Image) -> np.ndarray:
+        # Resize for faster processing
+        image = image.resize((100, 100))
+        pixels = np.array(image).reshape(-1, 3).astype(np.float32)
+
+        # K-means clustering
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)
+        _, labels, centers = cv2.kmeans(
+            pixels, self.n_colors, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS
+        )
+
+        # Sort by frequency
+        unique, counts = np.unique(labels, return_counts=True)
+        sorted_indices = np.argsort(-counts)
+        sorted_centers = centers[sorted_indices]
+
+        return sorted_centers.astype(np.uint8)
+
     def compare_dominant_colors(
         self,
         colors1: np.ndarray,
@@ -1,13 +1,32 @@
 """
-Image Comparison Engine (簡化版)
-使用 pHash 進行圖片比對
+Image Comparison Engine
+分層比對引擎 - pHash → 顏色直方圖 → ORB，明確的結果提前結束
+
+每一層都有 accept / reject 門檻：分數 >= accept 直接判定相符，
+分數 < reject 直接判定不符，只有介於兩者之間的模糊案例才會進入
+下一層更昂貴的比對。OpenCV 未安裝時自動略過顏色與 ORB 層。
 """
 from typing import Dict, Optional, List, Tuple
 from dataclasses import dataclass
 from loguru import logger
-import asyncio
+import hashlib
+import time
+
+import numpy as np
 
-from .phash import PHashCompare
+from .phash import PHashCompare, pack_hash, pack_hashes, unpack_hash, hamming_matrix
+from .loader import ImageSource, image_downloads, read_source_bytes
+from .executor import get_executor
+from .fingerprint_cache import get_fingerprint_cache
+
+try:
+    from .color import ColorHistogramCompare, DominantColorCompare
+    from .orb import ORBCompare
+    from .orb_index import ORBIndex
+    CV2_AVAILABLE = True
+except ImportError:
+    ColorHistogramCompare = DominantColorCompare = ORBCompare = ORBIndex = None
+    CV2_AVAILABLE = False
 
 
 @dataclass
@@ -22,65 +41,551 @@ class ComparisonResult:
     details: Dict
 
 
+@dataclass
+class CascadeStage:
+    """
+    One cascade stage
+
+    score >= accept -> match, stop
+    score <  reject -> no match, stop
+    otherwise the pair goes on to the next stage (None disables a bound)
+    """
+    name: str                       # 'phash' | 'color' | 'orb'
+    accept: Optional[float] = None
+    reject: Optional[float] = None
+
+
+# Weights for the overall score over the stages that actually ran
+STAGE_WEIGHTS = {'phash': 0.50, 'color': 0.15, 'orb': 0.35}
+
+# ORBIndex votes an asset needs for its pair to be ORB-matched at all;
+# votes only shortlist pairs, the score is always pairwise (ORBCompare)
+ORB_SHORTLIST_VOTES = 5
+
+DEFAULT_CASCADE = [
+    CascadeStage('phash', accept=90.0, reject=55.0),
+    CascadeStage('color', reject=40.0),   # 顏色相近不代表盜圖，只用來排除
+    CascadeStage('orb'),                  # 最後一層：以綜合分數對門檻判定
+]
+
+
+def build_cascade(
+    stages: str = 'phash,color,orb',
+    phash_accept: float = 90.0,
+    phash_reject: float = 55.0,
+    color_reject: float = 40.0
+) -> List[CascadeStage]:
+    """
+    Build a cascade from a comma-separated stage list (e.g. from settings)
+
+    Stages that need OpenCV are left out when it is not installed
+    (check_cascade warns about that once at startup).
+    """
+    bounds = {
+        'phash': (phash_accept, phash_reject),
+        'color': (None, color_reject),
+        'orb': (None, None)
+    }
+    cascade = []
+    for name in (s.strip() for s in stages.split(',') if s.strip()):
+        if name not in bounds:
+            raise ValueError(f"Unknown cascade stage: {name}")
+        if name != 'phash' and not CV2_AVAILABLE:
+            continue
+        accept, reject = bounds[name]
+        cascade.append(CascadeStage(name, accept=accept, reject=reject))
+    return cascade
+
+
+def check_cascade(stages: str) -> List[str]:
+    """Cascade stages that cannot run here; logs a warning once at startup"""
+    missing = [] if CV2_AVAILABLE else [
+        name for name in (s.strip() for s in stages.split(',')) if name and name != 'phash'
+    ]
+    if missing:
+        logger.warning(
+            f"OpenCV not installed: dropping cascade stage(s) {', '.join(missing)}, "
+            f"scans compare by pHash only (pip install opencv-python-headless)"
+        )
+    return missing
+
+
 class ImageCompareEngine:
     """
-    簡化版圖片比對引擎 - 只使用 pHash
+    分層圖片比對引擎
+
+    compare / batch_compare 的輸入可以是圖片來源，也可以是
+    compute_fingerprint 預先算好的指紋 dict，避免重複計算雜湊。
+    指紋只預先計算 pHash；顏色直方圖與 ORB 特徵在案例進入該層時
+    才計算並存回指紋 dict（由指紋中保留的 'source' 計算；
+    指紋帶有 'orb_source' 原圖網址時，ORB 改由原圖計算）。
+    已設定 FingerprintCache 時，各特徵先以圖片 SHA-256 查磁碟快取。
     """
 
     def __init__(
         self,
-        similarity_threshold: float = 70.0
+        similarity_threshold: float = 70.0,
+        cascade: Optional[List[CascadeStage]] = None
     ):
+        """
+        Args:
+            similarity_threshold: Overall score needed for a match
+            cascade: Comparison stages in order (default DEFAULT_CASCADE).
+                     Accept bounds are raised and reject bounds lowered to the
+                     threshold so a stage never overrules the threshold itself.
+        """
         self.phash = PHashCompare(hash_size=16)
         self.threshold = similarity_threshold
 
+        self.color = ColorHistogramCompare() if CV2_AVAILABLE else None
+        self.orb = ORBCompare() if CV2_AVAILABLE else None
+        self.orb_index: Optional['ORBIndex'] = None  # see build_orb_index
+
+        self.cascade: List[CascadeStage] = []
+        for stage in (cascade if cascade is not None else DEFAULT_CASCADE):
+            if stage.name != 'phash' and not CV2_AVAILABLE:
+                continue  # reported once by check_cascade
+            self.cascade.append(CascadeStage(
+                stage.name,
+                accept=max(stage.accept, self.threshold) if stage.accept is not None else None,
+                reject=min(stage.reject, self.threshold) if stage.reject is not None else None
+            ))
+
     async def compute_fingerprint(
         self,
-        image_source: str | bytes
+        image_source: str | bytes | ImageSource,
+        features: Tuple[str, ...] = ()
     ) -> Optional[Dict]:
-        """計算圖片指紋"""
+        """
+        計算圖片指紋
+
+        Args:
+            image_source: URL, data URL, file path, bytes or ImageSource
+            features: Cascade features to compute now ('color', 'orb');
+                      otherwise they are computed on demand
+
+        Returns:
+            {'hashes', 'orb', 'color', 'source'} or None on error
+        """
         try:
-            phash_hash = await self.phash.compute_hash(image_source)
-            return {
-                'hashes': {'phash': phash_hash},
+            # Keep encoded bytes (not the URL) so later stages never re-download
+            if isinstance(image_source, str):
+                image_source = await read_source_bytes(image_source)
+
+            if isinstance(image_source, bytes):
+                digest = hashlib.sha256(image_source).hexdigest()
+            else:
+                digest = getattr(image_source, 'digest', None)
+
+            fingerprint = {
+                'hashes': {'phash': None},
                 'orb': None,
-                'color': None
+                'color': None,
+                'source': image_source,
+                'digest': digest
             }
+
+            phash_hash = await self._cache_get(fingerprint, 'phash')
+            if phash_hash is None:
+                # Only the pHash is needed, so decode JPEGs at reduced resolution
+                image = await ImageSource.load(image_source, min_size=self.phash.decode_size)
+                if image is None:
+                    return None
+                if not isinstance(image_source, bytes):
+                    fingerprint['source'] = image
+
+                phash_hash = await self.phash.compute_hash(image)
+                if phash_hash is None:
+                    return None
+                await self._cache_put(fingerprint, 'phash', phash_hash)
+
+            fingerprint['hashes']['phash'] = phash_hash
+
+            for feature in features:
+                await self.ensure_feature(fingerprint, feature)
+            if 'color' in features and fingerprint['color'] is not None:
+                colors = await DominantColorCompare().extract_dominant_colors(fingerprint['source'])
+                fingerprint['color']['dominant_colors'] = colors.tolist() if colors is not None else None
+
+            return fingerprint
         except Exception as e:
             logger.error(f"Error computing fingerprint: {e}")
             return None
 
+    async def ensure_feature(self, fingerprint: Dict, name: str) -> bool:
+        """
+        Compute a cascade feature into the fingerprint if missing
+
+        Returns:
+            False if the feature is unavailable (no OpenCV or no source)
+        """
+        if name == 'phash':
+            return bool(fingerprint['hashes'].get('phash'))
+        if fingerprint.get(name) is not None:
+            return True
+
+        source = fingerprint.get('source')
+        if not CV2_AVAILABLE or source is None:
+            return False
+
+        if name not in ('color', 'orb'):
+            raise ValueError(f"Unknown feature: {name}")
+
+        cache_keys = [fingerprint]
+        orb_source = fingerprint.get('orb_source') if name == 'orb' else None
+        if isinstance(orb_source, str):
+            # Cheaper stages ran on a small CDN rendition; ORB needs the full-size
+            # image, which is only downloaded when its features are not cached
+            url_key = self._orb_url_key(fingerprint, orb_source)
+            known = image_downloads.digest(orb_source)
+            lookups = [key for key in ({'digest': known} if known else None, url_key) if key]
+            value = None
+            for cache_key in lookups:
+                value = await self._cache_get(cache_key, name)
+                if value is not None:
+                    break
+            if value is None:
+                try:
+                    source = await read_source_bytes(orb_source)
+                    cache_keys = [{'digest': hashlib.sha256(source).hexdigest()}] + ([url_key] if url_key else [])
+                except Exception as e:
+                    logger.debug(f"Full-size image unavailable, ORB on the rendition: {e}")
+                    value = await self._cache_get(fingerprint, name)
+        else:
+            value = await self._cache_get(fingerprint, name)
+
+        if value is None:
+            if name == 'color':
+                value = await self.color.compute_histogram(source)
+                if value is None:
+                    return False
+                computed = True
+            else:
+                keypoints, value, _ = await self.orb.extract_features(source)
+                computed = keypoints is not None  # not a load / extraction error
+            if computed:
+                for cache_key in cache_keys:
+                    await self._cache_put(cache_key, name, value)
+
+        if name == 'color':
+            fingerprint['color'] = {'histogram': value, 'dominant_colors': None}
+        else:
+            descriptors = value if value is not None and len(value) else None
+            fingerprint['orb'] = {
+                'feature_count': len(descriptors) if descriptors is not None else 0,
+                'descriptors': descriptors
+            }
+
+        return True
+
+    @staticmethod
+    def _orb_url_key(fingerprint: Dict, orb_source: str) -> Optional[Dict]:
+        """
+        Cache key of a full-size image's ORB features that needs no download:
+        the rendition's digest plus the full-size URL (same rendition bytes
+        behind the same URL: same original image)
+        """
+        if not fingerprint.get('digest'):
+            return None
+        return {'digest': hashlib.sha256(f"{fingerprint['digest']}|{orb_source}".encode()).hexdigest()}
+
+    def _cache_tag(self, name: str) -> str:
+        """Disk cache feature tag - includes every parameter the value depends on"""
+        if name == 'phash':
+            return f"phash-{self.phash.hash_size}-{self.phash.decode_size}"
+        if name == 'color':
+            bins = 'x'.join(str(b) for b in self.color.bins)
+            return f"hist-{bins}-{self.color.color_space}-{self.color.decode_size}"
+        return f"orb-{self.orb.n_features}-{self.orb.scale_factor}-{self.orb.n_levels}"
+
+    async def _cache_get(self, fingerprint: Dict, name: str):
+        """
+        Cached feature value, or None
+
+        pHash is stored as packed uint64 words, ORB descriptors as (N, 32)
+        uint8 (empty when no keypoints) and the histogram as float32.
+        Disk reads run in the thread pool, off the event loop.
+        """
+        cache = get_fingerprint_cache()
+        if cache is None or not fingerprint.get('digest'):
+            return None
+
+        array = await get_executor().run_thread(cache.get, fingerprint['digest'], self._cache_tag(name))
+        if array is None:
+            return None
+        if name == 'phash':
+            return unpack_hash(array, self.phash.hash_size ** 2)
+        return array
+
+    async def _cache_put(self, fingerprint: Dict, name: str, value):
+        cache = get_fingerprint_cache()
+        if cache is None or not fingerprint.get('digest'):
+            return
+
+        if name == 'phash':
+            array = pack_hash(value)
+        elif name == 'orb':
+            array = value if value is not None else np.empty((0, 32), dtype=np.uint8)
+        else:
+            array = np.asarray(value, dtype=np.float32)
+        await get_executor().run_thread(cache.put, fingerprint['digest'], self._cache_tag(name), array)
+
+    async def build_orb_index(self, fingerprints: Dict[str, Dict]) -> Optional['ORBIndex']:
+        """
+        Index the ORB descriptors of many fingerprints (e.g. all assets)
+
+        cascade_compare(fp, other, index_key=key) then shortlists with one
+        index query per `other`: pairs with fewer than ORB_SHORTLIST_VOTES
+        votes are rejected at the ORB stage without pairwise matching; the
+        rest are scored pairwise, exactly as without the index.
+        """
+        if not CV2_AVAILABLE:
+            return None
+
+        index = ORBIndex()
+        for key, fingerprint in fingerprints.items():
+            if await self.ensure_feature(fingerprint, 'orb'):
+                index.add(key, fingerprint['orb']['descriptors'])
+
+        self.orb_index = index
+        return index
+
+    async def resolve_fingerprint(
+        self,
+        image: str | bytes | ImageSource | Dict
+    ) -> Optional[Dict]:
+        """Return a precomputed fingerprint as-is, otherwise compute it"""
+        if isinstance(image, dict):
+            return image
+        return await self.compute_fingerprint(image)
+
+    def compare_fingerprints(self, fp1: Dict, fp2: Dict) -> ComparisonResult:
+        """比對兩個已計算的指紋（只計算 pHash 漢明距離）"""
+        hash1 = fp1['hashes'].get('phash')
+        hash2 = fp2['hashes'].get('phash')
+        if not hash1 or not hash2:
+            raise ValueError("Fingerprint has no pHash")
+
+        similarity = self.phash.compute_similarity(hash1, hash2)
+        return self._build_result(similarity, hash1, hash2)
+
+    async def cascade_compare(
+        self,
+        fp1: Dict,
+        fp2: Dict,
+        index_key: Optional[str] = None
+    ) -> ComparisonResult:
+        """
+        分層比對兩個指紋
+
+        Args:
+            index_key: fp1's key in self.orb_index - the ORB stage then
+                       rejects the pair unless fp2's (cached) one-to-many
+                       index query shortlists it
+
+        details 內含各層分數與耗時 ('stages')、結束層 ('exit_stage')
+        以及判定方式 ('decision': accept / reject / threshold)
+        """
+        hash1 = fp1['hashes'].get('phash')
+        hash2 = fp2['hashes'].get('phash')
+        if not hash1 or not hash2:
+            raise ValueError("Fingerprint has no pHash")
+
+        scores: Dict[str, float] = {}
+        stages: Dict[str, Dict] = {}
+        exit_stage = None
+        decision = 'threshold'
+
+        for stage in self.cascade:
+            start = time.perf_counter()
+            if stage.name == 'orb' and not await self._orb_shortlisted(fp2, index_key):
+                stages[stage.name] = {
+                    'score': None,
+                    'shortlisted': False,
+                    'ms': round((time.perf_counter() - start) * 1000, 2)
+                }
+                exit_stage = stage.name
+                decision = 'reject'
+                break
+            score = await self._stage_score(stage.name, fp1, fp2)
+            stages[stage.name] = {
+                'score': score,
+                'ms': round((time.perf_counter() - start) * 1000, 2)
+            }
+            if score is None:
+                continue  # feature unavailable for this pair
+
+            scores[stage.name] = score
+            exit_stage = stage.name
+            if stage.accept is not None and score >= stage.accept:
+                decision = 'accept'
+                break
+            if stage.reject is not None and score < stage.reject:
+                decision = 'reject'
+                break
+
+        weight_total = sum(STAGE_WEIGHTS[name] for name in scores)
+        overall = (
+            sum(score * STAGE_WEIGHTS[name] for name, score in scores.items()) / weight_total
+            if weight_total > 0 else 0.0
+        )
+
+        if decision == 'accept':
+            is_match = True
+        elif decision == 'reject':
+            is_match = False
+        else:
+            is_match = overall >= self.threshold
+
+        return ComparisonResult(
+            overall_similarity=round(overall, 2),
+            phash_score=round(scores.get('phash', 0.0), 2),
+            orb_score=round(scores.get('orb', 0.0), 2),
+            color_score=round(scores.get('color', 0.0), 2),
+            similarity_level=self._get_similarity_level(overall),
+            is_match=is_match,
+            details={
+                'phash1': hash1,
+                'phash2': hash2,
+                'stages': stages,
+                'exit_stage': exit_stage,
+                'decision': decision
+            }
+        )
+
+    async def _stage_score(
+        self,
+        name: str,
+        fp1: Dict,
+        fp2: Dict
+    ) -> Optional[float]:
+        """Score one stage 0-100, computing features on demand"""
+        if not await self.ensure_feature(fp1, name) or not await self.ensure_feature(fp2, name):
+            return None
+
+        if name == 'phash':
+            hash1, hash2 = fp1['hashes']['phash'], fp2['hashes']['phash']
+            if len(hash1) != len(hash2):
+                return None
+            return self.phash.compute_similarity(hash1, hash2)
+
+        if name == 'color':
+            return self.color.compute_similarity(
+                fp1['color']['histogram'],
+                fp2['color']['histogram']
+            )
+
+        # Brute-force descriptor matching runs off the event loop
+        return float(await get_executor().run_thread(
+            self.orb.compute_similarity,
+            fp1['orb']['descriptors'],
+            fp2['orb']['descriptors']
+        ))
+
+    async def _orb_shortlisted(self, fingerprint: Dict, key: Optional[str]) -> bool:
+        """
+        Whether indexed image `key` got enough ORBIndex votes from one
+        cached index query of the fingerprint (True without an index)
+        """
+        if key is None or self.orb_index is None or key not in self.orb_index:
+            return True
+        if not await self.ensure_feature(fingerprint, 'orb'):
+            return True  # the ORB stage itself reports the feature as unavailable
+
+        orb = fingerprint['orb']
+        votes = orb.get('index_votes')
+        if votes is None:
+            votes = await get_executor().run_thread(self.orb_index.query, orb['descriptors'])
+            orb['index_votes'] = votes  # valid for this engine's current index
+        return votes.get(key, (0, 0.0))[0] >= ORB_SHORTLIST_VOTES
+
+    def required_side(self) -> int:
+        """
+        Shortest image side the pHash / colour stages decode at
+
+        ORB is left out: fingerprints built from a smaller CDN rendition
+        carry 'orb_source' and ensure_feature fetches full size for ORB.
+        """
+        sides = [self.phash.decode_size]
+        if self.color is not None and any(stage.name == 'color' for stage in self.cascade):
+            sides.append(self.color.decode_size)
+        return max(sides)
+
+    def phash_prefilter(self) -> float:
+        """
+        Lowest pHash similarity that can still match
+
+        Pairs below the first stage's pHash reject bound never match, so
+        callers can prefilter with a HashIndex radius query.
+        """
+        if not self.cascade or self.cascade[0].name != 'phash':
+            return 0.0
+        if len(self.cascade) == 1:
+            return self.threshold
+        return self.cascade[0].reject if self.cascade[0].reject is not None else 0.0
+
+    def _build_result(self, similarity: float, hash1: str, hash2: str) -> ComparisonResult:
+        similarity = float(similarity)
+        return ComparisonResult(
+            overall_similarity=round(similarity, 2),
+            phash_score=round(similarity, 2),
+            orb_score=0,
+            color_score=0,
+            similarity_level=self._get_similarity_level(similarity),
+            is_match=similarity >= self.threshold,
+            details={'phash1': hash1, 'phash2': hash2}
+        )
+
+    def similarity_matrix(self, fps_a: List[Dict], fps_b: List[Dict]) -> np.ndarray:
+        """
+        Many-to-many pHash similarity between two fingerprint lists
+
+        Returns:
+            (len(fps_a), len(fps_b)) similarity scores 0-100
+        """
+        packed_a = pack_hashes([fp['hashes']['phash'] for fp in fps_a])
+        packed_b = pack_hashes([fp['hashes']['phash'] for fp in fps_b])
+        if packed_a.size == 0 or packed_b.size == 0:
+            return np.zeros((len(fps_a), len(fps_b)))
+
+        return np.round(self.phash.distance_to_similarity(hamming_matrix(packed_a, packed_b)), 2)
+
     async def compare(
         self,
-        image1: str | bytes,
-        image2: str | bytes,
+        image1: str | bytes | ImageSource | Dict,
+        image2: str | bytes | ImageSource | Dict,
         fast_mode: bool = False
     ) -> ComparisonResult:
-        """比對兩張圖片"""
+        """
+        比對兩張圖片（或預先計算的指紋）
+
+        Args:
+            fast_mode: pHash only; otherwise run the full cascade
+        """
         try:
-            similarity, hash1, hash2 = await self.phash.compare_images(image1, image2)
-
-            return ComparisonResult(
-                overall_similarity=round(similarity, 2),
-                phash_score=round(similarity, 2),
-                orb_score=0,
-                color_score=0,
-                similarity_level=self._get_similarity_level(similarity),
-                is_match=similarity >= self.threshold,
-                details={'phash1': hash1, 'phash2': hash2}
-            )
+            fp1 = await self.resolve_fingerprint(image1)
+            fp2 = await self.resolve_fingerprint(image2)
+            if fp1 is None or fp2 is None:
+                raise ValueError("Failed to compute fingerprint")
+
+            if fast_mode:
+                return self.compare_fingerprints(fp1, fp2)
+            return await self.cascade_compare(fp1, fp2)
 
         except Exception as e:
             logger.error(f"Error comparing images: {e}")
-            return ComparisonResult(
-                overall_similarity=0,
-                phash_score=0,
-                orb_score=0,
-                color_score=0,
-                similarity_level='error',
-                is_match=False,
-                details={'error': str(e)}
-            )
+            return self._error_result(e)
+
+    def _error_result(self, error: Exception) -> ComparisonResult:
+        return ComparisonResult(
+            overall_similarity=0,
+            phash_score=0,
+            orb_score=0,
+            color_score=0,
+            similarity_level='error',
+            is_match=False,
+            details={'error': str(error)}
+        )
 
     def _get_similarity_level(self, score: float) -> str:
         """判斷相似度等級"""
@@ -95,21 +600,58 @@ class ImageCompareEngine:
 
     async def batch_compare(
         self,
-        source_image: str | bytes,
-        target_images: List[str | bytes],
+        source_image: str | bytes | ImageSource | Dict,
+        target_images: List[str | bytes | ImageSource | Dict],
         fast_mode: bool = True,
         min_similarity: float = 50.0
     ) -> List[Tuple[int, ComparisonResult]]:
-        """批次比對"""
+        """
+        批次比對 - 來源指紋只計算一次，pHash 距離以單一陣列運算求得
+
+        Args:
+            fast_mode: pHash only; otherwise pairs that pass the pHash
+                       prefilter continue through the cascade
+        """
         results = []
 
+        source_fp = await self.resolve_fingerprint(source_image)
+        source_hash = source_fp['hashes'].get('phash') if source_fp else None
+        if not source_hash:
+            logger.error("Error computing source fingerprint for batch compare")
+            return results
+
+        targets = []
         for i, target in enumerate(target_images):
             try:
-                result = await self.compare(source_image, target, fast_mode=fast_mode)
-                if result.overall_similarity >= min_similarity:
-                    results.append((i, result))
+                target_fp = await self.resolve_fingerprint(target)
+                target_hash = target_fp['hashes'].get('phash') if target_fp else None
+                if target_hash and len(target_hash) == len(source_hash):
+                    targets.append((i, target_fp))
             except Exception as e:
                 logger.error(f"Error comparing image {i}: {e}")
 
+        if not targets:
+            return results
+
+        similarities = self.phash.compute_similarities(
+            source_hash,
+            pack_hashes([fp['hashes']['phash'] for _, fp in targets])
+        )
+
+        prefilter = self.phash_prefilter()
+        for (i, target_fp), similarity in zip(targets, similarities):
+            if fast_mode:
+                if similarity >= min_similarity:
+                    results.append((i, self._build_result(
+                        similarity, source_hash, target_fp['hashes']['phash']
+                    )))
+                continue
+
+            if similarity < prefilter:
+                continue
+            result = await self.cascade_compare(source_fp, target_fp)
+            if result.overall_similarity >= min_similarity:
+                results.append((i, result))
+
         results.sort(key=lambda x: x[1].overall_similarity, reverse=True)
         return results
@@ -0,0 +1,130 @@
+"""
+Compute Executor
+CPU 密集運算執行器 - 將雜湊、特徵擷取移出 event loop
+
+- Thread pool: OpenCV / PIL 解碼等會釋放 GIL 的呼叫
+- Process pool: imagehash 等持有 GIL 的純 Python / NumPy 運算
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+
+class _PoolStats:
+    """Queue-depth counters for one pool"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.pending = 0        # submitted, not finished (queued + running)
+        self.max_pending = 0
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def submitted(self):
+        with self._lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+
+    def finished(self, future):
+        with self._lock:
+            self.pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            'workers': self.workers,
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'completed': self.completed,
+            'failed': self.failed
+        }
+
+
+class ComputeExecutor:
+    """
+    Thread + process pools for CPU-bound image work
+
+    Functions sent to the process pool must be module-level (picklable).
+    With process_workers=0 process work runs in the thread pool instead.
+    """
+
+    def __init__(self, thread_workers: int = 4, process_workers: int = 0):
+        self._thread_pool = ThreadPoolExecutor(
+            max_workers=thread_workers,
+            thread_name_prefix='image-compute'
+        )
+        self._thread_stats = _PoolStats(thread_workers)
+
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._process_stats = _PoolStats(process_workers)
+        if process_workers > 0:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=process_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+
+    async def run_thread(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn in the thread pool"""
+        return await self._submit(self._thread_pool, self._thread_stats, fn, *args, **kwargs)
+
+    async def run_process(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a module-level fn in the process pool (thread pool if disabled)"""
+        if self._process_pool is None:
+            return await self.run_thread(fn, *args, **kwargs)
+        return await self._submit(self._process_pool, self._process_stats, fn, *args, **kwargs)
+
+    async def _submit(self, pool: Executor, stats: _PoolStats, fn: Callable, *args, **kwargs) -> Any:
+        future = pool.submit(fn, *args, **kwargs)
+        stats.submitted()
+        future.add_done_callback(stats.finished)
+        return await asyncio.wrap_future(future)
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        """Pool sizes and queue depth"""
+        return {
+            'thread_pool': self._thread_stats.to_dict(),
+            'process_pool': self._process_stats.to_dict()
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._thread_pool.shutdown(wait=wait, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_executor: Optional[ComputeExecutor] = None
+
+
+def configure_executor(thread_workers: int = 4, process_workers: int = 0) -> ComputeExecutor:
+    """Create (or replace) the shared executor; called from app lifespan"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+
+    _executor = ComputeExecutor(thread_workers=thread_workers, process_workers=process_workers)
+    logger.info(f"Compute executor: {thread_workers} threads, {process_workers} processes")
+    return _executor
+
+
+def get_executor() -> ComputeExecutor:
+    """Shared executor (threads only with defaults if not configured)"""
+    global _executor
+    if _executor is None:
+        _executor = ComputeExecutor()
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
@@ -0,0 +1,141 @@
+"""
+Fingerprint Cache
+指紋磁碟快取 - 以圖片內容 SHA-256 + 演算法參數為鍵，同一張圖不再重新計算
+
+每個特徵存成獨立的 .npy 檔（可 memory-map）：
+    <dir>/<sha[:2]>/<sha>.<feature tag>.npy
+feature tag 含演算法參數，例如 phash-16、orb-1000-1.2-8、hist-8x8x8-HSV，
+參數變更時自然失效，不影響其他特徵。
+"""
+import os
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+from loguru import logger
+
+
+class FingerprintCache:
+    """
+    Content-addressed, size-bounded on-disk feature cache
+
+    - get() returns read-only memory-mapped arrays
+    - writes are atomic (temp file + rename), safe across processes
+    - eviction removes least recently used files (mtime, touched on hit)
+      once the directory exceeds max_bytes; it runs on a background thread
+      so the write that triggers it does not wait for the directory walk
+
+    All methods do blocking file I/O: call them from a worker thread, not
+    the event loop (ImageCompareEngine goes through the executor).
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._written = 0  # bytes written since the last size check
+        self._evicting = False
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest: str, feature: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.{feature}.npy")
+
+    def get(self, digest: str, feature: str) -> Optional[np.ndarray]:
+        """Cached array for (image digest, feature tag), or None"""
+        path = self._path(digest, feature)
+        try:
+            array = np.load(path, mmap_mode='r')
+            os.utime(path)  # LRU bookkeeping
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return array
+
+    def put(self, digest: str, feature: str, array: np.ndarray):
+        """Store an array for (image digest, feature tag)"""
+        path = self._path(digest, feature)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Fingerprint cache write failed: {e}")
+            return
+
+        with self._lock:
+            self._written += size
+            check = self._written > self.max_bytes // 20 and not self._evicting
+            if check:
+                self._written = 0
+                self._evicting = True
+        if check:
+            threading.Thread(target=self._evict_in_background, name='fingerprint-cache-evict', daemon=True).start()
+
+    def _evict_in_background(self):
+        try:
+            self.evict()
+        except Exception as e:
+            logger.warning(f"Fingerprint cache eviction failed: {e}")
+        finally:
+            with self._lock:
+                self._evicting = False
+
+    def evict(self):
+        """Remove least recently used files until under 90% of max_bytes"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.npy'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        entries.sort()
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        logger.info(f"Fingerprint cache evicted {removed} files ({total / 1024 / 1024:.1f} MB left)")
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'max_bytes': self.max_bytes}
+
+
+_cache: Optional[FingerprintCache] = None
+
+
+def configure_fingerprint_cache(directory: str, max_bytes: int) -> FingerprintCache:
+    """Enable the shared cache; called from app lifespan"""
+    global _cache
+    _cache = FingerprintCache(directory, max_bytes)
+    logger.info(f"Fingerprint cache: {directory} (max {max_bytes / 1024 / 1024:.0f} MB)")
+    return _cache
+
+
+def get_fingerprint_cache() -> Optional[FingerprintCache]:
+    """Shared cache, or None when caching is disabled"""
+    return _cache
@@ -0,0 +1,306 @@
+"""
+Shared Image Loader
+共用圖片載入器 - 同一來源只下載、解碼一次，供所有比對演算法共用
+"""
+import asyncio
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from loguru import logger
+
+from .executor import get_executor
+from ..downloader import get_download_service
+from ..crawler.http_cache import get_http_cache
+
+
+class ImageSource:
+    """
+    Decoded image with cached views
+    解碼一次後提供 PIL、RGB ndarray、灰階三種視圖（延遲計算並快取）
+    """
+
+    def __init__(
+        self,
+        image: Image.Image,
+        digest: Optional[str] = None,
+        original_size: Optional[tuple] = None
+    ):
+        """
+        Args:
+            image: Decoded PIL image
+            digest: SHA-256 of the encoded bytes (None for in-memory sources)
+            original_size: (width, height) before reduced decoding
+        """
+        self.digest = digest
+        self.original_size = original_size or image.size
+        self._pil = image if image.mode == 'RGB' else image.convert('RGB')
+        self._rgb: Optional[np.ndarray] = None
+        self._gray: Optional[np.ndarray] = None
+
+    @property
+    def pil(self) -> Image.Image:
+        """RGB PIL image"""
+        return self._pil
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """RGB uint8 array (H, W, 3)"""
+        if self._rgb is None:
+            self._rgb = np.asarray(self._pil)
+        return self._rgb
+
+    @property
+    def gray(self) -> np.ndarray:
+        """Grayscale uint8 array (H, W)"""
+        if self._gray is None:
+            self._gray = np.asarray(self._pil.convert('L'))
+        return self._gray
+
+    @property
+    def size(self) -> tuple:
+        """(width, height)"""
+        return self._pil.size
+
+    @property
+    def reduced(self) -> bool:
+        """True if decoded below full resolution"""
+        return self._pil.size != self.original_size
+
+    @classmethod
+    def from_bytes(cls, data: bytes, min_size: Optional[int] = None) -> 'ImageSource':
+        """Decode encoded image bytes, reusing a cached decode when available"""
+        digest = hashlib.sha256(data).hexdigest()
+        cached = image_cache.lookup(digest, min_size)
+        if cached is not None:
+            return cached
+        return cls._decode_bytes(data, digest, min_size)
+
+    @classmethod
+    def _decode_bytes(cls, data: bytes, digest: str, min_size: Optional[int] = None) -> 'ImageSource':
+        image = Image.open(BytesIO(data))
+        original_size = image.size
+        if min_size:
+            # JPEG: scale by 1/2, 1/4 or 1/8 in the DCT domain while decoding,
+            # keeping both sides >= min_size (no-op for other formats)
+            image.draft('RGB', (min_size, min_size))
+        image = image.convert('RGB')
+
+        source = cls(image, digest, original_size)
+        image_cache.put(image_cache.key(digest, min_size if source.reduced else None), source)
+        return source
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> 'ImageSource':
+        """Wrap an RGB or grayscale ndarray"""
+        image = Image.fromarray(array)
+        source = cls(image)
+        if array.ndim == 3:
+            source._rgb = array
+        return source
+
+    @classmethod
+    async def _decode(cls, data: bytes, min_size: Optional[int] = None) -> 'ImageSource':
+        """Decode in the thread pool (PIL releases the GIL while decoding)"""
+        digest = hashlib.sha256(data).hexdigest()
+        cached = image_cache.lookup(digest, min_size)
+        if cached is not None:
+            return cached
+        return await get_executor().run_thread(cls._decode_bytes, data, digest, min_size)
+
+    @classmethod
+    async def load(
+        cls,
+        source: 'str | bytes | Image.Image | np.ndarray | ImageSource',
+        min_size: Optional[int] = None
+    ) -> Optional['ImageSource']:
+        """
+        Load image from URL, data URL, file path, bytes, PIL image or ndarray
+
+        Args:
+            source: Image source
+            min_size: Fast path for hashes / histograms - decode encoded
+                      JPEG input at reduced resolution (each side >= min_size).
+                      Already-decoded inputs are returned as-is.
+
+        Returns:
+            ImageSource, or None on error
+        """
+        try:
+            if isinstance(source, ImageSource):
+                return source
+
+            if isinstance(source, Image.Image):
+                return cls(source)
+
+            if isinstance(source, np.ndarray):
+                return cls.from_array(source)
+
+            if isinstance(source, bytes):
+                return await cls._decode(source, min_size)
+
+            if isinstance(source, str):
+                return await cls._decode(await read_source_bytes(source), min_size)
+
+            return None
+
+        except Exception as e:
+            logger.error(f"Error loading image: {e}")
+            return None
+
+
+async def read_source_bytes(source: str) -> bytes:
+    """Read encoded image bytes from a URL, data URL or file path"""
+    if source.startswith(('http://', 'https://')):
+        _, data = await image_downloads.fetch(source)
+        return data
+
+    if source.startswith('data:image'):
+        header, data = source.split(',', 1)
+        return base64.b64decode(data)
+
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+async def _download_url(url: str) -> bytes:
+    cache = get_http_cache()
+    if cache is None:
+        return await get_download_service().fetch_bytes(url)
+
+    # Thumbnails seen in an earlier scan are revalidated, not re-downloaded
+    response = await cache.fetch(
+        url, lambda headers: get_download_service().fetch_response(url, headers=headers)
+    )
+    response.raise_for_status()
+    return response.content
+
+
+class ImageDownloads:
+    """
+    Content-addressed image downloads
+    內容定址的圖片下載 - 同一網址同時只下載一次，並記住網址對應的 SHA-256
+
+    Concurrent requests for a URL share one download (a caller being
+    cancelled doesn't cancel it for the others). The URL -> digest map is
+    a bounded LRU; callers use it to recognise byte-identical images
+    behind different URLs without downloading them again.
+    """
+
+    def __init__(self, max_urls: int = 100_000):
+        self.max_urls = max_urls
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._digests: 'OrderedDict[str, str]' = OrderedDict()
+        self.downloads = 0
+        self.coalesced = 0
+
+    def digest(self, url: str) -> Optional[str]:
+        """SHA-256 of the bytes last downloaded from url, if remembered"""
+        digest = self._digests.get(url)
+        if digest is not None:
+            self._digests.move_to_end(url)
+        return digest
+
+    async def fetch(self, url: str) -> Tuple[str, bytes]:
+        """Download url (coalesced with concurrent requests) -> (sha256, bytes); also reads data URLs / paths"""
+        task = self._inflight.get(url)
+        if task is None:
+            task = self._inflight[url] = asyncio.ensure_future(self._fetch(url))
+            task.add_done_callback(lambda task: self._done(url, task))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _fetch(self, url: str) -> Tuple[str, bytes]:
+        self.downloads += 1
+        if url.startswith(('http://', 'https://')):
+            data = await _download_url(url)
+        else:
+            data = await read_source_bytes(url)
+        digest = hashlib.sha256(data).hexdigest()
+
+        self._digests[url] = digest
+        self._digests.move_to_end(url)
+        while len(self._digests) > self.max_urls:
+            self._digests.popitem(last=False)
+        return digest, data
+
+    def _done(self, url: str, task: asyncio.Task):
+        if self._inflight.get(url) is task:
+            del self._inflight[url]
+        if not task.cancelled():
+            task.exception()  # retrieved even if every caller was cancelled
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'downloads': self.downloads,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._inflight),
+            'known_urls': len(self._digests)
+        }
+
+
+class ImageSourceCache:
+    """
+    Bounded LRU of decoded images keyed by content hash
+    以內容雜湊為鍵的 LRU 快取，避免同一張圖重複解碼
+
+    Reduced-resolution decodes are stored under "<digest>@<min_size>";
+    a full-resolution entry also satisfies reduced lookups.
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, ImageSource]' = OrderedDict()
+        self._lock = threading.Lock()  # decodes finish on worker threads
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[ImageSource]:
+        with self._lock:
+            source = self._entries.get(digest)
+            if source is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return source
+
+    @staticmethod
+    def key(digest: str, min_size: Optional[int] = None) -> str:
+        return f"{digest}@{min_size}" if min_size else digest
+
+    def lookup(self, digest: str, min_size: Optional[int] = None) -> Optional[ImageSource]:
+        """Best cached decode for a request (reduced entry, then full resolution)"""
+        if min_size:
+            source = self.get(self.key(digest, min_size))
+            if source is not None:
+                return source
+        return self.get(digest)
+
+    def put(self, digest: str, source: ImageSource):
+        with self._lock:
+            self._entries[digest] = source
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Process-wide decode cache
+image_cache = ImageSourceCache()
+
+# Process-wide image download coalescing / URL -> digest map
+image_downloads = ImageDownloads()
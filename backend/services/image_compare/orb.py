@@ -2,14 +2,16 @@
 ORB (Oriented FAST and Rotated BRIEF) Feature Matching
 ORB 特徵點比對 - 對旋轉、縮放具有不變性
 """
+import threading
 import cv2
 import numpy as np
 from PIL import Image
-from io import BytesIO
-import httpx
 from typing import Optional, Tuple, List
 from loguru import logger
 
+from .loader import ImageSource
+from .executor import get_executor
+
 
 class ORBCompare:
     """
@@ -31,17 +33,16 @@ class ORBCompare:
             scale_factor: Pyramid decimation ratio
             n_levels: Number of pyramid levels
         """
-        self.orb = cv2.ORB_create(
-            nfeatures=n_features,
-            scaleFactor=scale_factor,
-            nlevels=n_levels
-        )
-        # Use BFMatcher with Hamming distance for binary descriptors
-        self.bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
+        self.n_features = n_features
+        self.scale_factor = scale_factor
+        self.n_levels = n_levels
+        # Extraction and matching run on executor threads; cv2 detectors and
+        # matchers are not safe to share between threads, so each gets its own
+        self._local = threading.local()
 
     async def extract_features(
         self,
-        image_source: str | bytes | Image.Image
+        image_source: str | bytes | Image.Image | ImageSource
     ) -> Tuple[Optional[np.ndarray], Optional[np.ndarray], int]:
         """
         Extract ORB features from an image
@@ -50,64 +51,53 @@ class ORBCompare:
             Tuple of (keypoints, descriptors, feature_count)
         """
         try:
-            # Load and convert to grayscale
-            image = await self._load_image(image_source)
+            # Load image (shared decode) and use its grayscale view for ORB
+            image = await ImageSource.load(image_source)
             if image is None:
                 return None, None, 0
 
-            # Convert to grayscale for ORB
-            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-
-            # Detect and compute
-            keypoints, descriptors = self.orb.detectAndCompute(gray, None)
-
-            if descriptors is None:
-                return None, None, 0
-
-            # Convert keypoints to serializable format
-            kp_array = np.array([[kp.pt[0], kp.pt[1], kp.size, kp.angle] for kp in keypoints])
-
-            return kp_array, descriptors, len(keypoints)
+            # Detect and compute in the thread pool (OpenCV releases the GIL)
+            return await get_executor().run_thread(self._detect_and_compute, image.gray)
 
         except Exception as e:
             logger.error(f"Error extracting ORB features: {e}")
             return None, None, 0
 
-    async def _load_image(self, source: str | bytes | Image.Image) -> Optional[np.ndarray]:
-        """Load image and convert to numpy array"""
-        try:
-            if isinstance(source, np.ndarray):
-                return source
-
-            if isinstance(source, Image.Image):
-                return np.array(source.convert('RGB'))
-
-            if isinstance(source, bytes):
-                pil_image = Image.open(BytesIO(source)).convert('RGB')
-                return np.array(pil_image)
-
-            if isinstance(source, str):
-                if source.startswith(('http://', 'https://')):
-                    async with httpx.AsyncClient(timeout=30) as client:
-                        response = await client.get(source)
-                        response.raise_for_status()
-                        pil_image = Image.open(BytesIO(response.content)).convert('RGB')
-                        return np.array(pil_image)
-                elif source.startswith('data:image'):
-                    import base64
-                    header, data = source.split(',', 1)
-                    image_data = base64.b64decode(data)
-                    pil_image = Image.open(BytesIO(image_data)).convert('RGB')
-                    return np.array(pil_image)
-                else:
-                    pil_image = Image.open(source).convert('RGB')
-                    return np.array(pil_image)
-
-            return None
+    @property
+    def orb(self):
+        """ORB detector for the current thread"""
+        detector = getattr(self._local, 'orb', None)
+        if detector is None:
+            detector = cv2.ORB_create(
+                nfeatures=self.n_features,
+                scaleFactor=self.scale_factor,
+                nlevels=self.n_levels
+            )
+            self._local.orb = detector
+        return detector
+
+    @property
+    def bf(self):
+        """BFMatcher with Hamming distance for binary descriptors (per thread)"""
+        matcher = getattr(self._local, 'bf', None)
+        if matcher is None:
+            matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
+            self._local.bf = matcher
+        return matcher
+
+    def _detect_and_compute(
+        self,
+        gray: np.ndarray
+    ) -> Tuple[Optional[np.ndarray], Optional[np.ndarray], int]:
+        keypoints, descriptors = self.orb.detectAndCompute(gray, None)
 
-        except Exception as e:
-            logger.error(f"Error loading image for ORB: {e}")
-            return None
+        if descriptors is None:
+            return None, None, 0
+
+        # Convert keypoints to serializable format
+        kp_array = np.array([[kp.pt[0], kp.pt[1], kp.size, kp.angle] for kp in keypoints])
+
+        return kp_array, descriptors, len(keypoints)
 
     def match_features(
         self,
@@ -161,7 +151,18 @@ class ORBCompare:
             Similarity score 0-100
         """
         good_matches, total_matches, match_ratio = self.match_features(desc1, desc2)
+        return self.similarity_from_matches(good_matches, match_ratio, min_matches)
 
+    def similarity_from_matches(
+        self,
+        good_matches: int,
+        match_ratio: float,
+        min_matches: int = 10
+    ) -> float:
+        """
+        Similarity 0-100 from a pairwise good-match count and
+        good_matches / min(len(desc1), len(desc2))
+        """
         if good_matches < min_matches:
             # Not enough matches for reliable comparison
             return max(0, good_matches / min_matches * 50)  # Scale to 0-50
@@ -174,8 +175,8 @@ class ORBCompare:
 
     async def compare_images(
         self,
-        image1: str | bytes | Image.Image,
-        image2: str | bytes | Image.Image
+        image1: str | bytes | Image.Image | ImageSource,
+        image2: str | bytes | Image.Image | ImageSource
     ) -> Tuple[float, int, int]:
         """
         Compare two images using ORB features
@@ -189,7 +190,7 @@ class ORBCompare:
         if desc1 is None or desc2 is None:
             return 0.0, count1, count2
 
-        similarity = self.compute_similarity(desc1, desc2)
+        similarity = await get_executor().run_thread(self.compute_similarity, desc1, desc2)
         return similarity, count1, count2
 
 
@@ -205,8 +206,8 @@ class SIFTCompare:
 
     async def compare_images(
         self,
-        image1: str | bytes | Image.Image,
-        image2: str | bytes | Image.Image
+        image1: str | bytes | Image.Image | ImageSource,
+        image2: str | bytes | Image.Image | ImageSource
     ) -> float:
         similarity, _, _ = await self.orb_compare.compare_images(image1, image2)
         return similarity
@@ -0,0 +1,144 @@
+"""
+ORB Descriptor Index
+ORB 特徵點一對多索引 - 所有資產的描述符建成一個 FLANN-LSH 索引，
+一張商品縮圖只需一次 knnMatch 就能得到每個資產的投票數
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+# FLANN 的 LSH 演算法代號（cv2 未匯出常數）
+FLANN_INDEX_LSH = 6
+
+
+class ORBIndex:
+    """
+    One-to-many ORB matching over many images' descriptors
+
+    每個描述符記錄所屬的 key。查詢時每個查詢描述符取 k 個最近鄰，
+    每個 key 取其中距離最近的一個投一票（同一查詢描述符對同一 key
+    最多一票），條件為距離 <= max_distance 且通過比率測試：
+    距離 < ratio * 第 k 近鄰距離。第 k 近鄰代表「背景」距離，
+    相當於把 Lowe ratio test 推廣到多張圖，重複上傳的相同資產
+    （少於 k 張）仍可各自得票。
+
+    - 描述符數量少時用 BFMatcher（精確），多時用 FLANN-LSH（近似）
+    - add / remove 只標記索引需重建，下次查詢時才重建
+    """
+
+    def __init__(
+        self,
+        k: int = 5,
+        ratio: float = 0.75,
+        max_distance: int = 64,
+        lsh_min_size: int = 5000
+    ):
+        """
+        Args:
+            k: Nearest neighbours per query descriptor
+            ratio: Vote only if distance < ratio * k-th neighbour distance
+            max_distance: Max Hamming distance (of 256) for a vote
+            lsh_min_size: Use FLANN-LSH from this many indexed descriptors
+        """
+        self.k = k
+        self.ratio = ratio
+        self.max_distance = max_distance
+        self.lsh_min_size = lsh_min_size
+
+        self._descriptors: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()  # queries run on executor threads
+        self._matcher = None
+        self._keys: List[str] = []
+        self._owners = np.empty(0, dtype=np.int32)  # row -> index into _keys
+
+    def __len__(self) -> int:
+        return len(self._descriptors)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._descriptors
+
+    def descriptor_count(self, key: str) -> int:
+        descriptors = self._descriptors.get(key)
+        return len(descriptors) if descriptors is not None else 0
+
+    def add(self, key: str, descriptors: Optional[np.ndarray]):
+        """Add or replace the descriptors stored under key"""
+        with self._lock:
+            if descriptors is None or len(descriptors) == 0:
+                self._descriptors.pop(key, None)
+            else:
+                self._descriptors[key] = np.ascontiguousarray(descriptors, dtype=np.uint8)
+            self._matcher = None
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            if self._descriptors.pop(key, None) is None:
+                return False
+            self._matcher = None
+            return True
+
+    def query(self, descriptors: Optional[np.ndarray]) -> Dict[str, Tuple[int, float]]:
+        """
+        Match one image's descriptors against every indexed image at once
+
+        Returns:
+            {key: (votes, mean_distance)} for keys with at least one vote
+        """
+        if descriptors is None or len(descriptors) == 0:
+            return {}
+
+        with self._lock:
+            if not self._descriptors:
+                return {}
+            if self._matcher is None:
+                self._build()
+
+            k = min(self.k, len(self._owners))
+            knn = self._matcher.knnMatch(np.ascontiguousarray(descriptors, dtype=np.uint8), k=k)
+
+        votes: Dict[int, int] = {}
+        distance_sums: Dict[int, float] = {}
+        for neighbours in knn:
+            if not neighbours:
+                continue
+            ratio_limit = self.ratio * neighbours[-1].distance if len(neighbours) == k else float('inf')
+
+            seen = set()
+            for match in neighbours:  # sorted nearest first
+                if match.distance > self.max_distance or match.distance >= ratio_limit:
+                    break
+                owner = int(self._owners[match.trainIdx])
+                if owner in seen:
+                    continue
+                seen.add(owner)
+                votes[owner] = votes.get(owner, 0) + 1
+                distance_sums[owner] = distance_sums.get(owner, 0.0) + match.distance
+
+        return {
+            self._keys[owner]: (count, distance_sums[owner] / count)
+            for owner, count in votes.items()
+        }
+
+    def _build(self):
+        self._keys = list(self._descriptors)
+        stacked = np.vstack([self._descriptors[key] for key in self._keys])
+        self._owners = np.repeat(
+            np.arange(len(self._keys), dtype=np.int32),
+            [len(self._descriptors[key]) for key in self._keys]
+        )
+
+        if len(stacked) >= self.lsh_min_size:
+            matcher = cv2.FlannBasedMatcher(
+                dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1),
+                dict(checks=50)
+            )
+        else:
+            matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
+
+        matcher.add([stacked])
+        matcher.train()
+        self._matcher = matcher
+        logger.debug(f"ORB index built: {len(self._keys)} images, {len(stacked)} descriptors")
@@ -5,11 +5,117 @@ Perceptual Hash (pHash) Image Comparison
 import imagehash
 from PIL import Image
 import numpy as np
-from io import BytesIO
-import httpx
-from typing import Optional, Tuple
+from typing import Optional, Tuple, List
 from loguru import logger
 
+from .loader import ImageSource
+from .executor import get_executor
+
+
+# ==================== Packed-bit Hamming kernel ====================
+#
+# Hashes are stored as rows of big-endian uint64 words so that Hamming
+# distance is XOR + popcount over a few words.  One suspect against N
+# stored hashes is a single (N, W) array operation.
+
+if hasattr(np, 'bitwise_count'):
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        """Per-word popcount (numpy >= 2.0)"""
+        return np.bitwise_count(words)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        """Per-word popcount via byte lookup table"""
+        as_bytes = words.view(np.uint8).reshape(words.shape + (8,))
+        return _POPCOUNT_TABLE[as_bytes].sum(axis=-1, dtype=np.uint8)
+
+
+def pack_hash(hex_hash: str) -> np.ndarray:
+    """
+    Pack a hex hash string into uint64 words
+
+    Returns:
+        1-D uint64 array of ceil(bits / 64) words
+    """
+    n_chars = -(-len(hex_hash) // 16) * 16
+    raw = bytes.fromhex(hex_hash.rjust(n_chars, '0'))
+    return np.frombuffer(raw, dtype='>u8').astype(np.uint64)
+
+
+def unpack_hash(words: np.ndarray, bits: int) -> str:
+    """Inverse of pack_hash for a bits-long hash"""
+    return np.asarray(words, dtype='>u8').tobytes().hex()[-(bits // 4):]
+
+
+def pack_hashes(hex_hashes: List[str]) -> np.ndarray:
+    """
+    Pack hex hash strings of equal length into a (N, W) uint64 matrix
+    """
+    if not hex_hashes:
+        return np.empty((0, 0), dtype=np.uint64)
+
+    n_chars = -(-len(hex_hashes[0]) // 16) * 16
+    raw = b''.join(bytes.fromhex(h.rjust(n_chars, '0')) for h in hex_hashes)
+    return np.frombuffer(raw, dtype='>u8').astype(np.uint64).reshape(len(hex_hashes), -1)
+
+
+def hamming_distances(query: np.ndarray, packed: np.ndarray) -> np.ndarray:
+    """
+    One-to-many Hamming distance
+
+    Args:
+        query: (W,) packed hash
+        packed: (N, W) packed hash matrix
+
+    Returns:
+        (N,) distances
+    """
+    if packed.shape[-1] != query.shape[-1]:
+        raise ValueError("Hash sizes do not match")
+    return _popcount(packed ^ query).sum(axis=-1, dtype=np.int32)
+
+
+def hamming_matrix(
+    packed_a: np.ndarray,
+    packed_b: np.ndarray,
+    chunk_rows: int = 1024
+) -> np.ndarray:
+    """
+    Many-to-many Hamming distance
+
+    Args:
+        packed_a: (Na, W) packed hash matrix
+        packed_b: (Nb, W) packed hash matrix
+        chunk_rows: Rows of packed_a processed per step (bounds peak memory)
+
+    Returns:
+        (Na, Nb) distances
+    """
+    if packed_a.shape[-1] != packed_b.shape[-1]:
+        raise ValueError("Hash sizes do not match")
+
+    result = np.empty((len(packed_a), len(packed_b)), dtype=np.int32)
+    for start in range(0, len(packed_a), chunk_rows):
+        chunk = packed_a[start:start + chunk_rows, None, :]
+        result[start:start + chunk_rows] = _popcount(chunk ^ packed_b[None, :, :]).sum(axis=-1, dtype=np.int32)
+    return result
+
+
+def _phash_hex(image: Image.Image, hash_size: int) -> str:
+    """pHash worker (module-level so it can run in the process pool)"""
+    return str(imagehash.phash(image, hash_size=hash_size))
+
+
+def _all_hashes_hex(image: Image.Image, hash_size: int) -> dict:
+    """Multi-hash worker (module-level so it can run in the process pool)"""
+    return {
+        'phash': str(imagehash.phash(image, hash_size=hash_size)),
+        'ahash': str(imagehash.average_hash(image, hash_size=hash_size)),
+        'dhash': str(imagehash.dhash(image, hash_size=hash_size)),
+        'whash': str(imagehash.whash(image, hash_size=hash_size))
+    }
+
 
 class PHashCompare:
     """
@@ -25,62 +131,32 @@ class PHashCompare:
             hash_size: Hash size (larger = more precise, default 16 = 256-bit hash)
         """
         self.hash_size = hash_size
+        # imagehash resizes to (hash_size * 4)^2 before the DCT; decoding at
+        # twice that keeps the antialiased resize equivalent to full resolution
+        self.decode_size = hash_size * 4 * 2
 
-    async def compute_hash(self, image_source: str | bytes | Image.Image) -> Optional[str]:
+    async def compute_hash(self, image_source: str | bytes | Image.Image | ImageSource) -> Optional[str]:
         """
         Compute perceptual hash for an image
 
         Args:
-            image_source: URL, bytes, or PIL Image
+            image_source: URL, bytes, PIL Image, or a loaded ImageSource
 
         Returns:
             Hex string of the perceptual hash, or None on error
         """
         try:
-            image = await self._load_image(image_source)
+            image = await ImageSource.load(image_source, min_size=self.decode_size)
             if image is None:
                 return None
 
-            # Compute pHash using DCT
-            phash = imagehash.phash(image, hash_size=self.hash_size)
-            return str(phash)
+            # Compute pHash using DCT (off the event loop)
+            return await get_executor().run_process(_phash_hex, image.pil, self.hash_size)
 
         except Exception as e:
             logger.error(f"Error computing pHash: {e}")
             return None
 
-    async def _load_image(self, source: str | bytes | Image.Image) -> Optional[Image.Image]:
-        """Load image from various sources"""
-        try:
-            if isinstance(source, Image.Image):
-                return source.convert('RGB')
-
-            if isinstance(source, bytes):
-                return Image.open(BytesIO(source)).convert('RGB')
-
-            if isinstance(source, str):
-                if source.startswith(('http://', 'https://')):
-                    # Download from URL
-                    async with httpx.AsyncClient(timeout=30) as client:
-                        response = await client.get(source)
-                        response.raise_for_status()
-                        return Image.open(BytesIO(response.content)).convert('RGB')
-                elif source.startswith('data:image'):
-                    # Base64 data URL
-                    import base64
-                    header, data = source.split(',', 1)
-                    image_data = base64.b64decode(data)
-                    return Image.open(BytesIO(image_data)).convert('RGB')
-                else:
-                    # File path
-                    return Image.open(source).convert('RGB')
-
-            return None
-
-        except Exception as e:
-            logger.error(f"Error loading image: {e}")
-            return None
-
     def compute_similarity(self, hash1: str, hash2: str) -> float:
         """
         Compute similarity between two pHash values
@@ -93,27 +169,44 @@ class PHashCompare:
             Similarity score 0-100 (100 = identical)
         """
         try:
-            h1 = imagehash.hex_to_hash(hash1)
-            h2 = imagehash.hex_to_hash(hash2)
+            if len(hash1) != len(hash2):
+                raise ValueError("Hash sizes do not match")
 
             # Hamming distance (number of different bits)
-            hamming_distance = h1 - h2
-
-            # Convert to similarity percentage
-            # Max distance for 256-bit hash is 256
-            max_distance = self.hash_size * self.hash_size
-            similarity = (1 - (hamming_distance / max_distance)) * 100
+            hamming_distance = (int(hash1, 16) ^ int(hash2, 16)).bit_count()
 
-            return round(similarity, 2)
+            return round(float(self.distance_to_similarity(hamming_distance)), 2)
 
         except Exception as e:
             logger.error(f"Error computing similarity: {e}")
             return 0.0
 
+    def distance_to_similarity(self, distance):
+        """
+        Convert Hamming distance (scalar or ndarray) to similarity 0-100
+        Max distance for 256-bit hash is 256
+        """
+        max_distance = self.hash_size * self.hash_size
+        return (1 - (distance / max_distance)) * 100
+
+    def compute_similarities(self, query_hash: str, packed: np.ndarray) -> np.ndarray:
+        """
+        One-to-many similarity against a packed hash matrix
+
+        Args:
+            query_hash: Hex hash string
+            packed: (N, W) matrix from pack_hashes()
+
+        Returns:
+            (N,) similarity scores 0-100
+        """
+        distances = hamming_distances(pack_hash(query_hash), packed)
+        return np.round(self.distance_to_similarity(distances), 2)
+
     async def compare_images(
         self,
-        image1: str | bytes | Image.Image,
-        image2: str | bytes | Image.Image
+        image1: str | bytes | Image.Image | ImageSource,
+        image2: str | bytes | Image.Image | ImageSource
     ) -> Tuple[float, Optional[str], Optional[str]]:
         """
         Compare two images using pHash
@@ -138,19 +231,14 @@ class MultiHashCompare(PHashCompare):
     使用多種哈希算法提高準確度
     """
 
-    async def compute_all_hashes(self, image_source: str | bytes | Image.Image) -> dict:
+    async def compute_all_hashes(self, image_source: str | bytes | Image.Image | ImageSource) -> dict:
         """Compute multiple hash types"""
         try:
-            image = await self._load_image(image_source)
-            if image is None:
+            source = await ImageSource.load(image_source, min_size=self.decode_size)
+            if source is None:
                 return {}
 
-            return {
-                'phash': str(imagehash.phash(image, hash_size=self.hash_size)),
-                'ahash': str(imagehash.average_hash(image, hash_size=self.hash_size)),
-                'dhash': str(imagehash.dhash(image, hash_size=self.hash_size)),
-                'whash': str(imagehash.whash(image, hash_size=self.hash_size))
-            }
+            return await get_executor().run_process(_all_hashes_hex, source.pil, self.hash_size)
 
         except Exception as e:
             logger.error(f"Error computing hashes: {e}")
@@ -161,12 +249,21 @@ class MultiHashCompare(PHashCompare):
         scores = {}
         weights = {'phash': 0.4, 'ahash': 0.2, 'dhash': 0.2, 'whash': 0.2}
 
-        for hash_type in ['phash', 'ahash', 'dhash', 'whash']:
-            if hash_type in hashes1 and hash_type in hashes2:
-                scores[hash_type] = self.compute_similarity(
-                    hashes1[hash_type],
-                    hashes2[hash_type]
-                )
+        hash_types = [
+            t for t in ['phash', 'ahash', 'dhash', 'whash']
+            if hashes1.get(t) and hashes2.get(t) and len(hashes1[t]) == len(hashes2[t])
+        ]
+
+        if hash_types:
+            try:
+                # All hash types share hash_size, so compare them in one XOR + popcount
+                packed1 = pack_hashes([hashes1[t] for t in hash_types])
+                packed2 = pack_hashes([hashes2[t] for t in hash_types])
+                distances = _popcount(packed1 ^ packed2).sum(axis=-1)
+                similarities = self.distance_to_similarity(distances)
+                scores = {t: round(float(v), 2) for t, v in zip(hash_types, similarities)}
+            except Exception as e:
+                logger.error(f"Error computing multi-hash similarity: {e}")
 
         if not scores:
             return {'overall': 0.0, 'scores': {}}
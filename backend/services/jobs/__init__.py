@@ -0,0 +1,17 @@
+"""
+Job Queue
+持久化掃描工作佇列與工作行程
+"""
+from .queue import Job, JobEvent, JobQueue, configure_job_queue, get_job_queue, shutdown_job_queue
+from .worker import JobContext, JobWorker
+
+__all__ = [
+    'Job',
+    'JobEvent',
+    'JobQueue',
+    'JobContext',
+    'JobWorker',
+    'configure_job_queue',
+    'get_job_queue',
+    'shutdown_job_queue'
+]
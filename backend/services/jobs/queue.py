@@ -0,0 +1,448 @@
+"""
+Job Queue
+持久化工作佇列 - 掃描任務存在 SQLite，由獨立的工作行程領取執行
+
+- API 只寫入任務（enqueue）與讀取狀態，重新啟動不會遺失排隊中或執行中的任務
+- 工作行程以 claim() 原子性地領取任務，執行期間定期 heartbeat()
+- 心跳逾時（工作行程當掉）的任務重新排入佇列；失敗的任務依次數退避重試
+- 執行中的發現（侵權商品）以事件逐筆寫入，API / WebSocket 在任務結束前即可讀到
+- 工作行程定期寫入自己的服務指標（publish_worker），API 的 /api/health 讀取
+
+SQLite（WAL 模式）存放，API 與多個工作行程共用同一個資料庫檔。
+所有方法都是同步的 SQLite 呼叫：在事件迴圈中請以 asyncio.to_thread 呼叫。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    kind         TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    payload      TEXT NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    worker_id    TEXT,
+    heartbeat_at REAL,
+    progress     INTEGER NOT NULL DEFAULT 0,
+    message      TEXT NOT NULL DEFAULT '',
+    result       TEXT,
+    error        TEXT,
+    created_at   TEXT NOT NULL,
+    started_at   TEXT,
+    completed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id     TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    data       TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq);
+CREATE INDEX IF NOT EXISTS job_events_count ON job_events (job_id, kind);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id  TEXT PRIMARY KEY,
+    metrics    TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+JOB_COLUMNS = (
+    "id, kind, status, payload, attempts, max_attempts, worker_id, heartbeat_at, "
+    "progress, message, result, error, created_at, started_at, completed_at"
+)
+
+# Statuses a job can no longer leave
+FINISHED = ('completed', 'failed', 'cancelled')
+
+
+def _dumps(value: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(
+            value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS, default=str
+        ).decode()
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _loads(text: Optional[str]) -> Any:
+    if text is None:
+        return None
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+@dataclass
+class Job:
+    """A queued unit of work and its state"""
+    id: str
+    kind: str
+    status: str  # 'queued', 'running', 'completed', 'failed', 'cancelled'
+    payload: Dict
+    attempts: int
+    max_attempts: int
+    worker_id: Optional[str]
+    heartbeat_at: Optional[float]
+    progress: int
+    message: str
+    result: Optional[Dict]
+    error: Optional[str]
+    created_at: str
+    started_at: Optional[str]
+    completed_at: Optional[str]
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'Job':
+        (job_id, kind, status, payload, attempts, max_attempts, worker_id, heartbeat_at,
+         progress, message, result, error, created_at, started_at, completed_at) = row
+        return cls(
+            id=job_id, kind=kind, status=status, payload=_loads(payload),
+            attempts=attempts, max_attempts=max_attempts, worker_id=worker_id,
+            heartbeat_at=heartbeat_at, progress=progress, message=message,
+            result=_loads(result), error=error, created_at=created_at,
+            started_at=started_at, completed_at=completed_at
+        )
+
+
+@dataclass
+class JobEvent:
+    """Something a running job reported (e.g. a violation found)"""
+    seq: int
+    job_id: str
+    kind: str
+    data: Dict
+    created_at: str
+
+
+class JobQueue:
+    """
+    Durable job queue on SQLite
+
+    A job is claimed by one worker at a time. The worker holds a lease
+    renewed by heartbeat(); once a lease is older than lease_seconds the
+    job is requeued for another worker. A failed attempt is retried after
+    retry_delay x 2^(attempt - 1) until max_attempts is reached.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 60.0, retry_delay: float = 30.0, max_attempts: int = 3):
+        """
+        Args:
+            path: SQLite database file
+            lease_seconds: Heartbeat age after which a running job is reclaimed
+            retry_delay: Delay before the first retry (doubled per attempt)
+            max_attempts: Default attempts per job
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    # API side
+
+    def enqueue(self, kind: str, payload: Dict, job_id: Optional[str] = None, max_attempts: Optional[int] = None) -> Job:
+        """Add a job; it runs as soon as a worker is free"""
+        job_id = job_id or f"job-{uuid.uuid4().hex[:8]}"
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, max_attempts, available_at, created_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, _dumps(payload), max_attempts or self.max_attempts,
+                 time.time(), datetime.now().isoformat())
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def list(self, kinds: Optional[List[str]] = None, status: Optional[str] = None, limit: int = 200) -> List[Job]:
+        """Most recent jobs first"""
+        query, params = f"SELECT {JOB_COLUMNS} FROM jobs WHERE 1 = 1", []
+        if kinds:
+            query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params += kinds
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [Job.from_row(row) for row in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; a running job's worker stops at its next heartbeat"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', completed_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (datetime.now().isoformat(), job_id)
+            )
+        return cursor.rowcount > 0
+
+    def events(
+        self,
+        job_id: Optional[str] = None,
+        kind: Optional[str] = None,
+        after: int = 0,
+        limit: Optional[int] = None
+    ) -> List[JobEvent]:
+        """Events in order (of one job, or the latest `limit` of all jobs)"""
+        query, params = "SELECT seq, job_id, kind, data, created_at FROM job_events WHERE seq > ?", [after]
+        if job_id is not None:
+            query += " AND job_id = ?"
+            params.append(job_id)
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        if limit is not None:
+            query = f"SELECT * FROM ({query} ORDER BY seq DESC LIMIT ?)"
+            params.append(limit)
+        query += " ORDER BY seq"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [JobEvent(seq, event_job, event_kind, _loads(data), created_at)
+                for seq, event_job, event_kind, data, created_at in rows]
+
+    def count_events(self, job_ids: List[str], kind: Optional[str] = None) -> Dict[str, int]:
+        """Number of events per job, one indexed COUNT query (jobs without events are left out)"""
+        if not job_ids:
+            return {}
+        query = (
+            f"SELECT job_id, COUNT(*) FROM job_events WHERE job_id IN ({', '.join('?' * len(job_ids))})"
+        )
+        params: List[Any] = list(job_ids)
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        query += " GROUP BY job_id"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return dict(rows)
+
+    def last_event_seq(self, job_id: str, kind: Optional[str] = None) -> int:
+        """Sequence number of the job's latest event (0 if none)"""
+        query, params = "SELECT MAX(seq) FROM job_events WHERE job_id = ?", [job_id]
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        return row[0] or 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {'path': self.path, **{status: count for status, count in rows}}
+
+    # Worker side
+
+    def claim(self, worker_id: str, kinds: Optional[List[str]] = None) -> Optional[Job]:
+        """Take the oldest ready job (after reclaiming expired leases), or None"""
+        now = time.time()
+        kind_filter, params = "", [now]
+        if kinds:
+            kind_filter = f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params += kinds
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._reclaim_expired(now)
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' AND available_at <= ?"
+                    f"{kind_filter} ORDER BY available_at, created_at LIMIT 1",
+                    params
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                # A retry starts over: drop what the previous attempt reported
+                # (it wrote no watermarks, so every listing is compared again)
+                self._conn.execute("DELETE FROM job_events WHERE job_id = ?", (row[0],))
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', worker_id = ?, heartbeat_at = ?, "
+                    "attempts = attempts + 1, progress = 0, message = '', error = NULL, "
+                    "started_at = ? WHERE id = ?",
+                    (worker_id, now, datetime.now().isoformat(), row[0])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0])
+
+    def heartbeat(self, job_id: str, worker_id: str, progress: Optional[int] = None, message: Optional[str] = None) -> bool:
+        """
+        Renew the lease (and store progress)
+
+        Returns False when the job is no longer this worker's: cancelled,
+        or reclaimed after a missed lease. The worker should stop it.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ?, progress = COALESCE(?, progress), "
+                "message = COALESCE(?, message) "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (time.time(), progress, message, job_id, worker_id)
+            )
+        return cursor.rowcount > 0
+
+    def add_event(self, job_id: str, kind: str, data: Dict) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO job_events (job_id, kind, data, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, kind, _dumps(data), datetime.now().isoformat())
+            )
+        return cursor.lastrowid
+
+    def complete(self, job_id: str, worker_id: str, result: Dict) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'completed', progress = 100, result = ?, completed_at = ?, "
+                "worker_id = NULL WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (_dumps(result), datetime.now().isoformat(), job_id, worker_id)
+            )
+        return cursor.rowcount > 0
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[str]:
+        """Record a failed attempt; returns the new status ('queued' to retry, 'failed') or None"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker_id = ? AND status = 'running'",
+                    (job_id, worker_id)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                attempts, max_attempts = row
+                if attempts < max_attempts:
+                    status = 'queued'
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', worker_id = NULL, error = ?, available_at = ? "
+                        "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                        (error, time.time() + self.retry_delay * 2 ** (attempts - 1), job_id, worker_id)
+                    )
+                else:
+                    status = 'failed'
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', worker_id = NULL, error = ?, completed_at = ? "
+                        "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                        (error, datetime.now().isoformat(), job_id, worker_id)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return status
+
+    def release(self, job_id: str, worker_id: str) -> bool:
+        """Hand a running job back without using up an attempt (worker shutting down)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL, attempts = attempts - 1, available_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (time.time(), job_id, worker_id)
+            )
+        return cursor.rowcount > 0
+
+    def _reclaim_expired(self, now: float):
+        """Requeue (or fail, when out of attempts) running jobs whose worker stopped heartbeating"""
+        expired = self._conn.execute(
+            "SELECT id, worker_id, attempts, max_attempts FROM jobs "
+            "WHERE status = 'running' AND heartbeat_at < ?",
+            (now - self.lease_seconds,)
+        ).fetchall()
+        for job_id, worker_id, attempts, max_attempts in expired:
+            error = f"Worker {worker_id} stopped responding"
+            if attempts < max_attempts:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker_id = NULL, error = ?, available_at = ? WHERE id = ?",
+                    (error, now, job_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', worker_id = NULL, error = ?, completed_at = ? WHERE id = ?",
+                    (error, datetime.now().isoformat(), job_id)
+                )
+            logger.warning(f"Job {job_id}: {error}, attempt {attempts}/{max_attempts}")
+
+    # Worker metrics
+
+    def publish_worker(self, worker_id: str, metrics: Dict):
+        """Store a worker process's current metrics (replaces its previous ones)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workers (worker_id, metrics, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (worker_id) DO UPDATE SET metrics = excluded.metrics, updated_at = excluded.updated_at",
+                (worker_id, _dumps(metrics), time.time())
+            )
+
+    def remove_worker(self, worker_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def workers(self) -> List[Dict]:
+        """Metrics of live workers; workers silent for lease_seconds are dropped"""
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE updated_at < ?", (time.time() - self.lease_seconds,))
+            rows = self._conn.execute(
+                "SELECT worker_id, metrics, updated_at FROM workers ORDER BY worker_id"
+            ).fetchall()
+        return [
+            {'worker_id': worker_id, 'updated_at': datetime.fromtimestamp(updated_at).isoformat(), **_loads(metrics)}
+            for worker_id, metrics, updated_at in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_queue: Optional[JobQueue] = None
+
+
+def configure_job_queue(path: str, **kwargs) -> JobQueue:
+    """Open the shared job queue; called at API / worker startup"""
+    global _queue
+    _queue = JobQueue(path, **kwargs)
+    logger.info(f"Job queue: {path}")
+    return _queue
+
+
+def get_job_queue() -> Optional[JobQueue]:
+    """Shared job queue, or None before configure_job_queue()"""
+    return _queue
+
+
+def shutdown_job_queue():
+    global _queue
+    if _queue is not None:
+        _queue.close()
+        _queue = None
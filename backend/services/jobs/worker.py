@@ -0,0 +1,155 @@
+"""
+Job Worker
+工作行程 - 從持久化佇列領取任務、回報心跳與進度、失敗重試
+
+每個工作行程一次執行一個任務：
+- 執行期間每 heartbeat_interval 秒續約並寫入最新進度
+- 續約失敗（任務被取消，或心跳逾時已被其他行程接手）就停止執行
+- 處理函式拋出例外 → queue.fail()：還有次數就退避後重試，否則標記失敗
+- 收到停止訊號時，執行中的任務交還佇列（不計入嘗試次數）
+- on_complete() 登記的回呼只在任務記錄為完成後執行（例如寫入增量掃描水位）
+"""
+import asyncio
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from .queue import Job, JobQueue
+
+# Minimum seconds between progress writes outside heartbeats
+PROGRESS_INTERVAL = 1.0
+
+
+class JobContext:
+    """Handed to a job handler: progress and event reporting"""
+
+    def __init__(self, queue: JobQueue, job: Job, worker_id: str):
+        self.queue = queue
+        self.job = job
+        self.worker_id = worker_id
+        self.progress = 0
+        self.message = ''
+        self._written_at = 0.0
+        self._on_complete: List[Callable[[], None]] = []
+
+    async def report(self, progress: int, message: str):
+        """Progress callback (progress 0-100, message); written at most once a second"""
+        self.progress, self.message = progress, message
+        now = time.monotonic()
+        if now - self._written_at >= PROGRESS_INTERVAL or progress >= 100:
+            self._written_at = now
+            await asyncio.to_thread(self.queue.heartbeat, self.job.id, self.worker_id, progress, message)
+
+    async def event(self, kind: str, data: Dict):
+        """Record a finding right away (visible to the API before the job ends)"""
+        await asyncio.to_thread(self.queue.add_event, self.job.id, kind, data)
+
+    def on_complete(self, callback: Callable[[], None]):
+        """
+        Run a sync callback (in a thread) once the job is recorded completed
+
+        For side effects a retry must not see, e.g. incremental scan
+        watermarks: a failed, cancelled or handed-back attempt never runs them.
+        """
+        self._on_complete.append(callback)
+
+
+Handler = Callable[[Job, JobContext], Awaitable[Dict]]
+
+
+class JobWorker:
+    """Claims and runs jobs from a JobQueue, one at a time"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, Handler],
+        worker_id: Optional[str] = None,
+        poll_interval: float = 1.0,
+        heartbeat_interval: float = 10.0
+    ):
+        """
+        Args:
+            queue: Job queue
+            handlers: Job kind -> coroutine function (job, context) -> result dict
+            worker_id: Name recorded on claimed jobs (default host:pid)
+            poll_interval: Seconds between claims while the queue is empty
+            heartbeat_interval: Seconds between lease renewals; keep well
+                below the queue's lease_seconds
+        """
+        self.queue = queue
+        self.handlers = handlers
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.completed = 0
+        self.failed = 0
+
+    async def run(self, stop: asyncio.Event):
+        """Run jobs until stop is set"""
+        logger.info(f"Worker {self.worker_id} started ({', '.join(self.handlers)})")
+        while not stop.is_set():
+            job = await asyncio.to_thread(self.queue.claim, self.worker_id, list(self.handlers))
+            if job is None:
+                try:
+                    await asyncio.wait_for(stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.execute(job, stop)
+        logger.info(f"Worker {self.worker_id} stopped: {self.completed} completed, {self.failed} failed")
+
+    async def execute(self, job: Job, stop: asyncio.Event):
+        """Run one claimed job to completion, failure, cancellation or shutdown"""
+        logger.info(f"Job {job.id} ({job.kind}) attempt {job.attempts}/{job.max_attempts}")
+        context = JobContext(self.queue, job, self.worker_id)
+        task = asyncio.create_task(self.handlers[job.kind](job, context))
+        stopping = asyncio.create_task(stop.wait())
+        lost = False
+
+        try:
+            while not task.done():
+                await asyncio.wait({task, stopping}, timeout=self.heartbeat_interval,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if task.done():
+                    break
+                if stop.is_set():
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    await asyncio.to_thread(self.queue.release, job.id, self.worker_id)
+                    logger.info(f"Job {job.id} handed back to the queue (worker stopping)")
+                    return
+                alive = await asyncio.to_thread(
+                    self.queue.heartbeat, job.id, self.worker_id, context.progress, context.message
+                )
+                if not alive:
+                    # Cancelled through the API, or our lease expired and another worker took it
+                    lost = True
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    logger.info(f"Job {job.id} stopped: cancelled or reclaimed")
+                    return
+        finally:
+            stopping.cancel()
+
+        if lost or task.cancelled():
+            return
+        error = task.exception()
+        if error is None:
+            if await asyncio.to_thread(self.queue.complete, job.id, self.worker_id, task.result()):
+                self.completed += 1
+                logger.info(f"Job {job.id} completed")
+                for callback in context._on_complete:
+                    try:
+                        await asyncio.to_thread(callback)
+                    except Exception as e:
+                        logger.error(f"Job {job.id} completion callback failed: {e}")
+            return
+
+        status = await asyncio.to_thread(self.queue.fail, job.id, self.worker_id, f"{type(error).__name__}: {error}")
+        if status == 'failed':
+            self.failed += 1
+        logger.error(f"Job {job.id} attempt {job.attempts} failed ({status or 'lost'}): {error}")
@@ -0,0 +1,130 @@
+"""
+Process Supervisor
+行程監管 - 同一容器內執行 API 與掃描工作行程
+
+兩者共用本機的 SQLite 工作佇列（settings.JOB_DB_PATH），因此部署在同一台主機：
+- 任一行程結束（非停止中）就以指數退避重新啟動，持續正常執行一段時間後退避歸零
+- SIGTERM / SIGINT 轉送給所有子行程：工作行程把執行中的任務交還佇列，API 正常關閉；
+  逾時未結束的子行程強制終止
+
+Usage (from backend/):
+    python supervisor.py                       # API on $PORT (default 8000) + scan workers
+    python supervisor.py --port 8000 --processes 2
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from loguru import logger
+
+# Restart backoff: doubles per crash up to MAX_BACKOFF; reset after STABLE_SECONDS of uptime
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+STABLE_SECONDS = 60.0
+
+
+@dataclass
+class Child:
+    """One supervised command"""
+    name: str
+    command: List[str]
+    process: Optional[subprocess.Popen] = None
+    started_at: float = 0.0
+    restart_at: float = 0.0
+    backoff: float = MIN_BACKOFF
+    restarts: int = 0
+
+    def start(self):
+        self.process = subprocess.Popen(self.command)
+        self.started_at = time.monotonic()
+        logger.info(f"{self.name} started (pid {self.process.pid})")
+
+
+class Supervisor:
+    """Keeps child processes running and forwards shutdown signals to them"""
+
+    def __init__(self, children: List[Child], grace_seconds: float = 30.0, poll_interval: float = 0.5):
+        """
+        Args:
+            children: Commands to run
+            grace_seconds: Time children get to exit after a forwarded signal
+            poll_interval: Seconds between child status checks
+        """
+        self.children = children
+        self.grace_seconds = grace_seconds
+        self.poll_interval = poll_interval
+        self.stopping: Optional[int] = None
+
+    def run(self) -> int:
+        """Run until SIGTERM / SIGINT; returns the exit code"""
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for child in self.children:
+            child.start()
+
+        while self.stopping is None:
+            now = time.monotonic()
+            for child in self.children:
+                if child.process is None:
+                    if now >= child.restart_at:
+                        child.restarts += 1
+                        child.start()
+                    continue
+                code = child.process.poll()
+                if code is None:
+                    continue
+                if now - child.started_at >= STABLE_SECONDS:
+                    child.backoff = MIN_BACKOFF
+                logger.error(f"{child.name} exited with code {code}; restarting in {child.backoff:.0f}s")
+                child.process = None
+                child.restart_at = now + child.backoff
+                child.backoff = min(MAX_BACKOFF, child.backoff * 2)
+            time.sleep(self.poll_interval)
+
+        return self._shutdown(self.stopping)
+
+    def _stop(self, signum, _frame):
+        self.stopping = signum
+
+    def _shutdown(self, signum: int) -> int:
+        running = [child for child in self.children if child.process is not None and child.process.poll() is None]
+        logger.info(f"Forwarding {signal.Signals(signum).name} to {', '.join(c.name for c in running) or 'no children'}")
+        for child in running:
+            child.process.send_signal(signum)
+
+        deadline = time.monotonic() + self.grace_seconds
+        for child in running:
+            try:
+                child.process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"{child.name} did not exit in {self.grace_seconds:.0f}s, killing it")
+                child.process.kill()
+                child.process.wait()
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--processes", type=int, default=None, help="Scan worker processes (default settings)")
+    parser.add_argument("--grace", type=float, default=30.0, help="Seconds children get to shut down")
+    args = parser.parse_args()
+
+    worker = [sys.executable, "worker.py"]
+    if args.processes is not None:
+        worker += ["--processes", str(args.processes)]
+    children = [
+        Child("api", [sys.executable, "-m", "uvicorn", "main:app", "--host", args.host, "--port", str(args.port)]),
+        Child("scan-worker", worker)
+    ]
+    sys.exit(Supervisor(children, grace_seconds=args.grace).run())
+
+
+if __name__ == "__main__":
+    main()
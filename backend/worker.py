@@ -0,0 +1,227 @@
+"""
+Image Guardian Scan Worker
+掃描工作行程 - 從持久化工作佇列領取掃描任務執行
+
+API 只把掃描任務寫入佇列（settings.JOB_DB_PATH），由這裡的工作行程執行；
+API 重新啟動不影響排隊中與執行中的任務，大型掃描也不會拖慢 API。
+
+Usage (from backend/):
+    python worker.py                  # settings.JOB_WORKER_PROCESSES 個行程
+    python worker.py --processes 4
+
+多行程時，當掉的工作行程會以指數退避重新啟動；SIGTERM / SIGINT 轉送給所有工作行程。
+每個行程分到 1/N 的每主機爬取速率與連線數（runtime.configure_services），
+並定期把指標寫入佇列供 /api/health 讀取。
+部署時以 supervisor.py 同時執行 API 與本程式。
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+from typing import Dict, List
+
+from loguru import logger
+
+from config import settings
+from runtime import configure_services, crawl_metrics, process_metrics, shutdown_services
+from services.crawler import CrawlerManager
+from services.image_compare import build_cascade
+from services.jobs import Job, JobContext, JobWorker, get_job_queue
+
+# Latest violation events (scan findings and recorded violations) fed to the crawl frontier
+HISTORY_EVENTS = 5000
+
+
+def _crawler_manager() -> CrawlerManager:
+    return CrawlerManager(
+        max_concurrency=settings.CRAWLER_MAX_CONCURRENCY,
+        platform_concurrency=settings.CRAWLER_PLATFORM_CONCURRENCY,
+        queue_size=settings.SCAN_QUEUE_SIZE,
+        download_workers=settings.SCAN_DOWNLOAD_WORKERS,
+        compare_workers=settings.SCAN_COMPARE_WORKERS,
+        outcome_cache_size=settings.SCAN_OUTCOME_CACHE_SIZE
+    )
+
+
+def _cascade():
+    return build_cascade(
+        settings.COMPARE_CASCADE,
+        phash_accept=settings.CASCADE_PHASH_ACCEPT,
+        phash_reject=settings.CASCADE_PHASH_REJECT,
+        color_reject=settings.CASCADE_COLOR_REJECT
+    )
+
+
+def _violation_history() -> List[Dict]:
+    """
+    Past violations for the crawl frontier, once per listing
+
+    Read from the queue when a scan starts: earlier scans' findings and the
+    violations recorded through the API (api/routes/violations.py) are both
+    'violation' events there.
+    """
+    history = {}
+    for event in reversed(get_job_queue().events(kind="violation", limit=HISTORY_EVENTS)):
+        listing = event.data.get("listing") or {}
+        history.setdefault(
+            (listing.get("platform"), listing.get("id") or event.job_id),
+            {"listing": listing, "platform": listing.get("platform"), "detected_at": event.created_at}
+        )
+    return list(history.values())
+
+
+async def run_scan(job: Job, context: JobContext) -> Dict:
+    """Keyword scan (POST /api/scans/create)"""
+    config = job.payload["config"]
+
+    async def on_violation(violation: dict):
+        await context.event("violation", violation)
+
+    return await _crawler_manager().scan_with_comparison(
+        asset_images=job.payload["asset_images"],
+        keywords=config["keywords"],
+        platforms=config["platforms"],
+        similarity_threshold=config["similarity_threshold"],
+        max_pages=config["scan_depth"],
+        max_results_per_platform=config["max_results"] // len(config["platforms"]),
+        on_progress=context.report,
+        on_violation=on_violation,
+        incremental=config["incremental"],
+        cascade=_cascade(),
+        history=await asyncio.to_thread(_violation_history),
+        defer_watermarks=context.on_complete
+    )
+
+
+async def run_seller_sweep(job: Job, context: JobContext) -> Dict:
+    """Seller catalogue sweep (POST /api/scans/seller-sweep)"""
+    config = job.payload["config"]
+
+    async def on_violation(violation: dict):
+        await context.event("violation", violation)
+
+    return await _crawler_manager().sweep_sellers(
+        asset_images=job.payload["asset_images"],
+        sellers=[(platform, seller_id) for platform, seller_id in job.payload["sellers"]],
+        similarity_threshold=config["similarity_threshold"],
+        max_products=config["max_products"],
+        on_progress=context.report,
+        on_violation=on_violation,
+        incremental=config["incremental"],
+        cascade=_cascade(),
+        defer_watermarks=context.on_complete
+    )
+
+
+HANDLERS = {
+    "scan": run_scan,
+    "seller_sweep": run_seller_sweep
+}
+
+
+async def publish_metrics(worker: JobWorker, stop: asyncio.Event):
+    """Write this process's metrics to the queue for /api/health until stop is set"""
+    queue = worker.queue
+    while not stop.is_set():
+        metrics = {
+            'pid': os.getpid(),
+            'completed': worker.completed,
+            'failed': worker.failed,
+            **process_metrics(),
+            **crawl_metrics()
+        }
+        try:
+            await asyncio.to_thread(queue.publish_worker, worker.worker_id, metrics)
+        except Exception as e:
+            logger.warning(f"Publishing worker metrics failed: {e}")
+        try:
+            await asyncio.wait_for(stop.wait(), settings.JOB_HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+    await asyncio.to_thread(queue.remove_worker, worker.worker_id)
+
+
+async def serve(worker_id: str = None, processes: int = 1):
+    """Run one worker until SIGTERM / SIGINT"""
+    # Per-host crawl limits are split between the worker processes
+    configure_services(processes=processes)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    worker = JobWorker(
+        get_job_queue(),
+        HANDLERS,
+        worker_id=worker_id,
+        poll_interval=settings.JOB_POLL_SECONDS,
+        heartbeat_interval=settings.JOB_HEARTBEAT_SECONDS
+    )
+    publisher = asyncio.create_task(publish_metrics(worker, stop))
+    try:
+        await worker.run(stop)
+    finally:
+        stop.set()
+        await asyncio.gather(publisher, return_exceptions=True)
+        await shutdown_services()
+
+
+def _process_main(index: int, processes: int):
+    asyncio.run(serve(f"{os.uname().nodename}:{os.getpid()}:{index}", processes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=settings.JOB_WORKER_PROCESSES)
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        asyncio.run(serve())
+        return
+
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def start(index: int) -> multiprocessing.Process:
+        process = context.Process(target=_process_main, args=(index, args.processes), name=f"scan-worker-{index}")
+        process.start()
+        return process
+
+    def forward(signum, _frame):
+        # Workers hand their running jobs back to the queue and exit
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    processes = {index: start(index) for index in range(args.processes)}
+    started = {index: time.monotonic() for index in processes}
+    backoff = {index: 1.0 for index in processes}
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    logger.info(f"Started {len(processes)} scan workers")
+
+    # Restart crashed workers with exponential backoff (reset after a minute of uptime)
+    while not stopping:
+        wait([process.sentinel for process in processes.values()], timeout=1.0)
+        for index, process in list(processes.items()):
+            if stopping or process.is_alive():
+                continue
+            if time.monotonic() - started[index] >= 60:
+                backoff[index] = 1.0
+            logger.error(f"{process.name} exited with code {process.exitcode}; restarting in {backoff[index]:.0f}s")
+            time.sleep(backoff[index])
+            backoff[index] = min(60.0, backoff[index] * 2)
+            if not stopping:
+                processes[index] = start(index)
+                started[index] = time.monotonic()
+    for process in processes.values():
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
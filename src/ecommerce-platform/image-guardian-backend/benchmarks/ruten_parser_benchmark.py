@@ -0,0 +1,195 @@
+"""
+露天解析效能測試 - 比較原本的整頁正則與 services.ruten_parser 的速度與正確性
+
+Usage (from image-guardian-backend/):
+    python -m benchmarks.ruten_parser_benchmark                  # 產生的測試頁面
+    python -m benchmarks.ruten_parser_benchmark saved_page.html  # 自行存下的露天頁面
+
+產生的頁面帶有正確答案，三種解析器都與答案比對；
+自行提供的頁面沒有答案，改以新解析器與正則的差異列出。
+"""
+import argparse
+import html as html_entities
+import os
+import random
+import re
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from services.ruten_parser import LexborHTML, RutenStreamParser, parse_ruten_html
+
+# 原本 PlatformCrawler._parse_ruten_search_html 的正則（對照組）
+LEGACY_PATTERN = r'data-gno="(\d+)".*?<img[^>]*src="([^"]+)".*?<a[^>]*href="([^"]+)"[^>]*>([^<]+)</a>.*?\$(\d+(?:,\d+)?)'
+
+Item = Tuple[str, str, float]  # (商品編號, 標題, 價格)
+
+
+def parse_legacy(html: str) -> List[Item]:
+    results = []
+    for item_id, _, _, title, price in re.findall(LEGACY_PATTERN, html, re.DOTALL):
+        results.append((item_id, html_entities.unescape(title).strip(), float(price.replace(",", ""))))
+    return results
+
+
+def parse_tree(html: str) -> List[Item]:
+    return [(item.item_id, item.title, item.price) for item in parse_ruten_html(html)]
+
+
+def parse_stream(html: str, chunk_size: int = 16 * 1024) -> List[Item]:
+    data = html.encode("utf-8")
+    parser = RutenStreamParser()
+    items = []
+    for offset in range(0, len(data), chunk_size):
+        items.extend(parser.feed(data[offset:offset + chunk_size]))
+    items.extend(parser.close())
+    return [(item.item_id, item.title, item.price) for item in items]
+
+
+def make_page(items: int, seed: int) -> Tuple[str, List[Item]]:
+    """
+    仿露天搜尋頁：每張卡片版面略有差異（延遲載入圖片、圖片連結在標題連結前、
+    千分位價格、HTML 實體、原價 / 特價），另夾雜沒有價格的廣告卡片
+    """
+    rng = random.Random(seed)
+    cards, expected = [], []
+
+    for i in range(items):
+        item_id = str(21000000000000 + seed * 1000 + i)
+        title = f"商品 {seed}-{i} 限量款 & 經典版"
+        price = rng.choice([99, 450, 1280, 23999])
+        price_text = f"{price:,}"
+        image = f"https://img.rimg.com.tw/s{i % 9}/{item_id}.jpg"
+
+        if rng.random() < 0.1:
+            # 廣告卡片：沒有價格，不是商品
+            cards.append(
+                f'<li class="rt-product-card" data-gno="{item_id}"><div class="ad">'
+                f'<img src="{image}"><a href="/ad/{i}">贊助商品</a></div></li>'
+            )
+            continue
+
+        img_attr = f'data-src="{image}" src=""' if rng.random() < 0.3 else f'src="{image}"'
+        original = f'<del class="rt-text-price-original">${price + 100:,}</del>' if rng.random() < 0.2 else ""
+        cards.append(
+            f'<li class="rt-product-card" data-gno="{item_id}">'
+            f'<div class="rt-product-card-img-wrap"><a href="https://www.ruten.com.tw/item/show?{item_id}">'
+            f'<img class="rt-product-card-img" {img_attr} alt="" loading="lazy"></a></div>'
+            f'<div class="rt-product-card-detail">'
+            f'<p class="rt-product-card-name"><a href="https://www.ruten.com.tw/item/show?{item_id}">'
+            f'{title.replace("&", "&amp;")}</a></p>'
+            f'<div class="rt-product-card-price-wrap">{original}'
+            f'<strong class="rt-text-price">${price_text}</strong></div>'
+            f'<div class="rt-product-card-seller"><span>賣家 seller{i % 13}</span>'
+            f'<span class="rt-text-isolated">已售 {rng.randint(0, 900)}</span></div>'
+            f'</div></li>'
+        )
+        expected.append((item_id, title, float(price)))
+
+    # 頁首、側欄、頁尾等與商品無關的內容
+    filler = "".join(
+        f'<div class="rt-filter-item"><a href="/s/?q=x&amp;sort={k}">篩選 {k}</a>'
+        f'<script>var conf{k} = {{"price": "$100"}};</script></div>'
+        for k in range(200)
+    )
+    html = (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>露天搜尋</title></head>'
+        f'<body><header>{filler}</header><ul class="rt-product-list">{"".join(cards)}</ul>'
+        f'<footer>客服 $ 說明 {filler}</footer></body></html>'
+    )
+    return html, expected
+
+
+def make_sold_out_page(items: int) -> str:
+    """
+    全部售完的賣場頁：卡片上沒有任何 $ 金額。
+    正則的三段 .*? 對每個 data-gno 都要掃到頁尾並層層回溯（約為卡片數的三次方）
+    """
+    cards = "".join(
+        f'<li class="rt-product-card" data-gno="{22000000000000 + i}">'
+        f'<a href="https://www.ruten.com.tw/item/show?{22000000000000 + i}">'
+        f'<img src="https://img.rimg.com.tw/s1/{i}.jpg"></a>'
+        f'<p><a href="https://www.ruten.com.tw/item/show?{22000000000000 + i}">售完商品 {i}</a></p>'
+        f'<strong class="rt-text-price">已售完</strong></li>'
+        for i in range(items)
+    )
+    return f'<html><body><ul class="rt-product-list">{cards}</ul></body></html>'
+
+
+def score(found: List[Item], expected: List[Item]) -> Tuple[int, int, int]:
+    """(正確, 錯誤, 遺漏)"""
+    found_set, expected_set = set(found), set(expected)
+    return len(found_set & expected_set), len(found_set - expected_set), len(expected_set - found_set)
+
+
+def bench(parser: Callable[[str], List[Item]], pages: List[str], repeat: int) -> float:
+    """每秒解析頁數"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            parser(html)
+    return repeat * len(pages) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", nargs="*", help="HTML 檔（預設：產生測試頁面）")
+    parser.add_argument("--count", type=int, default=20, help="產生的頁面數")
+    parser.add_argument("--items", type=int, default=60, help="每頁商品數")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sold-out-items", type=int, default=20,
+                        help="售完頁面的卡片數（0 = 不測；正則耗時隨卡片數三次方成長）")
+    args = parser.parse_args()
+
+    expected: Optional[List[List[Item]]] = None
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                pages.append(f.read())
+    else:
+        generated = [make_page(args.items, seed) for seed in range(args.count)]
+        pages = [html for html, _ in generated]
+        expected = [items for _, items in generated]
+        print(f"Generated {args.count} pages x {args.items} items "
+              f"({sum(len(p) for p in pages) / len(pages) / 1024:.0f} KB/page)")
+
+    parsers: Dict[str, Callable[[str], List[Item]]] = {
+        "regex": parse_legacy,
+        "selectolax" if LexborHTML is not None else "tree": parse_tree,
+        "stream": parse_stream,
+    }
+
+    print(f"{'parser':<12}{'pages/s':>10}{'items':>8}{'correct':>9}{'wrong':>7}{'missed':>8}")
+    legacy_found: List[Set[Item]] = []
+    for name, parse in parsers.items():
+        rate = bench(parse, pages, args.repeat)
+        found = [parse(html) for html in pages]
+        if name == "regex":
+            legacy_found = [set(items) for items in found]
+
+        # 沒有正確答案時以正則結果為基準
+        truth = expected if expected is not None else [list(base) for base in legacy_found]
+        totals = [score(f, t) for f, t in zip(found, truth)]
+        correct, wrong, missed = (sum(t[i] for t in totals) for i in range(3))
+
+        print(f"{name:<12}{rate:>10.1f}{sum(len(f) for f in found):>8}{correct:>9}{wrong:>7}{missed:>8}")
+
+    if args.sold_out_items:
+        page = make_sold_out_page(args.sold_out_items)
+        print(f"\nSold-out page ({args.sold_out_items} cards, no prices), one parse:")
+        for name, parse in parsers.items():
+            start = time.perf_counter()
+            items = parse(page)
+            print(f"{name:<12}{1000 * (time.perf_counter() - start):>10.1f} ms{len(items):>8} items")
+
+    if expected is None:
+        print("(no ground truth: correct / wrong / missed are relative to the regex parser)")
+
+
+if __name__ == "__main__":
+    main()
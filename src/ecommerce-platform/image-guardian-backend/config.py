@@ -35,18 +35,31 @@ IMAGE_CONFIG = {
 # 爬蟲配置
 CRAWLER_CONFIG = {
     "default_timeout": 30000,  # 30 秒
-    "max_retries": 3,
-    "delay_min": 1.0,  # 最小延遲（秒）
-    "delay_max": 3.0,  # 最大延遲（秒）
+    "max_retries": 3,       # 暫時性錯誤重試次數（指數退避 + jitter）
+    "retry_budget_ratio": 0.2,  # 每平台重試數上限（相對請求數）
+    "breaker_failures": 5,  # 連續失敗幾次後熔斷該平台
+    "breaker_reset": 30.0,  # 熔斷秒數
+    "rate_per_host": 2.0,   # 每個主機初始速率（次/秒），依 429/403 自動調整
+    "rate_burst": 4,        # 可連續送出的請求數
+    "rate_min": 0.2,        # 限流時的最低速率
+    "rate_max": 10.0,       # 回應正常時的最高速率
+    "image_cdn_variants": True,  # 預篩下載 CDN 縮圖版本（如蝦皮 _tn），原圖只在預篩通過後下載
     "headless": True,
     "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
 }
 
+# 指紋計算工作池配置（CPU 密集運算移出 event loop）
+EXECUTOR_CONFIG = {
+    "process_workers": int(os.getenv("FINGERPRINT_PROCESS_WORKERS", "2")),  # 0 = 使用執行緒池
+    "thread_workers": 2,
+}
+
 # 相似度配置
 SIMILARITY_CONFIG = {
     "phash_weight": 0.50,  # pHash 權重
     "orb_weight": 0.35,    # ORB 權重
     "color_weight": 0.15,  # 顏色直方圖權重
+    "orb_candidate_votes": 10,  # find-similar：pHash 差距過大但 ORB 索引票數達此值的指紋也列為候選（裁切、加框）
     "thresholds": {
         "exact": 95,       # 完全相同
         "high": 80,        # 高度相似
@@ -59,4 +72,9 @@ STORAGE_CONFIG = {
     "upload_dir": "uploads",
     "evidence_dir": "evidence",
     "temp_dir": "temp",
+    "fingerprint_cache_dir": os.getenv("FINGERPRINT_CACHE_DIR", "data/fingerprint_cache"),  # 空字串 = 停用
+    "fingerprint_cache_max_mb": int(os.getenv("FINGERPRINT_CACHE_MAX_MB", "512")),
+    "http_cache_dir": os.getenv("HTTP_CACHE_DIR", "data/http_cache"),  # 空字串 = 停用
+    "http_cache_max_mb": int(os.getenv("HTTP_CACHE_MAX_MB", "1024")),
+    "http_cache_search_ttl": float(os.getenv("HTTP_CACHE_SEARCH_TTL", "3600")),  # 搜尋結果有效秒數，-1 = 依回應標頭
 }
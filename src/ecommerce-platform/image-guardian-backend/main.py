@@ -11,6 +11,7 @@ AI 自動檢舉系統後端 API
 import os
 import io
 import uuid
+import asyncio
 from typing import List, Optional
 from datetime import datetime
 
@@ -21,10 +22,17 @@ from pydantic import BaseModel
 
 from config import (
     API_HOST, API_PORT, DEBUG, CORS_ORIGINS,
-    IMAGE_CONFIG, SIMILARITY_CONFIG
+    IMAGE_CONFIG, SIMILARITY_CONFIG, STORAGE_CONFIG, EXECUTOR_CONFIG, CRAWLER_CONFIG
 )
 from services.fingerprint import FingerprintService, ImageFingerprint, SimilarityResult
+from services.hash_index import HashIndex
+from services.compute_pool import ComputePool
+from services.orb_index import ORBIndex
 from services.crawler import PlatformCrawler, ProductListing
+from services.image_variants import ImageVariantPolicy
+from services.http_cache import configure_http_cache, get_http_cache, start_scan_cache_stats
+from services.rate_limit import configure_rate_limiter, get_rate_limiter
+from services.resilience import configure_resilience, get_resilience
 
 # Gemini Vision 服務（可選）
 gemini_service = None
@@ -64,20 +72,85 @@ app.add_middleware(
 )
 
 # 指紋服務實例
-fingerprint_service = FingerprintService(
+FINGERPRINT_SERVICE_KWARGS = dict(
     hash_size=IMAGE_CONFIG.get("hash_size", 8),
     orb_features=IMAGE_CONFIG.get("orb_features", 500),
     phash_weight=SIMILARITY_CONFIG.get("phash_weight", 0.50),
     orb_weight=SIMILARITY_CONFIG.get("orb_weight", 0.35),
     color_weight=SIMILARITY_CONFIG.get("color_weight", 0.15),
+    cache_dir=STORAGE_CONFIG.get("fingerprint_cache_dir") or None,
+    cache_max_mb=STORAGE_CONFIG.get("fingerprint_cache_max_mb", 512),
 )
+fingerprint_service = FingerprintService(**FINGERPRINT_SERVICE_KWARGS)
 
-# 爬蟲服務實例
+# 指紋計算工作池（compute_fingerprint 不在 event loop 上執行）
+compute_pool = ComputePool(
+    process_workers=EXECUTOR_CONFIG.get("process_workers", 2),
+    thread_workers=EXECUTOR_CONFIG.get("thread_workers", 2),
+    service_kwargs=FINGERPRINT_SERVICE_KWARGS,
+)
+
+
+@app.on_event("shutdown")
+async def shutdown_compute_pool():
+    compute_pool.shutdown(wait=False)
+
+# 爬蟲服務實例（所有爬取共用每主機限速器）
+configure_rate_limiter(
+    rate=CRAWLER_CONFIG.get("rate_per_host", 2.0),
+    burst=CRAWLER_CONFIG.get("rate_burst", 4),
+    min_rate=CRAWLER_CONFIG.get("rate_min", 0.2),
+    max_rate=CRAWLER_CONFIG.get("rate_max", 10.0),
+)
+configure_resilience(
+    max_retries=CRAWLER_CONFIG.get("max_retries", 3),
+    budget_ratio=CRAWLER_CONFIG.get("retry_budget_ratio", 0.2),
+    breaker_failures=CRAWLER_CONFIG.get("breaker_failures", 5),
+    breaker_reset=CRAWLER_CONFIG.get("breaker_reset", 30.0),
+)
+# 重複掃描相同關鍵字時以條件式 GET 重新驗證，不重新下載
+if STORAGE_CONFIG.get("http_cache_dir"):
+    _search_ttl = STORAGE_CONFIG.get("http_cache_search_ttl", 3600.0)
+    configure_http_cache(
+        STORAGE_CONFIG["http_cache_dir"],
+        STORAGE_CONFIG.get("http_cache_max_mb", 1024) * 1024 * 1024,
+        search_ttl=_search_ttl if _search_ttl >= 0 else None,
+    )
 platform_crawler = PlatformCrawler()
+image_variants = ImageVariantPolicy() if CRAWLER_CONFIG.get("image_cdn_variants", True) else None
 
 # 內存存儲（生產環境應使用 Supabase）
 fingerprints_db: dict = {}
 
+# pHash 近鄰索引（與 fingerprints_db 同步，僅存於記憶體：
+# fingerprints_db 重新啟動即清空，索引由它重建而不從磁碟載入，避免殘留已不存在的 ID）
+phash_index = HashIndex()
+phash_index.add_many((fp_id, data["fingerprint"].phash) for fp_id, data in fingerprints_db.items())
+
+
+# ORB 描述符一對多索引（與 fingerprints_db 同步，僅存於記憶體）
+orb_index = ORBIndex()
+
+
+def _sync_phash_index(fp_id: str, phash: Optional[str]):
+    """新增/移除索引項目"""
+    try:
+        if phash:
+            phash_index.add(fp_id, phash)
+        else:
+            phash_index.remove(fp_id)
+    except Exception as e:
+        print(f"⚠️ pHash 索引更新失敗: {e}")
+
+
+def _sync_indexes(fp_id: str, fingerprint: Optional[ImageFingerprint]):
+    """新增/移除指紋時同步 pHash 與 ORB 索引"""
+    _sync_phash_index(fp_id, fingerprint.phash if fingerprint else None)
+    if fingerprint:
+        orb_index.add(fp_id, fingerprint.orb_descriptors)
+    else:
+        orb_index.remove(fp_id)
+
 
 # ========== 數據模型 ==========
 
@@ -143,6 +216,23 @@ async def root():
     )
 
 
+@app.get("/health/executor")
+async def executor_metrics():
+    """指紋計算工作池佇列深度"""
+    return compute_pool.metrics()
+
+
+@app.get("/health/crawler")
+async def crawler_metrics():
+    """各主機目前爬取速率、限流次數、各平台熔斷狀態與 HTTP 快取命中率"""
+    http_cache = get_http_cache()
+    return {
+        "rate_limits": get_rate_limiter().metrics(),
+        "breakers": get_resilience().metrics(),
+        "http_cache": http_cache.metrics() if http_cache else None,
+    }
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """健康檢查"""
@@ -178,7 +268,7 @@ async def compute_fingerprint(
 
     try:
         # 計算指紋
-        fingerprint = fingerprint_service.compute_fingerprint(contents)
+        fingerprint = await compute_pool.compute_fingerprint(contents)
 
         # 生成 ID
         fp_id = asset_id or str(uuid.uuid4())
@@ -190,6 +280,7 @@ async def compute_fingerprint(
             "image_bytes": contents,  # 保存原圖供 AI 比對
             "created_at": datetime.now().isoformat()
         }
+        _sync_indexes(fp_id, fingerprint)
 
         return FingerprintResponse(
             id=fp_id,
@@ -234,6 +325,7 @@ async def delete_fingerprint(fingerprint_id: str):
         raise HTTPException(status_code=404, detail="Fingerprint not found")
 
     del fingerprints_db[fingerprint_id]
+    _sync_indexes(fingerprint_id, None)
     return {"message": "Fingerprint deleted successfully"}
 
 
@@ -275,7 +367,7 @@ async def compare_with_image(
 
     try:
         # 計算上傳圖片的指紋
-        fp_uploaded = fingerprint_service.compute_fingerprint(contents)
+        fp_uploaded = await compute_pool.compute_fingerprint(contents)
 
         # 與存儲的指紋比對
         fp_stored = fingerprints_db[fingerprint_id]["fingerprint"]
@@ -301,13 +393,22 @@ async def batch_compare(request: BatchCompareRequest):
     source_fp = fingerprints_db[request.source_fingerprint_id]["fingerprint"]
     results = []
 
-    for target_id in request.target_fingerprint_ids:
-        if target_id not in fingerprints_db:
-            continue
+    target_ids = [t for t in request.target_fingerprint_ids if t in fingerprints_db]
+    target_fps = [fingerprints_db[t]["fingerprint"] for t in target_ids]
+
+    # pHash 距離一次以陣列運算求得
+    phash_distances = fingerprint_service.phash_distances(
+        source_fp.phash,
+        [fp.phash for fp in target_fps]
+    )
 
-        target_fp = fingerprints_db[target_id]["fingerprint"]
-        comparison = fingerprint_service.compare(source_fp, target_fp)
+    # ORB 以兩兩 cross-check 比對評分（與 /compare 相同），在執行緒中跑完不阻塞事件迴圈
+    comparisons = await asyncio.to_thread(lambda: [
+        fingerprint_service.compare(source_fp, target_fp, phash_distance=distance)
+        for target_fp, distance in zip(target_fps, phash_distances)
+    ])
 
+    for target_id, comparison in zip(target_ids, comparisons):
         results.append(BatchCompareResult(
             target_id=target_id,
             similarity=CompareResponse(**comparison.to_dict()),
@@ -336,14 +437,43 @@ async def find_similar(
 
     try:
         # 計算上傳圖片的指紋
-        uploaded_fp = fingerprint_service.compute_fingerprint(contents)
+        uploaded_fp = await compute_pool.compute_fingerprint(contents)
 
-        # 與所有存儲的指紋比對
+        # 以 pHash 索引預篩候選，只對候選做完整比對
         matches = []
-        for fp_id, data in fingerprints_db.items():
-            stored_fp = data["fingerprint"]
-            result = fingerprint_service.compare(uploaded_fp, stored_fp)
+        candidates = dict(phash_index.radius_query(
+            uploaded_fp.phash,
+            fingerprint_service.max_phash_distance(threshold)
+        ))
+
+        # ORB 索引一次查詢補上 pHash 差距大、但特徵點大量相符的指紋（裁切、加框）；
+        # 票數只用來找候選，分數一律由兩兩比對計算
+        orb_votes = await asyncio.to_thread(orb_index.query, uploaded_fp.orb_descriptors)
+        min_votes = SIMILARITY_CONFIG.get("orb_candidate_votes", 10)
+        extra = [fp_id for fp_id, (votes, _) in orb_votes.items()
+                 if votes >= min_votes and fp_id not in candidates and fp_id in fingerprints_db]
+        if extra:
+            distances = fingerprint_service.phash_distances(
+                uploaded_fp.phash, [fingerprints_db[fp_id]["fingerprint"].phash for fp_id in extra]
+            )
+            candidates.update(zip(extra, distances))
+
+        stored = []
+        for fp_id, distance in candidates.items():
+            data = fingerprints_db.get(fp_id)
+            if data is None:
+                # 索引中殘留的過期項目
+                phash_index.remove(fp_id)
+                orb_index.remove(fp_id)
+                continue
+            stored.append((fp_id, data, distance))
+
+        results = await asyncio.to_thread(lambda: [
+            fingerprint_service.compare(uploaded_fp, data["fingerprint"], phash_distance=distance)
+            for _, data, distance in stored
+        ])
 
+        for (fp_id, data, _), result in zip(stored, results):
             if result.overall >= threshold:
                 matches.append({
                     "fingerprint_id": fp_id,
@@ -522,8 +652,8 @@ async def hybrid_compare(
         suspect_bytes = await suspect.read()
 
         # Step 1: pHash + ORB 初篩
-        fp_original = fingerprint_service.compute_fingerprint(original_bytes)
-        fp_suspect = fingerprint_service.compute_fingerprint(suspect_bytes)
+        fp_original = await compute_pool.compute_fingerprint(original_bytes)
+        fp_suspect = await compute_pool.compute_fingerprint(suspect_bytes)
         fingerprint_result = fingerprint_service.compare(fp_original, fp_suspect)
 
         response = {
@@ -676,8 +806,8 @@ async def full_scan(request: FullScanRequest):
     完整掃描流程（推薦）
 
     1. 使用關鍵字搜尋或爬取指定網址
-    2. 下載商品圖片
-    3. 計算指紋並與原創圖片比對
+    2. 下載商品圖片的 CDN 縮圖版本，以 pHash 預篩
+    3. 通過預篩的才下載原圖，計算完整指紋（含 ORB）並與原創圖片比對
     4. 可疑案例 (>=70%) 使用 AI 複查
     5. 回傳侵權商品列表（含購買網址）
 
@@ -693,6 +823,7 @@ async def full_scan(request: FullScanRequest):
         )
 
     original_fp = fingerprints_db[request.original_fingerprint_id]["fingerprint"]
+    cache_stats = start_scan_cache_stats()
 
     # 收集商品列表
     all_listings = []
@@ -720,11 +851,16 @@ async def full_scan(request: FullScanRequest):
     infringement_results = []
     scan_summary = {
         "total_scanned": 0,
+        "prefiltered_out": 0,
+        "image_bytes": 0,
         "fingerprint_matches": 0,
         "ai_verified": 0,
         "confirmed_infringements": 0
     }
 
+    # 縮圖與原圖的 pHash 可能差 1～2 bit，預篩多留一點餘裕
+    max_distance = fingerprint_service.max_phash_distance(request.similarity_threshold) + 2
+
     async with httpx.AsyncClient(timeout=30.0) as client:
         for listing in all_listings:
             if not listing.image_url:
@@ -733,15 +869,30 @@ async def full_scan(request: FullScanRequest):
             scan_summary["total_scanned"] += 1
 
             try:
-                # 下載圖片
-                img_response = await client.get(listing.image_url)
-                if img_response.status_code != 200:
+                # 預篩：縮圖版本只算 pHash / 顏色，pHash 距離過大的不可能達到門檻
+                full_url = image_variants.original(listing.image_url) if image_variants else listing.image_url
+                quick_url = (
+                    image_variants.select(full_url, fingerprint_service.histogram_decode_size)
+                    if image_variants else full_url
+                )
+                if quick_url != full_url:
+                    quick_bytes = await platform_crawler.download_image(client, quick_url)
+                    if quick_bytes is not None:
+                        scan_summary["image_bytes"] += len(quick_bytes)
+                        quick_fp = await compute_pool.compute_fingerprint(quick_bytes, include_orb=False)
+                        distance = fingerprint_service.phash_distances(original_fp.phash, [quick_fp.phash])[0]
+                        if distance > max_distance:
+                            scan_summary["prefiltered_out"] += 1
+                            continue
+
+                # 原圖：ORB 與 AI 複查需要全解析度
+                image_bytes = await platform_crawler.download_image(client, full_url)
+                if image_bytes is None:
                     continue
-
-                image_bytes = img_response.content
+                scan_summary["image_bytes"] += len(image_bytes)
 
                 # 計算指紋並比對
-                suspect_fp = fingerprint_service.compute_fingerprint(image_bytes)
+                suspect_fp = await compute_pool.compute_fingerprint(image_bytes)
                 comparison = fingerprint_service.compare(original_fp, suspect_fp)
 
                 # 如果相似度達標
@@ -790,6 +941,7 @@ async def full_scan(request: FullScanRequest):
     return {
         "success": True,
         "scan_summary": scan_summary,
+        "http_cache": cache_stats.to_dict(),
         "threshold": request.similarity_threshold,
         "ai_enabled": request.use_ai_verification and GEMINI_AVAILABLE,
         "infringement_results": infringement_results
@@ -3,9 +3,17 @@ Image Guardian 服務層
 """
 
 from .fingerprint import FingerprintService, ImageFingerprint, SimilarityResult
+from .hash_index import HashIndex
+from .compute_pool import ComputePool
+from .orb_index import ORBIndex
+from .fingerprint_cache import FingerprintCache
 
 __all__ = [
     "FingerprintService",
     "ImageFingerprint",
     "SimilarityResult",
+    "HashIndex",
+    "ComputePool",
+    "ORBIndex",
+    "FingerprintCache",
 ]
@@ -0,0 +1,107 @@
+"""
+指紋計算工作池 - 將 pHash / ORB / 直方圖計算移出 event loop
+
+imagehash 為純 Python + NumPy 運算會持有 GIL，放在執行緒中仍會卡住
+其他請求，因此預設使用 process pool；每個子行程在初始化時建立
+自己的 FingerprintService（cv2 物件無法跨行程傳遞）。
+
+使用方式：
+    from services.compute_pool import ComputePool
+
+    pool = ComputePool(process_workers=2, service_kwargs={...})
+    fingerprint = await pool.compute_fingerprint(image_bytes)
+"""
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from .fingerprint import FingerprintService, ImageFingerprint
+
+
+# 每個 worker 自己的指紋服務（由 _init_worker 建立）
+# 使用 threading.local：執行緒模式下 cv2 ORB 物件不可跨執行緒共用
+_worker = threading.local()
+
+
+def _init_worker(service_kwargs: dict):
+    _worker.service = FingerprintService(**service_kwargs)
+
+
+def _compute_fingerprint(image_bytes: bytes, include_orb: bool) -> ImageFingerprint:
+    return _worker.service.compute_fingerprint(image_bytes, include_orb=include_orb)
+
+
+class ComputePool:
+    """指紋計算工作池（附佇列深度統計）"""
+
+    def __init__(
+        self,
+        process_workers: int = 2,
+        thread_workers: int = 2,
+        service_kwargs: Optional[dict] = None
+    ):
+        """
+        Args:
+            process_workers: 子行程數量 (0 = 改用執行緒池)
+            thread_workers: process_workers 為 0 時的執行緒數量
+            service_kwargs: 傳給 FingerprintService 的參數
+        """
+        service_kwargs = service_kwargs or {}
+        self.mode = "process" if process_workers > 0 else "thread"
+        self.workers = process_workers if process_workers > 0 else thread_workers
+
+        if process_workers > 0:
+            # spawn：在執行 event loop 的行程中 fork 並不安全
+            self._pool: Executor = ProcessPoolExecutor(
+                max_workers=process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(service_kwargs,)
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=thread_workers,
+                thread_name_prefix="fingerprint",
+                initializer=_init_worker,
+                initargs=(service_kwargs,)
+            )
+
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.max_pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def compute_fingerprint(self, image_bytes: bytes, include_orb: bool = True) -> ImageFingerprint:
+        """在工作池中計算圖片指紋（include_orb=False 為快速縮小解碼模式）"""
+        future = self._pool.submit(_compute_fingerprint, image_bytes, include_orb)
+        with self._lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future):
+        with self._lock:
+            self.pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def metrics(self) -> dict:
+        """工作池大小與佇列深度"""
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -17,16 +17,32 @@ import re
 import json
 import asyncio
 import httpx
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Awaitable, Callable
 from dataclasses import dataclass, asdict
 from datetime import datetime
 from urllib.parse import urlparse, urlencode, quote
-import random
 
+try:
+    import orjson  # 比標準庫 json 快數倍
+except ImportError:
+    orjson = None
 
-@dataclass
+from .http_cache import get_http_cache
+from .rate_limit import get_rate_limiter
+from .resilience import get_resilience
+from .ruten_parser import parse_ruten_html
+
+
+def _json(response: httpx.Response) -> Any:
+    """解碼 JSON 回應（有 orjson 時使用 orjson）"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return json.loads(response.content)
+
+
+@dataclass(slots=True)
 class ProductListing:
-    """商品資訊"""
+    """商品資訊（slots：大量店舖商品不必各帶一個 __dict__）"""
     listing_id: str
     platform: str
     title: str
@@ -66,6 +82,101 @@ class PlatformCrawler:
         }
         self.timeout = 30.0
 
+    async def _get(self, client: httpx.AsyncClient, url: str, is_search: bool = False) -> httpx.Response:
+        """
+        GET 請求，依每主機共用限速器控制速率並回報限流狀態
+
+        暫時性錯誤（連線錯誤、429、5xx）以指數退避重試；
+        平台熔斷中時直接拋出 CircuitOpenError。
+        啟用 HTTP 快取時，有效的回應直接由磁碟提供，過期的以條件式 GET 重新驗證；
+        is_search 使用快取設定的搜尋結果有效期（取代回應標頭）
+        """
+        async def send(extra_headers: dict) -> httpx.Response:
+            async def attempt() -> httpx.Response:
+                limiter = get_rate_limiter()
+                await limiter.acquire(url)
+                response = await client.get(url, headers=extra_headers)
+                limiter.record(url, response.status_code, response.headers.get("Retry-After"))
+                return response
+
+            return await get_resilience().call(self._platform_of(url), attempt)
+
+        cache = get_http_cache()
+        if cache is None:
+            return await send({})
+        return await cache.fetch(url, send, cache.search_ttl if is_search else None)
+
+    async def download_image(self, client: httpx.AsyncClient, image_url: str) -> Optional[bytes]:
+        """下載商品圖片（經 HTTP 快取，重複掃描時以 ETag / Last-Modified 重新驗證）"""
+        async def send(extra_headers: dict) -> httpx.Response:
+            return await client.get(image_url, headers=extra_headers)
+
+        cache = get_http_cache()
+        response = await (cache.fetch(image_url, send) if cache is not None else send({}))
+        if response.status_code != 200:
+            return None
+        return response.content
+
+    @staticmethod
+    def _platform_of(url: str) -> str:
+        """熔斷器以平台為單位（同平台的不同主機共用）"""
+        domain = urlparse(url).netloc.lower()
+        for platform in ("shopee", "ruten", "yahoo"):
+            if platform in domain:
+                return platform
+        return domain
+
+    async def _fetch_pages(
+        self,
+        fetch_page: Callable[[int], Awaitable[List]],
+        max_pages: int,
+        page_size: int,
+        label: str
+    ) -> List[List]:
+        """
+        並行抓取已知偏移量的分頁
+
+        所有頁面同時送出（由每主機限速器控制速率），任一頁回傳不足一頁
+        或空白時取消之後的頁面；結果依頁碼順序回傳，失敗的頁面略過。
+
+        Args:
+            fetch_page: 頁碼 (從 0 開始) -> 該頁項目 的協程函式
+            max_pages: 最大頁數
+            page_size: 完整一頁的項目數
+            label: 錯誤訊息前綴
+        """
+        if max_pages <= 0:
+            return []
+
+        tasks = {asyncio.ensure_future(fetch_page(page)): page for page in range(max_pages)}
+        pages: List[Optional[List]] = [None] * max_pages
+        last = max_pages  # 頁碼 >= last 已超出結果範圍
+
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    page = tasks[task]
+                    if task.cancelled():
+                        continue
+                    if task.exception() is not None:
+                        if page < last:
+                            print(f"{label} (頁 {page}): {task.exception()}")
+                        continue
+
+                    pages[page] = task.result()
+                    if len(pages[page]) < page_size and page + 1 < last:
+                        last = page + 1
+                        for other in pending:
+                            if tasks[other] >= last:
+                                other.cancel()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return [items for items in pages[:last] if items is not None]
+
     # ==================== 蝦皮 (Shopee) ====================
 
     async def search_shopee(
@@ -88,52 +199,43 @@ class PlatformCrawler:
             商品列表
         """
         results = []
+        page_size = 60
 
         async with httpx.AsyncClient(headers=self.headers, timeout=self.timeout) as client:
-            for page in range(max_pages):
-                try:
-                    # 蝦皮搜尋 API
-                    params = {
-                        "keyword": keyword,
-                        "limit": 60,
-                        "newest": page * 60,
-                        "order": "relevancy",
-                        "page_type": "search",
-                        "scenario": "PAGE_GLOBAL_SEARCH",
-                        "version": 2
-                    }
-
-                    if price_min:
-                        params["price_min"] = price_min * 100000  # 蝦皮價格單位
-                    if price_max:
-                        params["price_max"] = price_max * 100000
-
-                    url = f"https://shopee.tw/api/v4/search/search_items?{urlencode(params)}"
-
-                    response = await client.get(url)
-
-                    if response.status_code != 200:
-                        print(f"蝦皮搜尋失敗: {response.status_code}")
-                        continue
-
-                    data = response.json()
-                    items = data.get("items", [])
+            async def fetch_page(page: int) -> list:
+                # 蝦皮搜尋 API
+                params = {
+                    "keyword": keyword,
+                    "limit": page_size,
+                    "newest": page * page_size,
+                    "order": "relevancy",
+                    "page_type": "search",
+                    "scenario": "PAGE_GLOBAL_SEARCH",
+                    "version": 2
+                }
+
+                if price_min:
+                    params["price_min"] = price_min * 100000  # 蝦皮價格單位
+                if price_max:
+                    params["price_max"] = price_max * 100000
+
+                url = f"https://shopee.tw/api/v4/search/search_items?{urlencode(params)}"
+
+                response = await self._get(client, url, is_search=True)
 
-                    if not items:
-                        break
+                if response.status_code != 200:
+                    raise RuntimeError(f"蝦皮搜尋失敗: {response.status_code}")
 
-                    for item in items:
-                        item_basic = item.get("item_basic", {})
-                        listing = self._parse_shopee_item(item_basic)
-                        if listing:
-                            results.append(listing)
+                return _json(response).get("items") or []
 
-                    # 避免請求過快
-                    await asyncio.sleep(random.uniform(1, 2))
+            pages = await self._fetch_pages(fetch_page, max_pages, page_size, "蝦皮搜尋錯誤")
 
-                except Exception as e:
-                    print(f"蝦皮搜尋錯誤 (頁 {page}): {e}")
-                    continue
+        crawled_at = datetime.now().isoformat()
+        for items in pages:
+            for item in items:
+                listing = self._parse_shopee_item(item.get("item_basic") or {}, crawled_at)
+                if listing:
+                    results.append(listing)
 
         return results
 
@@ -160,36 +262,28 @@ class PlatformCrawler:
             print(f"無法解析店舖 ID: {shop_url}")
             return results
 
-        async with httpx.AsyncClient(headers=self.headers, timeout=self.timeout) as client:
-            offset = 0
-            limit = 30
+        limit = 30
 
-            while len(results) < max_items:
-                try:
-                    url = f"https://shopee.tw/api/v4/shop/search_items?limit={limit}&offset={offset}&order=pop&shopid={shop_id}"
-
-                    response = await client.get(url)
-
-                    if response.status_code != 200:
-                        break
+        async with httpx.AsyncClient(headers=self.headers, timeout=self.timeout) as client:
+            async def fetch_page(page: int) -> list:
+                url = f"https://shopee.tw/api/v4/shop/search_items?limit={limit}&offset={page * limit}&order=pop&shopid={shop_id}"
 
-                    data = response.json()
-                    items = data.get("items", [])
+                response = await self._get(client, url)
 
-                    if not items:
-                        break
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}")
 
-                    for item in items:
-                        listing = self._parse_shopee_item(item)
-                        if listing:
-                            results.append(listing)
+                return _json(response).get("items") or []
 
-                    offset += limit
-                    await asyncio.sleep(random.uniform(0.5, 1))
+            max_pages = -(-max_items // limit)
+            pages = await self._fetch_pages(fetch_page, max_pages, limit, "蝦皮店舖爬取錯誤")
 
-                except Exception as e:
-                    print(f"蝦皮店舖爬取錯誤: {e}")
-                    break
+        crawled_at = datetime.now().isoformat()
+        for items in pages:
+            for item in items:
+                listing = self._parse_shopee_item(item, crawled_at)
+                if listing:
+                    results.append(listing)
 
         return results[:max_items]
 
@@ -213,13 +307,12 @@ class PlatformCrawler:
         async with httpx.AsyncClient(headers=self.headers, timeout=self.timeout) as client:
             try:
                 url = f"https://shopee.tw/api/v4/item/get?itemid={item_id}&shopid={shop_id}"
-                response = await client.get(url)
+                response = await self._get(client, url)
 
                 if response.status_code != 200:
                     return None
 
-                data = response.json()
-                item = data.get("data", {})
+                item = _json(response).get("data") or {}
 
                 return self._parse_shopee_item(item)
 
@@ -227,8 +320,8 @@ class PlatformCrawler:
                 print(f"蝦皮商品爬取錯誤: {e}")
                 return None
 
-    def _parse_shopee_item(self, item: dict) -> Optional[ProductListing]:
-        """解析蝦皮商品資料"""
+    def _parse_shopee_item(self, item: dict, crawled_at: Optional[str] = None) -> Optional[ProductListing]:
+        """解析蝦皮商品資料（只讀取用得到的欄位；crawled_at 由呼叫端每頁取一次）"""
         try:
             item_id = str(item.get("itemid", ""))
             shop_id = str(item.get("shopid", ""))
@@ -263,10 +356,10 @@ class PlatformCrawler:
                 seller_id=shop_id,
                 seller_url=f"https://shopee.tw/shop/{shop_id}",
                 sales_count=item.get("sold", 0) or item.get("historical_sold", 0),
-                rating=item.get("item_rating", {}).get("rating_star", 0),
+                rating=(item.get("item_rating") or {}).get("rating_star", 0),
                 review_count=item.get("cmt_count", 0),
                 location=item.get("shop_location", ""),
-                crawled_at=datetime.now().isoformat()
+                crawled_at=crawled_at or datetime.now().isoformat()
             )
 
         except Exception as e:
@@ -309,20 +402,15 @@ class PlatformCrawler:
                     # 露天搜尋頁面
                     url = f"https://find.ruten.com.tw/s/?q={quote(keyword)}&p={page}"
 
-                    response = await client.get(url)
+                    response = await self._get(client, url, is_search=True)
 
                     if response.status_code != 200:
                         continue
 
-                    # 解析 HTML (簡化版，實際需要更完整的解析)
-                    html = response.text
-
-                    # 使用正則提取商品資訊
-                    items = self._parse_ruten_search_html(html)
+                    # 依回應宣告的編碼解碼（未宣告時由 httpx 偵測），不假設 UTF-8
+                    items = self._parse_ruten_search_html(response.text)
                     results.extend(items)
 
-                    await asyncio.sleep(random.uniform(1, 2))
-
                 except Exception as e:
                     print(f"露天搜尋錯誤 (頁 {page}): {e}")
                     continue
@@ -359,7 +447,7 @@ class PlatformCrawler:
                 try:
                     url = f"https://class.ruten.com.tw/user/index00.php?s={seller_id}&p={page}"
 
-                    response = await client.get(url)
+                    response = await self._get(client, url)
 
                     if response.status_code != 200:
                         break
@@ -372,49 +460,35 @@ class PlatformCrawler:
                     results.extend(items)
                     page += 1
 
-                    await asyncio.sleep(random.uniform(0.5, 1))
-
                 except Exception as e:
                     print(f"露天店舖爬取錯誤: {e}")
                     break
 
         return results[:max_items]
 
-    def _parse_ruten_search_html(self, html: str) -> List[ProductListing]:
-        """解析露天搜尋結果 HTML"""
-        results = []
-
-        # 使用正則提取商品 (簡化版)
-        # 實際應使用 BeautifulSoup
-        pattern = r'data-gno="(\d+)".*?<img[^>]*src="([^"]+)".*?<a[^>]*href="([^"]+)"[^>]*>([^<]+)</a>.*?\$(\d+(?:,\d+)?)'
-
-        matches = re.findall(pattern, html, re.DOTALL)
-
-        for match in matches:
-            try:
-                item_id, image_url, url, title, price = match
-                price = float(price.replace(',', ''))
-
-                results.append(ProductListing(
-                    listing_id=item_id,
-                    platform="ruten",
-                    title=title.strip(),
-                    price=price,
-                    currency="TWD",
-                    url=f"https://www.ruten.com.tw/item/show?{item_id}",
-                    image_url=image_url,
-                    thumbnail_url=image_url,
-                    seller_name="",
-                    seller_id="",
-                    seller_url="",
-                    crawled_at=datetime.now().isoformat()
-                ))
-            except:
-                continue
+    def _parse_ruten_search_html(self, html) -> List[ProductListing]:
+        """解析露天搜尋結果 HTML（str 或 bytes，見 ruten_parser）"""
+        crawled_at = datetime.now().isoformat()
 
-        return results
+        return [
+            ProductListing(
+                listing_id=item.item_id,
+                platform="ruten",
+                title=item.title,
+                price=item.price,
+                currency="TWD",
+                url=f"https://www.ruten.com.tw/item/show?{item.item_id}",
+                image_url=item.image_url,
+                thumbnail_url=item.image_url,
+                seller_name="",
+                seller_id="",
+                seller_url="",
+                crawled_at=crawled_at
+            )
+            for item in parse_ruten_html(html)
+        ]
 
-    def _parse_ruten_shop_html(self, html: str, seller_id: str) -> List[ProductListing]:
+    def _parse_ruten_shop_html(self, html, seller_id: str) -> List[ProductListing]:
         """解析露天店舖頁面 HTML"""
         # 類似 search 的解析邏輯
         return self._parse_ruten_search_html(html)
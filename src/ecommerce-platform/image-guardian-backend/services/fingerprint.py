@@ -20,11 +20,14 @@ import cv2
 import imagehash
 import numpy as np
 from PIL import Image
-from typing import Optional, Tuple
+from typing import Optional, Tuple, List
 from dataclasses import dataclass, asdict
 import base64
+import hashlib
 import io
 
+from .fingerprint_cache import FingerprintCache
+
 
 @dataclass
 class ImageFingerprint:
@@ -75,6 +78,18 @@ class SimilarityResult:
         return asdict(self)
 
 
+def pack_phash(hex_hash: str, n_chars: int = 0) -> np.ndarray:
+    """將 hex pHash 打包為 uint64 words（左補 0 至 n_chars，預設 16 的倍數）"""
+    n_chars = n_chars or -(-len(hex_hash) // 16) * 16
+    return np.frombuffer(bytes.fromhex(hex_hash.rjust(n_chars, '0')), dtype='>u8').astype(np.uint64)
+
+
+def hamming_distances(query_words: np.ndarray, packed: np.ndarray) -> np.ndarray:
+    """一對多漢明距離：打包矩陣每列與 query_words 的 XOR + popcount"""
+    xor_bytes = (packed ^ query_words).view(np.uint8)
+    return np.unpackbits(xor_bytes, axis=1).sum(axis=1, dtype=np.int32)
+
+
 class FingerprintService:
     """圖片指紋服務"""
 
@@ -84,7 +99,9 @@ class FingerprintService:
         orb_features: int = 500,
         phash_weight: float = 0.50,
         orb_weight: float = 0.35,
-        color_weight: float = 0.15
+        color_weight: float = 0.15,
+        cache_dir: Optional[str] = None,
+        cache_max_mb: int = 512
     ):
         """
         初始化指紋服務
@@ -95,8 +112,14 @@ class FingerprintService:
             phash_weight: pHash 在綜合評分中的權重
             orb_weight: ORB 在綜合評分中的權重
             color_weight: 顏色直方圖在綜合評分中的權重
+            cache_dir: 指紋磁碟快取目錄（None 為停用）
+            cache_max_mb: 指紋磁碟快取容量上限 (MB)
         """
         self.hash_size = hash_size
+        self.orb_features = orb_features
+        # 快速解碼的最小邊長：pHash 縮放前留 2 倍餘裕；正規化直方圖縮小後幾乎不變
+        self.phash_decode_size = hash_size * 4 * 2
+        self.histogram_decode_size = 256
         self.orb = cv2.ORB_create(nfeatures=orb_features)
         self.phash_weight = phash_weight
         self.orb_weight = orb_weight
@@ -105,51 +128,74 @@ class FingerprintService:
         # 特徵匹配器
         self.bf_matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
 
-    def compute_fingerprint(self, image_source) -> ImageFingerprint:
+        # 以圖片 SHA-256 為鍵的磁碟快取（參數只用字串/數字，可傳給工作行程）
+        self.cache = FingerprintCache(cache_dir, cache_max_mb * 1024 * 1024) if cache_dir else None
+
+    def compute_fingerprint(self, image_source, include_orb: bool = True) -> ImageFingerprint:
         """
         計算圖片指紋
 
         Args:
             image_source: 圖片路徑 (str) 或 PIL Image 或 bytes
+            include_orb: False 時只計算 pHash + 顏色直方圖（快速模式），
+                         JPEG 直接在 DCT 域縮小解碼，省下全尺寸解碼的時間與記憶體
 
         Returns:
             ImageFingerprint 對象
         """
+        # 路徑與 bytes 先查磁碟快取，命中時完全不解碼
+        digest = None
+        if self.cache is not None and isinstance(image_source, (str, bytes)):
+            if isinstance(image_source, str):
+                with open(image_source, "rb") as f:
+                    image_source = f.read()
+            digest = hashlib.sha256(image_source).hexdigest()
+            cached = self._load_cached(digest, include_orb)
+            if cached is not None:
+                return cached
+
         # 載入圖片
+        # pHash 只需要 (hash_size*4)^2 的灰階圖，PIL 以 draft 縮小解碼即可
         if isinstance(image_source, str):
             pil_image = Image.open(image_source)
-            cv_image = cv2.imread(image_source)
+            width, height = pil_image.size
+            cv_image = cv2.imread(image_source, self._cv_read_flag(pil_image.size, include_orb))
         elif isinstance(image_source, bytes):
             pil_image = Image.open(io.BytesIO(image_source))
+            width, height = pil_image.size
             nparr = np.frombuffer(image_source, np.uint8)
-            cv_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            cv_image = cv2.imdecode(nparr, self._cv_read_flag(pil_image.size, include_orb))
         elif isinstance(image_source, Image.Image):
             pil_image = image_source
-            cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+            width, height = pil_image.size
+            cv_image = cv2.cvtColor(np.array(pil_image.convert("RGB")), cv2.COLOR_RGB2BGR)
         else:
             raise ValueError(f"Unsupported image source type: {type(image_source)}")
 
+        if cv_image is None:
+            raise ValueError("Failed to decode image")
+
         # 1. 計算 pHash
+        if pil_image is not image_source:
+            pil_image.draft("RGB", (self.phash_decode_size, self.phash_decode_size))
         phash = str(imagehash.phash(pil_image, hash_size=self.hash_size))
 
-        # 2. 計算 ORB 特徵
-        gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-        keypoints, descriptors = self.orb.detectAndCompute(gray, None)
-
+        # 2. 計算 ORB 特徵（需要全解析度）
         orb_bytes = None
         feature_count = 0
-        if descriptors is not None:
-            orb_bytes = descriptors.tobytes()
-            feature_count = len(keypoints)
+        if include_orb:
+            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+            keypoints, descriptors = self.orb.detectAndCompute(gray, None)
+
+            if descriptors is not None:
+                orb_bytes = descriptors.tobytes()
+                feature_count = len(keypoints)
 
         # 3. 計算顏色直方圖
         color_hist = self._compute_color_histogram(cv_image)
         color_bytes = color_hist.tobytes()
 
-        # 獲取尺寸
-        height, width = cv_image.shape[:2]
-
-        return ImageFingerprint(
+        fingerprint = ImageFingerprint(
             phash=phash,
             orb_descriptors=orb_bytes,
             color_histogram=color_bytes,
@@ -157,20 +203,113 @@ class FingerprintService:
             width=width,
             height=height
         )
+        if digest is not None:
+            self._store_cached(digest, fingerprint, include_orb)
+        return fingerprint
+
+    def _cache_tags(self, include_orb: bool) -> dict:
+        """
+        快取特徵標籤（含影響結果的演算法參數與解碼方式）
 
-    def compare(self, fp1: ImageFingerprint, fp2: ImageFingerprint) -> SimilarityResult:
+        快速模式以 IMREAD_REDUCED_* 縮小解碼（倍率由原圖尺寸與 histogram_decode_size 決定），
+        直方圖與全尺寸解碼的結果不同，兩種解碼各自快取
+        """
+        decode = "full" if include_orb else f"reduced{self.histogram_decode_size}"
+        return {
+            "phash": f"phash-{self.hash_size}-draft{self.phash_decode_size}",
+            "orb": f"orb-{self.orb_features}",
+            "hist": f"hist-50x60-{decode}",
+            "meta": "meta",
+        }
+
+    def _load_cached(self, digest: str, include_orb: bool) -> Optional[ImageFingerprint]:
+        """從磁碟快取組出指紋；任一所需特徵未命中時回傳 None"""
+        tags = self._cache_tags(include_orb)
+        phash_words = self.cache.get(digest, tags["phash"])
+        histogram = self.cache.get(digest, tags["hist"])
+        meta = self.cache.get(digest, tags["meta"])
+        if phash_words is None or histogram is None or meta is None:
+            return None
+
+        orb_bytes = None
+        feature_count = 0
+        if include_orb:
+            descriptors = self.cache.get(digest, tags["orb"])
+            if descriptors is None:
+                return None
+            if len(descriptors):
+                orb_bytes = descriptors.tobytes()
+                feature_count = len(descriptors)
+
+        return ImageFingerprint(
+            phash=phash_words.tobytes().hex()[-(self.hash_size ** 2 // 4):],
+            orb_descriptors=orb_bytes,
+            color_histogram=histogram.tobytes(),
+            feature_count=feature_count,
+            width=int(meta[0]),
+            height=int(meta[1])
+        )
+
+    def _store_cached(self, digest: str, fingerprint: ImageFingerprint, include_orb: bool):
+        """寫入磁碟快取：pHash 存為 uint64 words，ORB 為 (N, 32) uint8，直方圖為 float32"""
+        tags = self._cache_tags(include_orb)
+        n_chars = -(-len(fingerprint.phash) // 16) * 16
+        self.cache.put(
+            digest, tags["phash"],
+            np.frombuffer(bytes.fromhex(fingerprint.phash.rjust(n_chars, "0")), dtype=">u8")
+        )
+        self.cache.put(digest, tags["hist"], np.frombuffer(fingerprint.color_histogram, dtype=np.float32))
+        self.cache.put(digest, tags["meta"], np.array([fingerprint.width, fingerprint.height], dtype=np.int32))
+        if include_orb:
+            descriptors = (
+                np.frombuffer(fingerprint.orb_descriptors, dtype=np.uint8).reshape(-1, 32)
+                if fingerprint.orb_descriptors else np.empty((0, 32), dtype=np.uint8)
+            )
+            self.cache.put(digest, tags["orb"], descriptors)
+
+    def _cv_read_flag(self, size: Tuple[int, int], include_orb: bool) -> int:
+        """
+        OpenCV 解碼旗標：不需要 ORB 時以 IMREAD_REDUCED_* 縮小 1/2、1/4、1/8 解碼
+        （縮小後短邊仍 >= histogram_decode_size）
+        """
+        if include_orb:
+            return cv2.IMREAD_COLOR
+
+        scale = min(size) // self.histogram_decode_size
+        for factor, flag in (
+            (8, cv2.IMREAD_REDUCED_COLOR_8),
+            (4, cv2.IMREAD_REDUCED_COLOR_4),
+            (2, cv2.IMREAD_REDUCED_COLOR_2),
+        ):
+            if scale >= factor:
+                return flag
+        return cv2.IMREAD_COLOR
+
+    def compare(
+        self,
+        fp1: ImageFingerprint,
+        fp2: ImageFingerprint,
+        phash_distance: Optional[int] = None
+    ) -> SimilarityResult:
         """
         比對兩個圖片指紋的相似度
 
+        所有端點（compare、batch-compare、find-similar、hybrid）的 ORB 分數
+        都由兩兩 cross-check BFMatcher（_compare_orb）計算；ORBIndex 的投票
+        只用來找候選，不換算成分數。
+
         Args:
             fp1: 第一個圖片指紋
             fp2: 第二個圖片指紋
+            phash_distance: 已由 phash_distances() 批次算好的漢明距離 (可選)
 
         Returns:
             SimilarityResult 相似度結果
         """
         # 1. pHash 比對 (漢明距離)
-        phash_distance = self._hamming_distance(fp1.phash, fp2.phash)
+        if phash_distance is None:
+            phash_distance = self._hamming_distance(fp1.phash, fp2.phash)
+        phash_distance = int(phash_distance)
         phash_score = max(0, 100 - (phash_distance * 100 / 64))
 
         # 2. ORB 比對 (特徵點匹配)
@@ -210,9 +349,47 @@ class FingerprintService:
             level=level
         )
 
+    def max_phash_distance(self, threshold: float) -> int:
+        """
+        綜合分數可能達到 threshold 的最大 pHash 漢明距離
+
+        ORB 與顏色分數最多各 100 分，因此 pHash 分數至少需要
+        (threshold - 其他權重 * 100) / phash_weight，用於索引預篩
+        """
+        other_max = (self.orb_weight + self.color_weight) * 100
+        min_phash_score = (threshold - other_max) / self.phash_weight if self.phash_weight > 0 else 0
+        if min_phash_score <= 0:
+            return 64
+
+        return max(0, int((100 - min_phash_score) * 64 / 100))
+
     def _hamming_distance(self, hash1: str, hash2: str) -> int:
         """計算兩個 hex 字串的漢明距離"""
-        return bin(int(hash1, 16) ^ int(hash2, 16)).count('1')
+        return (int(hash1, 16) ^ int(hash2, 16)).bit_count()
+
+    def phash_distances(self, query: str, phashes: List[str]) -> np.ndarray:
+        """
+        一對多 pHash 漢明距離
+
+        將雜湊打包成 uint64 矩陣，以一次 XOR + popcount 陣列運算
+        取代逐筆解析 hex 字串
+
+        Args:
+            query: 查詢的 pHash (hex)
+            phashes: 要比對的 pHash 列表 (hex，長度需與 query 相同)
+
+        Returns:
+            與 phashes 對應的漢明距離陣列
+        """
+        if not phashes:
+            return np.empty(0, dtype=np.int32)
+
+        n_chars = -(-len(query) // 16) * 16
+        packed = np.frombuffer(
+            b''.join(bytes.fromhex(h.rjust(n_chars, '0')) for h in phashes),
+            dtype='>u8'
+        ).astype(np.uint64).reshape(len(phashes), -1)
+        return hamming_distances(pack_phash(query, n_chars), packed)
 
     def _compare_orb(self, desc1_bytes: bytes, desc2_bytes: bytes) -> Tuple[float, int]:
         """
@@ -240,21 +417,26 @@ class FingerprintService:
             distances = [m.distance for m in matches]
             avg_distance = np.mean(distances)
 
-            # 轉換為 0-100 分數
-            # 距離 0 = 100分，距離 256 = 0分
-            score = max(0, 100 - (avg_distance / 2.56))
-
-            # 根據匹配點數量調整分數
-            # 匹配點越多越可靠
-            match_ratio = min(len(matches) / 50, 1.0)  # 50 個匹配點視為完美
-            adjusted_score = score * (0.5 + 0.5 * match_ratio)
-
-            return adjusted_score, len(matches)
+            return self._orb_score(len(matches), avg_distance), len(matches)
 
         except Exception as e:
             print(f"ORB comparison error: {e}")
             return 0.0, 0
 
+    def _orb_score(self, match_count: int, avg_distance: float) -> float:
+        """cross-check 匹配點數與平均距離 → 0-100 分數"""
+        if match_count == 0:
+            return 0.0
+
+        # 轉換為 0-100 分數
+        # 距離 0 = 100分，距離 256 = 0分
+        score = max(0, 100 - (avg_distance / 2.56))
+
+        # 根據匹配點數量調整分數
+        # 匹配點越多越可靠
+        match_ratio = min(match_count / 50, 1.0)  # 50 個匹配點視為完美
+        return score * (0.5 + 0.5 * match_ratio)
+
     def _compute_color_histogram(self, image: np.ndarray) -> np.ndarray:
         """
         計算顏色直方圖
@@ -0,0 +1,108 @@
+"""
+指紋磁碟快取 - 以圖片內容 SHA-256 + 演算法參數為鍵
+
+同一張圖（重新上架的商品、重複上傳的素材）不再重新解碼與計算特徵。
+每個特徵存成獨立的 .npy 檔，讀取時 memory-map：
+    <dir>/<sha[:2]>/<sha>.<特徵標籤>.npy
+特徵標籤含演算法參數（例如 phash-8、orb-500、hist-50x60），參數變更時自然失效。
+
+使用方式：
+    cache = FingerprintCache("data/fingerprint_cache", max_bytes=512 * 1024 * 1024)
+    cache.put(digest, "orb-500", descriptors)
+    descriptors = cache.get(digest, "orb-500")   # 未命中時為 None
+"""
+import os
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class FingerprintCache:
+    """
+    內容定址、有容量上限的磁碟特徵快取
+
+    - 寫入為原子操作（暫存檔 + rename），多個工作行程可共用同一目錄
+    - 超過 max_bytes 時依 mtime 淘汰最久未使用的檔案（命中時會更新 mtime）
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._written = 0  # 上次檢查容量後寫入的位元組數
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest: str, feature: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.{feature}.npy")
+
+    def get(self, digest: str, feature: str) -> Optional[np.ndarray]:
+        """取得快取的特徵陣列（唯讀 memory-map），未命中時回傳 None"""
+        path = self._path(digest, feature)
+        try:
+            array = np.load(path, mmap_mode="r")
+            os.utime(path)  # LRU 記錄
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return array
+
+    def put(self, digest: str, feature: str, array: np.ndarray):
+        """寫入特徵陣列"""
+        path = self._path(digest, feature)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"指紋快取寫入失敗: {e}")
+            return
+
+        with self._lock:
+            self._written += size
+            check = self._written > self.max_bytes // 20
+            if check:
+                self._written = 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """淘汰最久未使用的檔案，直到總容量低於 max_bytes 的 90%"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".npy"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "max_bytes": self.max_bytes}
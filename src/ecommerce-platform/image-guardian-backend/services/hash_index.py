@@ -0,0 +1,235 @@
+"""
+感知雜湊近鄰索引 - BK-tree + 打包矩陣
+
+find-similar 不再逐筆比對 fingerprints_db 中的每個指紋，
+先以 pHash 漢明距離篩出候選，再對候選做完整比對
+
+索引只在記憶體中，與 fingerprints_db 同步（啟動時由 fingerprints_db 重建）；
+打包與漢明距離沿用 fingerprint.pack_phash / hamming_distances
+
+使用方式：
+    index = HashIndex()
+    index.add("fp-1", "8f373714acfcf4d0")
+    index.radius_query("8f373714acfcf4d1", max_distance=10)
+    index.top_k("8f373714acfcf4d1", k=5)
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .fingerprint import hamming_distances, pack_phash
+
+
+class _BKNode:
+    """BK-tree node: one distinct hash value and the keys that share it"""
+
+    __slots__ = ('value', 'keys', 'children')
+
+    def __init__(self, value: int):
+        self.value = value
+        self.keys: set = set()
+        self.children: Dict[int, '_BKNode'] = {}
+
+
+class HashIndex:
+    """
+    Nearest-neighbour index over perceptual hashes (Hamming distance)
+
+    - 小半徑查詢走 BK-tree（三角不等式剪枝）
+    - 大半徑查詢與 top_k 走打包 uint64 矩陣的向量化掃描
+      （半徑接近雜湊長度一半時，任何度量樹都無法有效剪枝）
+    - remove 在樹上做墓碑標記，墓碑過多時自動重建
+    """
+
+    def __init__(self, tree_radius_ratio: float = 0.15):
+        """
+        Args:
+            tree_radius_ratio: Use the BK-tree when max_distance <= bits * ratio
+        """
+        self.tree_radius_ratio = tree_radius_ratio
+        self.clear()
+
+    def clear(self):
+        """Remove all entries"""
+        self.bits: Optional[int] = None
+
+        self._hashes: Dict[str, str] = {}       # key -> hex hash
+        self._root: Optional[_BKNode] = None
+        self._nodes: Dict[int, _BKNode] = {}    # hash value -> node
+        self._tombstones = 0
+
+        # Packed matrix for vectorized scans
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._packed_storage = np.empty((0, 0), dtype=np.uint64)
+        self._packed = self._packed_storage
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._hashes
+
+    def get(self, key: str) -> Optional[str]:
+        return self._hashes.get(key)
+
+    def add(self, key: str, hex_hash: str):
+        """Add or replace the hash stored under key"""
+        if not hex_hash:
+            return
+
+        bits = len(hex_hash) * 4
+        if self.bits is None:
+            self.bits = bits
+        elif bits != self.bits:
+            raise ValueError(f"Hash size {bits} does not match index size {self.bits}")
+
+        if key in self._hashes:
+            self.remove(key)
+
+        self._hashes[key] = hex_hash
+        self._tree_insert(key, int(hex_hash, 16))
+        self._matrix_append(key, pack_phash(hex_hash))
+
+    def remove(self, key: str) -> bool:
+        """Remove key; returns False if it was not indexed"""
+        hex_hash = self._hashes.pop(key, None)
+        if hex_hash is None:
+            return False
+
+        node = self._nodes.get(int(hex_hash, 16))
+        if node is not None:
+            node.keys.discard(key)
+            if not node.keys:
+                self._tombstones += 1
+
+        self._matrix_remove(key)
+
+        if not self._hashes:
+            self.clear()
+        elif self._tombstones > len(self._nodes) // 2:
+            self._rebuild_tree()
+        return True
+
+    def radius_query(self, hex_hash: str, max_distance: int) -> List[Tuple[str, int]]:
+        """
+        All keys within max_distance of hex_hash
+
+        Returns:
+            List of (key, distance), nearest first
+        """
+        if not self._hashes:
+            return []
+
+        if max_distance <= self.bits * self.tree_radius_ratio:
+            results = self._tree_query(int(hex_hash, 16), max_distance)
+        else:
+            distances = hamming_distances(pack_phash(hex_hash), self._packed)
+            rows = np.nonzero(distances <= max_distance)[0]
+            results = [(self._keys[r], int(distances[r])) for r in rows]
+
+        results.sort(key=lambda x: x[1])
+        return results
+
+    def top_k(self, hex_hash: str, k: int) -> List[Tuple[str, int]]:
+        """
+        The k nearest keys to hex_hash
+
+        Returns:
+            List of (key, distance), nearest first
+        """
+        if not self._hashes or k <= 0:
+            return []
+
+        distances = hamming_distances(pack_phash(hex_hash), self._packed)
+        if k < len(distances):
+            rows = np.argpartition(distances, k)[:k]
+        else:
+            rows = np.arange(len(distances))
+
+        rows = rows[np.argsort(distances[rows], kind='stable')]
+        return [(self._keys[r], int(distances[r])) for r in rows]
+
+    # ==================== Bulk ====================
+
+    def add_many(self, items: Iterable[Tuple[str, str]]):
+        for key, hex_hash in items:
+            self.add(key, hex_hash)
+
+    # ==================== BK-tree ====================
+
+    def _tree_insert(self, key: str, value: int):
+        node = self._nodes.get(value)
+        if node is not None:
+            if not node.keys:
+                self._tombstones -= 1
+            node.keys.add(key)
+            return
+
+        new_node = _BKNode(value)
+        new_node.keys.add(key)
+        self._nodes[value] = new_node
+
+        if self._root is None:
+            self._root = new_node
+            return
+
+        current = self._root
+        while True:
+            distance = (current.value ^ value).bit_count()
+            child = current.children.get(distance)
+            if child is None:
+                current.children[distance] = new_node
+                return
+            current = child
+
+    def _tree_query(self, value: int, max_distance: int) -> List[Tuple[str, int]]:
+        results = []
+        stack = [self._root] if self._root is not None else []
+
+        while stack:
+            node = stack.pop()
+            distance = (node.value ^ value).bit_count()
+            if distance <= max_distance:
+                results.extend((key, distance) for key in node.keys)
+
+            low, high = distance - max_distance, distance + max_distance
+            for child_distance, child in node.children.items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+
+        return results
+
+    def _rebuild_tree(self):
+        self._root = None
+        self._nodes = {}
+        self._tombstones = 0
+        for key, hex_hash in self._hashes.items():
+            self._tree_insert(key, int(hex_hash, 16))
+
+    # ==================== Packed matrix ====================
+
+    def _matrix_append(self, key: str, words: np.ndarray):
+        n = len(self._keys)
+        if self._packed_storage.shape[0] <= n:
+            capacity = max(64, self._packed_storage.shape[0] * 2)
+            grown = np.zeros((capacity, len(words)), dtype=np.uint64)
+            if n:
+                grown[:n] = self._packed_storage[:n]
+            self._packed_storage = grown
+        self._packed_storage[n] = words
+        self._keys.append(key)
+        self._rows[key] = n
+        self._packed = self._packed_storage[:n + 1]
+
+    def _matrix_remove(self, key: str):
+        row = self._rows.pop(key)
+        last = len(self._keys) - 1
+        if row != last:
+            # Swap-remove: move the last row into the freed slot
+            moved_key = self._keys[last]
+            self._packed_storage[row] = self._packed_storage[last]
+            self._keys[row] = moved_key
+            self._rows[moved_key] = row
+        self._keys.pop()
+        self._packed = self._packed_storage[:last]
@@ -0,0 +1,313 @@
+"""
+爬蟲 HTTP 磁碟快取 - 週期性掃描同一批關鍵字時，搜尋結果與縮圖不必每次重新下載
+
+- 遵守 Cache-Control（no-store / no-cache / max-age）與 Expires
+- 儲存 ETag / Last-Modified，過期後以條件式 GET 重新驗證（304 時沿用快取內容）
+- 搜尋結果可設定 TTL 覆寫（平台 API 通常回傳 no-cache）
+- 超過容量上限時依 mtime 淘汰最久未使用的項目
+- 命中率同時記錄全域與每次掃描（start_scan_cache_stats()）
+
+使用方式：
+    cache = configure_http_cache("data/http_cache", max_bytes=1024 * 1024 * 1024)
+    response = await cache.fetch(url, send)   # send(額外標頭) -> httpx.Response
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+# 隨快取內容保存的回應標頭
+STORED_HEADERS = ('content-type', 'etag', 'last-modified', 'cache-control')
+
+
+@dataclass
+class CacheStats:
+    """快取結果計數"""
+    hits: int = 0          # 直接由磁碟提供，未發出請求
+    revalidated: int = 0   # 條件式 GET 回應 304
+    misses: int = 0        # 完整下載
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.revalidated + self.misses
+        return (self.hits + self.revalidated) / total if total else 0.0
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), 'hit_ratio': round(self.hit_ratio, 3)}
+
+
+@dataclass
+class CachedResponse:
+    """快取中的 200 回應"""
+    url: str
+    body: bytes
+    headers: Dict[str, str]
+    expires_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """條件式 GET 的驗證標頭"""
+        headers = {}
+        if self.headers.get('etag'):
+            headers['If-None-Match'] = self.headers['etag']
+        if self.headers.get('last-modified'):
+            headers['If-Modified-Since'] = self.headers['last-modified']
+        return headers
+
+    def to_response(self) -> httpx.Response:
+        """由快取內容重建 200 回應"""
+        return httpx.Response(
+            200, headers=self.headers, content=self.body, request=httpx.Request('GET', self.url)
+        )
+
+
+# 每次掃描的計數：每個 API 請求有各自的 context，掃描中建立的 task 會繼承
+_scan_stats: contextvars.ContextVar[Optional[CacheStats]] = contextvars.ContextVar(
+    'http_cache_scan_stats', default=None
+)
+
+
+def start_scan_cache_stats() -> CacheStats:
+    """開始統計目前 context（本次掃描請求）的快取命中率"""
+    stats = CacheStats()
+    _scan_stats.set(stats)
+    return stats
+
+
+def _freshness(headers: Dict[str, str], ttl_override: Optional[float]) -> Optional[float]:
+    """回應可不經重新驗證直接使用的秒數；None = 不可儲存"""
+    directives = {}
+    for part in headers.get('cache-control', '').lower().split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name] = value.strip('"')
+
+    if 'no-store' in directives:
+        return None
+    if ttl_override is not None:
+        return ttl_override
+    if 'no-cache' in directives:
+        return 0.0
+    if directives.get('max-age', '').isdigit():
+        return float(directives['max-age'])
+    if headers.get('expires'):
+        try:
+            return max(0.0, parsedate_to_datetime(headers['expires']).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 0.0
+    return 0.0
+
+
+class HTTPCache:
+    """
+    以完整網址為鍵的 GET 回應磁碟快取
+
+    每個項目為 <sha256(url)>.body 加上記錄標頭與到期時間的 .json 檔；
+    過期但帶有 ETag / Last-Modified 的項目保留下來供重新驗證。
+    寫入為原子操作（暫存檔 + rename）。
+    fetch() 的磁碟讀寫在執行緒中進行，超過容量時的淘汰在背景執行緒執行，不阻塞事件迴圈。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 1024 * 1024 * 1024,
+        search_ttl: Optional[float] = 3600.0
+    ):
+        """
+        Args:
+            directory: 快取目錄
+            max_bytes: 容量上限，超過時淘汰最久未使用的項目
+            search_ttl: 搜尋結果的有效秒數覆寫（None = 依回應標頭）
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.search_ttl = search_ttl
+        self.stats = CacheStats()
+
+        self._lock = threading.Lock()
+        self._written = 0
+        self._evicting = False
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return f"{base}.body", f"{base}.json"
+
+    def lookup(self, url: str) -> Optional[CachedResponse]:
+        """取得網址的快取回應（有效或可重新驗證），未命中時回傳 None"""
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+            os.utime(meta_path)  # LRU 記錄
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('url') != url:
+            return None
+        return CachedResponse(url, body, meta['headers'], meta['expires_at'])
+
+    def store(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        body: bytes,
+        ttl_override: Optional[float] = None
+    ) -> bool:
+        """標頭允許時儲存 200 回應"""
+        headers = {k.lower(): v for k, v in headers.items()}
+        freshness = _freshness(headers, ttl_override)
+        if freshness is None:
+            return False
+        if freshness <= 0 and not (headers.get('etag') or headers.get('last-modified')):
+            return False  # 既無有效期也無法重新驗證
+
+        kept = {name: headers[name] for name in STORED_HEADERS if name in headers}
+        meta = {'url': url, 'headers': kept, 'expires_at': time.time() + freshness}
+
+        body_path, meta_path = self._paths(url)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            with open(body_path + suffix, 'wb') as f:
+                f.write(body)
+            with open(meta_path + suffix, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(body_path + suffix, body_path)
+            os.replace(meta_path + suffix, meta_path)
+        except OSError as e:
+            print(f"HTTP 快取寫入失敗: {e}")
+            return False
+
+        with self._lock:
+            self._written += len(body)
+            check = self._written > self.max_bytes // 20 and not self._evicting
+            if check:
+                self._written = 0
+                self._evicting = True
+        if check:
+            threading.Thread(target=self._evict_in_background, name='http-cache-evict', daemon=True).start()
+        return True
+
+    def _evict_in_background(self):
+        try:
+            self.evict()
+        except Exception as e:
+            print(f"HTTP 快取淘汰失敗: {e}")
+        finally:
+            with self._lock:
+                self._evicting = False
+
+    def refresh(self, entry: CachedResponse, headers: Dict[str, str], ttl_override: Optional[float] = None):
+        """304 重新驗證成功：依新標頭延長有效期"""
+        merged = {**entry.headers, **{k.lower(): v for k, v in headers.items()}}
+        self.store(entry.url, merged, entry.body, ttl_override)
+
+    async def fetch(
+        self,
+        url: str,
+        send: Callable[[Dict[str, str]], Awaitable[httpx.Response]],
+        ttl_override: Optional[float] = None
+    ) -> httpx.Response:
+        """
+        由快取提供回應，必要時重新驗證或下載
+
+        Args:
+            url: 完整請求網址（含查詢字串），即快取鍵
+            send: 協程函式 額外標頭 -> 回應（內容已讀取）
+            ttl_override: 取代回應標頭的有效秒數
+
+        Returns:
+            有效或 304 重新驗證時為快取回應，否則為 send() 的回應
+            （可快取的 200 會寫入快取）
+        """
+        entry = await asyncio.to_thread(self.lookup, url)
+        if entry is not None and entry.fresh:
+            self.record('hits')
+            return entry.to_response()
+
+        response = await send(entry.conditional_headers() if entry is not None else {})
+        if response.status_code == 304 and entry is not None:
+            await asyncio.to_thread(self.refresh, entry, response.headers, ttl_override)
+            self.record('revalidated')
+            return entry.to_response()
+
+        self.record('misses')
+        if response.status_code == 200:
+            await asyncio.to_thread(self.store, url, response.headers, response.content, ttl_override)
+        return response
+
+    def record(self, outcome: str):
+        """累計 hits / revalidated / misses（全域與本次掃描）"""
+        for stats in (self.stats, _scan_stats.get()):
+            if stats is not None:
+                setattr(stats, outcome, getattr(stats, outcome) + 1)
+
+    def metrics(self) -> Dict:
+        return {**self.stats.to_dict(), 'max_bytes': self.max_bytes}
+
+    def evict(self):
+        """淘汰最久未使用的項目，直到總容量低於 max_bytes 的 90%"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(root, name)
+                body_path = meta_path[:-len('.json')] + '.body'
+                try:
+                    size = os.path.getsize(body_path) + os.path.getsize(meta_path)
+                    mtime = os.path.getmtime(meta_path)
+                except OSError:
+                    continue
+                entries.append((mtime, size, meta_path, body_path))
+                total += size
+
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        entries.sort()
+        removed = 0
+        for _, size, meta_path, body_path in entries:
+            if total <= target:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        print(f"HTTP 快取淘汰 {removed} 個項目（剩餘 {total / 1024 / 1024:.1f} MB）")
+
+
+_cache: Optional[HTTPCache] = None
+
+
+def configure_http_cache(directory: str, max_bytes: int, search_ttl: Optional[float] = 3600.0) -> HTTPCache:
+    """啟用共用 HTTP 快取（於 main.py 啟動時呼叫）"""
+    global _cache
+    _cache = HTTPCache(directory, max_bytes, search_ttl)
+    return _cache
+
+
+def get_http_cache() -> Optional[HTTPCache]:
+    """共用 HTTP 快取，停用時為 None"""
+    return _cache
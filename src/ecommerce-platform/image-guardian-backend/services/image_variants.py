@@ -0,0 +1,77 @@
+"""
+商品圖片尺寸版本
+
+依比對需要的最小邊長，向平台 CDN 要最小的可用版本：
+蝦皮 CDN 的 <hash>_tn 縮圖約 300px，位元組數只有原圖的一小部分，
+pHash 與顏色直方圖用縮圖即可；ORB 與 AI 複查需要原圖，只在預篩通過後才下載。
+不認得的網址（沒有已知版本的平台）一律原樣使用。
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional, Pattern, Tuple
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """CDN 版本：原圖網址 + 後綴"""
+    suffix: str
+    min_side: int  # 此版本的短邊長度
+
+
+@dataclass(frozen=True)
+class CDNRule:
+    """
+    單一平台 CDN 的圖片網址規則
+
+    pattern 的 base 群組為原圖網址，variant 群組為網址目前帶的版本後綴
+    """
+    platform: str
+    pattern: Pattern
+    renditions: Tuple[Rendition, ...]  # 由小到大
+
+
+DEFAULT_RULES = (
+    CDNRule(
+        "shopee",
+        re.compile(
+            r"^(?P<base>https?://(?:cf\.shopee\.tw|down-[a-z]+\.img\.susercontent\.com)/file/[\w-]+?)"
+            r"(?P<variant>_tn)?$"
+        ),
+        (Rendition("_tn", 300),)
+    ),
+)
+
+
+class ImageVariantPolicy:
+    """決定商品圖片要下載哪個 CDN 版本"""
+
+    def __init__(self, rules: Tuple[CDNRule, ...] = DEFAULT_RULES):
+        self.rules = rules
+
+    def _match(self, url: str) -> Optional[Tuple[CDNRule, str]]:
+        for rule in self.rules:
+            match = rule.pattern.match(url)
+            if match:
+                return rule, match.group("base")
+        return None
+
+    def select(self, url: str, min_side: int = 0) -> str:
+        """
+        短邊 >= min_side 的最小版本
+
+        沒有夠大的版本時回傳原圖網址；CDN 沒有已知版本時原樣回傳
+        """
+        matched = self._match(url) if url else None
+        if matched is None:
+            return url
+        rule, base = matched
+        for rendition in rule.renditions:
+            if rendition.min_side >= min_side:
+                return base + rendition.suffix
+        return base
+
+    def original(self, url: str) -> str:
+        """（可能是縮圖版本的）網址對應的原圖"""
+        matched = self._match(url) if url else None
+        return matched[1] if matched is not None else url
@@ -0,0 +1,154 @@
+"""
+ORB 特徵點一對多索引 - FLANN-LSH
+
+所有已存指紋的 ORB 描述符建成一個索引（每個描述符記錄所屬指紋 ID），
+上傳圖片只需一次 knnMatch 就能得到每個指紋的投票數。
+find-similar 以票數找出 pHash 預篩漏掉的候選（裁切、加框）；
+票數不換算成分數，候選的 ORB 分數仍由 FingerprintService 兩兩比對計算。
+
+使用方式：
+    index = ORBIndex()
+    index.add("fp-1", fingerprint.orb_descriptors)
+    votes = index.query(uploaded.orb_descriptors)   # {"fp-1": (票數, 平均距離)}
+"""
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+# FLANN 的 LSH 演算法代號（cv2 未匯出常數）
+FLANN_INDEX_LSH = 6
+
+
+def _as_descriptors(descriptors: Union[bytes, np.ndarray, None]) -> Optional[np.ndarray]:
+    """ImageFingerprint.orb_descriptors (bytes) 或 ndarray → (N, 32) uint8"""
+    if descriptors is None or len(descriptors) == 0:
+        return None
+    if isinstance(descriptors, bytes):
+        return np.frombuffer(descriptors, dtype=np.uint8).reshape(-1, 32)
+    return np.ascontiguousarray(descriptors, dtype=np.uint8)
+
+
+class ORBIndex:
+    """
+    ORB 描述符一對多比對索引
+
+    每個查詢描述符取 k 個最近鄰，每個指紋取其中最近的一個投一票，
+    條件為距離 <= max_distance 且距離 < ratio * 第 k 近鄰距離
+    （第 k 近鄰視為背景距離，即多圖版本的 Lowe ratio test）。
+
+    - 描述符數量少時用 BFMatcher（精確），多時用 FLANN-LSH（近似）
+    - add / remove 只標記需重建，下次查詢時才重建
+    """
+
+    def __init__(
+        self,
+        k: int = 5,
+        ratio: float = 0.75,
+        max_distance: int = 64,
+        lsh_min_size: int = 5000
+    ):
+        """
+        Args:
+            k: 每個查詢描述符的近鄰數
+            ratio: 比率測試門檻
+            max_distance: 投票的最大漢明距離 (0-256)
+            lsh_min_size: 描述符總數達此值時改用 FLANN-LSH
+        """
+        self.k = k
+        self.ratio = ratio
+        self.max_distance = max_distance
+        self.lsh_min_size = lsh_min_size
+
+        self._descriptors: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._matcher = None
+        self._keys: List[str] = []
+        self._owners = np.empty(0, dtype=np.int32)  # 描述符列 → _keys 索引
+
+    def __len__(self) -> int:
+        return len(self._descriptors)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._descriptors
+
+    def add(self, key: str, descriptors: Union[bytes, np.ndarray, None]):
+        """新增或取代指紋的描述符"""
+        descriptors = _as_descriptors(descriptors)
+        with self._lock:
+            if descriptors is None:
+                self._descriptors.pop(key, None)
+            else:
+                self._descriptors[key] = descriptors
+            self._matcher = None
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            if self._descriptors.pop(key, None) is None:
+                return False
+            self._matcher = None
+            return True
+
+    def query(self, descriptors: Union[bytes, np.ndarray, None]) -> Dict[str, Tuple[int, float]]:
+        """
+        一次比對所有已索引的指紋
+
+        Returns:
+            {指紋 ID: (票數, 平均漢明距離)}，只含至少一票的指紋
+        """
+        descriptors = _as_descriptors(descriptors)
+        if descriptors is None:
+            return {}
+
+        with self._lock:
+            if not self._descriptors:
+                return {}
+            if self._matcher is None:
+                self._build()
+
+            k = min(self.k, len(self._owners))
+            knn = self._matcher.knnMatch(descriptors, k=k)
+
+        votes: Dict[int, int] = {}
+        distance_sums: Dict[int, float] = {}
+        for neighbours in knn:
+            if not neighbours:
+                continue
+            ratio_limit = self.ratio * neighbours[-1].distance if len(neighbours) == k else float("inf")
+
+            seen = set()
+            for match in neighbours:  # 由近到遠
+                if match.distance > self.max_distance or match.distance >= ratio_limit:
+                    break
+                owner = int(self._owners[match.trainIdx])
+                if owner in seen:
+                    continue
+                seen.add(owner)
+                votes[owner] = votes.get(owner, 0) + 1
+                distance_sums[owner] = distance_sums.get(owner, 0.0) + match.distance
+
+        return {
+            self._keys[owner]: (count, distance_sums[owner] / count)
+            for owner, count in votes.items()
+        }
+
+    def _build(self):
+        self._keys = list(self._descriptors)
+        stacked = np.vstack([self._descriptors[key] for key in self._keys])
+        self._owners = np.repeat(
+            np.arange(len(self._keys), dtype=np.int32),
+            [len(self._descriptors[key]) for key in self._keys]
+        )
+
+        if len(stacked) >= self.lsh_min_size:
+            matcher = cv2.FlannBasedMatcher(
+                dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1),
+                dict(checks=50)
+            )
+        else:
+            matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
+
+        matcher.add([stacked])
+        matcher.train()
+        self._matcher = matcher
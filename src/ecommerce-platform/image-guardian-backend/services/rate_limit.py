@@ -0,0 +1,141 @@
+"""
+每個主機一個 token bucket 的自適應限速器 - 取代固定的隨機延遲
+
+所有 PlatformCrawler 實例與同時進行的爬取共用同一個限速器（get_rate_limiter()），
+同一主機的請求總速率不會因為並行而倍增。
+速率以 AIMD 調整：收到 429 / 403 / 503 時乘法降速（並清空累積的 burst），
+正常回應時線性加速，直到 max_rate。
+
+使用方式：
+    limiter = get_rate_limiter()
+    await limiter.acquire(url)
+    response = await client.get(url)
+    limiter.record(url, response.status_code, response.headers.get("Retry-After"))
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+THROTTLE_STATUS = {403, 429, 503}
+
+
+@dataclass
+class _Bucket:
+    rate: float                 # 每秒請求數
+    tokens: float               # 可為負值：已預約的未來名額
+    updated: float = field(default_factory=time.monotonic)
+    last_decrease: float = 0.0
+    requests: int = 0
+    throttled: int = 0
+
+
+class HostRateLimiter:
+    """
+    每主機 token bucket（AIMD 自適應速率）
+
+    acquire() 先預約名額再睡到可用時間，並行的呼叫會被平均錯開，
+    不會同時醒來一起送出請求。
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: int = 4,
+        min_rate: float = 0.2,
+        max_rate: float = 10.0,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+        host_rates: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            rate: 每個主機的初始速率（次/秒）
+            burst: bucket 容量（可連續送出的請求數）
+            min_rate / max_rate: 自適應速率的上下限
+            increase: 每個正常回應增加的速率
+            decrease: 收到限流回應時的速率乘數
+            host_rates: 指定主機的初始速率
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.host_rates = host_rates or {}
+        self._buckets: Dict[str, _Bucket] = {}
+
+    def _bucket(self, url: str) -> _Bucket:
+        host = urlsplit(url).netloc or url
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = _Bucket(
+                rate=self.host_rates.get(host, self.rate),
+                tokens=float(self.burst)
+            )
+        return bucket
+
+    def _refill(self, bucket: _Bucket, now: float):
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+        bucket.updated = now
+
+    async def acquire(self, url: str):
+        """等待該主機的下一個請求名額"""
+        bucket = self._bucket(url)
+        self._refill(bucket, time.monotonic())
+        bucket.tokens -= 1
+        bucket.requests += 1
+        if bucket.tokens < 0:
+            await asyncio.sleep(-bucket.tokens / bucket.rate)
+
+    def record(self, url: str, status_code: int, retry_after: Optional[str] = None):
+        """依回應狀態調整該主機速率"""
+        bucket = self._bucket(url)
+        now = time.monotonic()
+
+        if status_code in THROTTLE_STATUS:
+            bucket.throttled += 1
+            # 每個補充間隔最多降速一次：同時收到的多個 429 只算一次
+            if now - bucket.last_decrease >= 1 / bucket.rate:
+                self._refill(bucket, now)
+                bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+                bucket.tokens = min(bucket.tokens, 0.0)
+                bucket.last_decrease = now
+                print(f"{urlsplit(url).netloc} 限流 ({status_code})，速率降為 {bucket.rate:.2f}/s")
+            if retry_after and retry_after.isdigit():
+                # 依 Retry-After 暫停該主機
+                bucket.tokens = min(bucket.tokens, -int(retry_after) * bucket.rate)
+
+        elif status_code < 400:
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+    def metrics(self) -> Dict[str, Dict]:
+        """各主機目前速率與計數"""
+        return {
+            host: {
+                "rate": round(bucket.rate, 3),
+                "requests": bucket.requests,
+                "throttled": bucket.throttled
+            }
+            for host, bucket in self._buckets.items()
+        }
+
+
+_limiter: Optional[HostRateLimiter] = None
+
+
+def configure_rate_limiter(**kwargs) -> HostRateLimiter:
+    """建立共用限速器（於應用程式啟動時呼叫）"""
+    global _limiter
+    _limiter = HostRateLimiter(**kwargs)
+    return _limiter
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """共用限速器（未設定時使用預設值）"""
+    global _limiter
+    if _limiter is None:
+        _limiter = HostRateLimiter()
+    return _limiter
@@ -0,0 +1,234 @@
+"""
+爬蟲重試、退避與熔斷 - 暫時性錯誤自動重試，平台封鎖時快速失敗
+
+- 指數退避 + full jitter，遵守 Retry-After
+- 每個平台一個重試預算（重試次數不超過請求數的固定比例），
+  平台大規模故障時不會因重試而放大流量
+- 每個平台一個熔斷器：連續失敗達門檻後開啟，冷卻期間直接拋出
+  CircuitOpenError，冷卻結束後放行一個探測請求（half-open）
+
+使用方式：
+    response = await get_resilience().call("shopee", lambda: client.get(url))
+"""
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+# 值得重試：限流與暫時性伺服器錯誤
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 計入熔斷器失敗（403：平台封鎖）
+FAILURE_STATUS = RETRY_STATUS | {403}
+
+
+class CircuitOpenError(Exception):
+    """平台熔斷器開啟中，請求未送出"""
+
+
+class CircuitBreaker:
+    """
+    連續失敗熔斷器
+
+    closed → 連續失敗 failure_threshold 次後 open；
+    open → 經過 reset_timeout 後 half_open（放行一個探測請求）；
+    half_open → 成功則 closed，失敗則再次 open。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+
+    def is_open(self) -> bool:
+        """開啟且仍在冷卻中（請求會直接失敗）"""
+        return self.state == "open" and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def check(self):
+        """目前不可送出請求時拋出 CircuitOpenError"""
+        if self.state == "closed":
+            return
+        if self.state == "open":
+            if self.is_open():
+                raise CircuitOpenError(f"{self.name} circuit open")
+            self.state = "half_open"
+            self._probing = False
+        if self._probing:
+            raise CircuitOpenError(f"{self.name} circuit half-open, probe in flight")
+        self._probing = True
+
+    def record_success(self):
+        if self.state != "closed":
+            print(f"{self.name} 熔斷器關閉")
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def release(self):
+        """請求未產生結果（例如被取消），釋放探測名額"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                print(f"{self.name} 連續失敗 {self.failures} 次，熔斷 {self.reset_timeout:.0f} 秒")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+    def metrics(self) -> Dict:
+        return {"state": self.state, "failures": self.failures, "times_opened": self.times_opened}
+
+
+class RetryBudget:
+    """
+    重試預算：重試次數為請求數的固定比例
+
+    每個請求存入 ratio 個 token，每次重試花費一個，最多累積 max_tokens；
+    短暫的重試可以，但平台故障時持續重試不超過流量的 ratio。
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.retries = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            self.exhausted += 1
+            return False
+        self.tokens -= 1
+        self.retries += 1
+        return True
+
+    def metrics(self) -> Dict:
+        return {"tokens": round(self.tokens, 2), "retries": self.retries, "exhausted": self.exhausted}
+
+
+class CrawlerResilience:
+    """重試策略 + 每平台熔斷器與重試預算（所有爬蟲共用）"""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        budget_ratio: float = 0.2,
+        breaker_failures: int = 5,
+        breaker_reset: float = 30.0
+    ):
+        """
+        Args:
+            max_retries: 每個請求的重試次數（不含第一次）
+            base_delay / max_delay: 指數退避的上下限（秒）
+            budget_ratio: 每平台每個請求可重試的比例
+            breaker_failures: 開啟熔斷器的連續失敗次數
+            breaker_reset: 熔斷器開啟後多久放行探測請求（秒）
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._budgets: Dict[str, RetryBudget] = {}
+
+    def breaker(self, platform: str) -> CircuitBreaker:
+        if platform not in self._breakers:
+            self._breakers[platform] = CircuitBreaker(platform, self.breaker_failures, self.breaker_reset)
+        return self._breakers[platform]
+
+    def budget(self, platform: str) -> RetryBudget:
+        if platform not in self._budgets:
+            self._budgets[platform] = RetryBudget(self.budget_ratio)
+        return self._budgets[platform]
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """指數退避 + full jitter；Retry-After 較長時以其為準"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.max_delay * 4))
+        return delay
+
+    async def call(
+        self,
+        platform: str,
+        send: Callable[[], Awaitable[httpx.Response]],
+        max_retries: Optional[int] = None
+    ) -> httpx.Response:
+        """
+        送出請求（含重試、重試預算與熔斷器）
+
+        回傳最後一次回應（重試用盡時可能非 2xx）；
+        熔斷時拋出 CircuitOpenError，連線錯誤重試用盡時拋出最後的錯誤。
+        """
+        retries = self.max_retries if max_retries is None else max_retries
+        breaker = self.breaker(platform)
+        budget = self.budget(platform)
+        budget.deposit()
+
+        attempt = 0
+        while True:
+            breaker.check()
+            retry_after = None
+            try:
+                response = await send()
+            except httpx.TransportError:
+                breaker.record_failure()
+                if attempt >= retries or not budget.withdraw():
+                    raise
+            except BaseException:
+                breaker.release()
+                raise
+            else:
+                if response.status_code in FAILURE_STATUS:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if (response.status_code not in RETRY_STATUS
+                        or attempt >= retries or not budget.withdraw()):
+                    return response
+                retry_after = response.headers.get("Retry-After")
+
+            attempt += 1
+            await asyncio.sleep(self.backoff(attempt, retry_after))
+
+    def metrics(self) -> Dict[str, Dict]:
+        return {
+            platform: {**self.breaker(platform).metrics(), "retry_budget": self.budget(platform).metrics()}
+            for platform in sorted(set(self._breakers) | set(self._budgets))
+        }
+
+
+_resilience: Optional[CrawlerResilience] = None
+
+
+def configure_resilience(**kwargs) -> CrawlerResilience:
+    """建立共用的重試 / 熔斷狀態（於應用程式啟動時呼叫）"""
+    global _resilience
+    _resilience = CrawlerResilience(**kwargs)
+    return _resilience
+
+
+def get_resilience() -> CrawlerResilience:
+    """共用的重試 / 熔斷狀態（未設定時使用預設值）"""
+    global _resilience
+    if _resilience is None:
+        _resilience = CrawlerResilience()
+    return _resilience
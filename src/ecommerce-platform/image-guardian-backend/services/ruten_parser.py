@@ -0,0 +1,234 @@
+"""
+露天 HTML 解析
+
+以 HTML 樹狀解析取出商品卡片，取代整頁 re.DOTALL 的正則：
+正則在大頁面上 .*? 大量回溯，卡片內欄位順序一變就錯位到下一個商品。
+
+- parse_ruten_html(html)：整頁解析；有 selectolax (Lexbor) 時使用預先定義的 CSS 選擇器
+- RutenStreamParser：以標準庫 html.parser 增量解析，可邊接收回應邊 feed()，
+  每張商品卡片結束就產出；未安裝 selectolax 時 parse_ruten_html 也使用它
+
+商品卡片 = 帶 data-gno 屬性（商品編號）的元素，卡片內取：
+第一個 <img> 的 src（或延遲載入的 data-src）、第一個有文字的 <a href>（標題）、
+第一個不在刪除線（原價）內的 $ 金額（價格）。缺任一欄位的卡片略過。
+"""
+
+import codecs
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Set, Union
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as LexborHTML
+except ImportError:
+    LexborHTML = None
+
+# 選擇器與樣式（模組載入時建立一次）
+CARD_SELECTOR = "[data-gno]"
+IMAGE_SELECTOR = "img"
+LINK_SELECTOR = "a[href]"
+STRUCK_SELECTOR = "del, s, strike"
+PRICE_PATTERN = re.compile(r"\$\s*(\d[\d,]*)")
+
+# 刪除線內是原價，不是售價
+STRUCK_TAGS = frozenset({"del", "s", "strike"})
+
+# 沒有結束標籤的元素，不列入巢狀深度
+VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+})
+
+
+@dataclass
+class RutenItem:
+    """露天商品卡片"""
+    item_id: str
+    title: str
+    url: str
+    image_url: str
+    price: float
+
+
+def _parse_price(text: str) -> Optional[float]:
+    match = PRICE_PATTERN.search(text)
+    if not match:
+        return None
+    return float(match.group(1).replace(",", ""))
+
+
+def _make_item(item_id: str, title: str, url: str, image_url: str, text: str) -> Optional[RutenItem]:
+    price = _parse_price(text)
+    if not (item_id and title and image_url) or price is None:
+        return None
+    return RutenItem(item_id=item_id, title=title, url=url, image_url=image_url, price=price)
+
+
+def parse_ruten_html(html: Union[str, bytes]) -> List[RutenItem]:
+    """
+    解析露天搜尋 / 店舖頁面的商品卡片
+
+    Args:
+        html: 整頁 HTML；以 httpx 取得時傳入 response.text（依回應編碼解碼），
+              bytes 只在確定為 UTF-8 時使用
+
+    Returns:
+        依頁面順序的商品（同一商品編號只取第一張卡片）
+    """
+    if LexborHTML is None:
+        parser = RutenStreamParser()
+        return parser.feed(html) + parser.close()
+
+    tree = LexborHTML(html)
+    results = []
+    seen: Set[str] = set()
+
+    for card in tree.css(CARD_SELECTOR):
+        item_id = card.attributes.get("data-gno") or ""
+        if item_id in seen:
+            continue  # 巢狀的 data-gno 屬於外層卡片
+
+        image_url = ""
+        image = card.css_first(IMAGE_SELECTOR)
+        if image is not None:
+            image_url = image.attributes.get("src") or image.attributes.get("data-src") or ""
+
+        title, url = "", ""
+        for link in card.css(LINK_SELECTOR):
+            text = link.text(strip=True)
+            if text:
+                title, url = text, link.attributes.get("href") or ""
+                break
+
+        for struck in card.css(STRUCK_SELECTOR):
+            struck.decompose()
+        item = _make_item(item_id, title, url, image_url, card.text(separator=" "))
+        if item is not None:
+            seen.add(item_id)
+            results.append(item)
+
+    return results
+
+
+class RutenStreamParser(HTMLParser):
+    """
+    增量解析露天頁面
+
+    用法：
+        parser = RutenStreamParser(response.encoding)
+        async for chunk in response.aiter_bytes():
+            for item in parser.feed(chunk):
+                ...
+        items = parser.close()
+    """
+
+    def __init__(self, encoding: Optional[str] = None):
+        """
+        Args:
+            encoding: bytes 輸入的編碼（如 response.encoding；露天舊頁面為 Big5），預設 UTF-8
+        """
+        super().__init__(convert_charrefs=True)
+        self._decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+        self._ready: List[RutenItem] = []
+        self._seen: Set[str] = set()
+
+        self._card: Optional[Dict[str, str]] = None
+        self._stack: List[str] = []   # 卡片內尚未結束的標籤
+        self._text: List[str] = []    # 卡片內文字（取價格）
+        self._struck = 0              # 位於刪除線內的層數
+        self._link_href: Optional[str] = None
+        self._link_text: List[str] = []
+
+    def feed(self, data: Union[str, bytes]) -> List[RutenItem]:
+        """餵入下一段 HTML，回傳這段之內完成的商品"""
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data)
+        super().feed(data)
+        return self._take()
+
+    def close(self) -> List[RutenItem]:
+        """輸入結束，回傳剩餘的商品（含未正常結束的最後一張卡片）"""
+        tail = self._decoder.decode(b"", final=True)
+        if tail:
+            super().feed(tail)
+        super().close()
+        if self._card is not None:
+            self._emit()
+        return self._take()
+
+    def _take(self) -> List[RutenItem]:
+        ready, self._ready = self._ready, []
+        return ready
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs, closed=tag in VOID_TAGS)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs, closed=True)
+
+    def _start(self, tag: str, attrs, closed: bool):
+        attributes = dict(attrs)
+
+        if self._card is None:
+            item_id = attributes.get("data-gno")
+            if not item_id or item_id in self._seen or closed:
+                return
+            self._card = {"item_id": item_id, "image_url": "", "title": "", "url": ""}
+            self._stack = [tag]
+            self._text = []
+            self._struck = 0
+            return
+
+        if not closed:
+            self._stack.append(tag)
+            if tag in STRUCK_TAGS:
+                self._struck += 1
+
+        if tag == "img" and not self._card["image_url"]:
+            self._card["image_url"] = attributes.get("src") or attributes.get("data-src") or ""
+        elif tag == "a" and not self._card["title"] and attributes.get("href"):
+            self._link_href = attributes["href"]
+            self._link_text = []
+
+    def handle_endtag(self, tag):
+        if self._card is None:
+            return
+
+        if tag == "a" and self._link_href is not None:
+            title = "".join(self._link_text).strip()
+            if title:
+                self._card["title"] = title
+                self._card["url"] = self._link_href
+            self._link_href = None
+
+        # 寬鬆處理未關閉的標籤（<li>、<p>…）：關到最近一個同名標籤
+        if tag in self._stack:
+            while True:
+                closed = self._stack.pop()
+                if closed in STRUCK_TAGS:
+                    self._struck -= 1
+                if closed == tag:
+                    break
+        if not self._stack:
+            self._emit()
+
+    def handle_data(self, data):
+        if self._card is None:
+            return
+        if not self._struck:
+            self._text.append(data)
+        if self._link_href is not None:
+            self._link_text.append(data)
+
+    def _emit(self):
+        card, self._card = self._card, None
+        self._stack = []
+        self._link_href = None
+
+        item = _make_item(
+            card["item_id"], card["title"], card["url"], card["image_url"], " ".join(self._text)
+        )
+        if item is not None:
+            self._seen.add(item.item_id)
+            self._ready.append(item)